@@ -44,6 +44,18 @@ class Analyser(object):
     def timestamp(self):
         return None
 
+    # Version and data timestamp of the analyser known before building it,
+    # to skip it when the frontend is already up to date. None when they
+    # depend on the instance.
+
+    @classmethod
+    def class_version(cls):
+        return SourceVersion.version(cls)
+
+    @classmethod
+    def config_timestamp(cls, config):
+        return None
+
     @classmethod
     def def_class_(cls, config, back_in_stack = 2, **kwargs):
         # Check keys
@@ -133,11 +145,17 @@ class TestAnalyser(unittest.TestCase):
         conf.db_schema = conf.country
         conf.download["dst"] = osm_file
         conf.init()
+        # Keep the tables used by all the analysers
+        for update in conf.osmosis_update_tables.values():
+            if "analyser" in update:
+                conf.analyser[update["analyser"]] = "xxx"
 
         class options:
             plugin = None
             verbose = False
             change = False
+            sax_node_cache = False
+            sax_profile = None
         analyser_conf = osmose_run.analyser_config(conf, options(), None)
         analyser_conf.error_file = IssuesFileOsmose.IssuesFileOsmose(dst)
 
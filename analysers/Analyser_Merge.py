@@ -1228,6 +1228,10 @@ verification of this data.'''))
     def analyser_version(self):
         return SourceVersion.version(self.parser.source.time(), self.__class__)
 
+    @classmethod
+    def class_version(cls):
+        return None
+
     def typeGeom(self):
         typeSelect = {'N': 'geom', 'W': 'linestring', 'R': 'relation_locate(id)'}
         typeGeom = {'N': 'geom', 'W': 'linestring', 'R': 'relation_locate(id)'}
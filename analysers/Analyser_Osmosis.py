@@ -25,7 +25,13 @@ import os
 import psycopg2
 import psycopg2.extensions
 import re
+import itertools
+import struct
+from decimal import Decimal, ROUND_HALF_EVEN
+from concurrent.futures import ThreadPoolExecutor
 from modules import DictCursorUnicode
+from modules.IdSet import IdSet
+from modules.phonetic import PhoneticKeys
 from collections import defaultdict
 from inspect import getframeinfo, stack
 
@@ -108,6 +114,46 @@ WHERE
 ;
 
 ANALYZE {0}.highway_ends;
+"""
+
+    # Node references of the highways, with the number of highways on the
+    # node: degree counts all of them, degree_construction the ones under
+    # construction.
+    sql_create_highway_node_topology = """
+CREATE UNLOGGED TABLE {0}.highway_node_topology AS
+WITH refs AS (
+    SELECT
+        refs.nid,
+        highways.id,
+        refs.position::integer AS position,
+        refs.position IN (1, array_length(highways.nodes, 1)) AS is_end,
+        highways.is_construction
+    FROM
+        highways,
+        unnest(highways.nodes) WITH ORDINALITY AS refs(nid, position)
+)
+SELECT
+    refs.*,
+    degrees.degree,
+    degrees.degree_construction
+FROM
+    refs
+    JOIN (
+        SELECT
+            nid,
+            COUNT(DISTINCT id) AS degree,
+            COUNT(DISTINCT id) FILTER (WHERE is_construction) AS degree_construction
+        FROM
+            refs
+        GROUP BY
+            nid
+    ) AS degrees ON
+        degrees.nid = refs.nid
+;
+
+CREATE INDEX idx_highway_node_topology_nid ON {0}.highway_node_topology(nid);
+CREATE INDEX idx_highway_node_topology_id ON {0}.highway_node_topology(id);
+ANALYZE {0}.highway_node_topology;
 """
 
     # Multipolygons table is not complete. It does not contain multipolygons across extract border or invalid ones.
@@ -271,6 +317,10 @@ ANALYZE {0}.buildings;
     def timestamp(self):
         return self.apiconn.timestamp()
 
+    @classmethod
+    def config_timestamp(cls, config):
+        return config.osmosis_manager.timestamp()
+
 
     def analyser(self):
         self.init_analyser()
@@ -359,6 +409,9 @@ ANALYZE {0}.buildings;
                 elif table == 'highway_ends':
                     self.requires_tables_build(["highways"])
                     self.giscurs.execute(self.sql_create_highway_ends.format(self.config.db_schema.split(',')[0]))
+                elif table == 'highway_node_topology':
+                    self.requires_tables_build(["highways"])
+                    self.giscurs.execute(self.sql_create_highway_node_topology.format(self.config.db_schema.split(',')[0]))
                 elif table == 'touched_highway_ends':
                     self.requires_tables_build(["highway_ends"])
                     self.create_view_touched('highway_ends', 'W')
@@ -394,11 +447,11 @@ ANALYZE {0}.buildings;
         if tstamp_action != timestamp:
             self.logger.log("osmosis resume post scripts")
             osmosis_resume_post_scripts = [ # Scripts to run each time the database is updated
-                "/osmosis/ActionFromTimestamp.sql",
-                "/osmosis/CreateTouched.sql",
-            ]
+                "./osmosis/ActionFromTimestamp.sql",
+                "./osmosis/CreateTouched.sql",
+            ] + self.config.osmosis_update_post_scripts
             for script in osmosis_resume_post_scripts: # self.config.analyser_conf.osmosis_resume_post_scripts:
-                self.giscurs.execute(open('./' + script, 'r').read().replace(':timestamp', str(timestamp)))
+                self.giscurs.execute(open(script, 'r').read().replace(':timestamp', str(timestamp)))
             self.giscurs.execute('COMMIT')
             self.giscurs.execute('BEGIN')
 
@@ -409,6 +462,13 @@ ANALYZE {0}.buildings;
         self.giscurs.execute("SET LOCAL statement_timeout = '12h';")
         self.giscurs.execute("SET search_path TO {0},public;".format(self.config.db_schema_path or self.config.db_schema))
 
+        # Own cursor, giscurs may be iterating on results
+        self.wkbcurs = self.gisconn.cursor()
+        self.wkbcurs.execute("SELECT PostGIS_Lib_Version()")
+        self.wkb_as_text_local = tuple(map(int, re.findall(r"\d+", self.wkbcurs.fetchone()[0])[0:2])) >= (3, 1)
+        if not self.wkb_as_text_local:
+            self.sql_as_binary = "ST_AsText"
+
 
     def dump_class(self, classs):
         for id_ in classs:
@@ -454,21 +514,21 @@ ANALYZE {0}.buildings;
             # Resume
             types = {'N': 'node', 'W': 'way', 'R': 'relation'}
             for t, ids in self.already_issued_objects.items():
-                if ids:
+                for chunk in IdSet(ids).chunks(100000):
                     sql = """
 -- Touched
 SELECT id
-FROM touched_{1}s
-    JOIN (VALUES ({0})) AS v(id) USING (id)
+FROM touched_{0}s
+    JOIN unnest(%(ids)s::bigint[]) AS v(id) USING (id)
 UNION ALL
 -- Deleted
 SELECT id
-FROM (VALUES ({0})) AS v(id)
-    LEFT JOIN {1}s AS l USING(id)
+FROM unnest(%(ids)s::bigint[]) AS v(id)
+    LEFT JOIN {0}s AS l USING(id)
 WHERE l.id IS NULL
 """
-                    sql = sql.format('),('.join(map(str, ids)), types[t])
-                    self.giscurs.execute(sql)
+                    sql = sql.format(types[t])
+                    self.giscurs.execute(sql, {'ids': chunk})
                     for res in self.giscurs.fetchall():
                         self.error_file.delete(types[t], res[0])
         else:
@@ -519,6 +579,65 @@ WHERE
 """
         self.giscurs.execute(sql.format(table, type, id))
 
+    def create_phonetic_keys(self, table, sql_names, algorithm):
+        """
+        Create the temp table `table` (name, key) of the phonetic keys of the
+        names selected by sql_names, from the cross runs cache.
+        """
+        names = []
+        self.run(sql_names, lambda res: names.append(res[0]))
+
+        def sql_keys(names):
+            keys = []
+            for i in range(0, len(names), 100000):
+                self.giscurs.execute("SELECT {0}(name) FROM unnest(%(names)s::text[]) WITH ORDINALITY AS t(name, i) ORDER BY i".format(algorithm), {'names': names[i:i + 100000]})
+                keys += [res[0] for res in self.giscurs.fetchall()]
+            return keys
+
+        phonetic = PhoneticKeys(algorithm)
+        keys = phonetic.keys(names, sql_keys)
+        self.logger.log("phonetic keys {0}: {1}".format(algorithm, phonetic.cache.stats()))
+        phonetic.save()
+
+        self.giscurs.execute("CREATE TEMP TABLE {0} (name text PRIMARY KEY, key text)".format(table))
+        for i in range(0, len(names), 100000):
+            chunk = names[i:i + 100000]
+            self.giscurs.execute("INSERT INTO {0} SELECT * FROM unnest(%(names)s::text[], %(keys)s::text[])".format(table), {'names': chunk, 'keys': [keys[name] for name in chunk]})
+        self.giscurs.execute("ANALYZE {0}".format(table))
+
+    # Number of rows transferred per round-trip by server-side cursors
+    cursor_itersize = 10000
+
+    re_streamable_sql = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(?:SELECT|WITH|VALUES|\()", re.IGNORECASE)
+    cursor_counter = itertools.count()
+
+    def streamable(self, sql):
+        """
+        Single read-only query, that can be declared as a server-side cursor.
+        """
+        return self.re_streamable_sql.match(sql) is not None and ';' not in sql.strip().rstrip(';')
+
+    def fetch_batches(self, curs):
+        """
+        Iterate over the rows of curs, the next batch is fetched in background
+        while the current one is consumed. Callbacks must use other cursors,
+        psycopg2 serializes their queries with the fetch on the connection.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_batch = executor.submit(curs.fetchmany, self.cursor_itersize)
+            try:
+                while True:
+                    many = next_batch.result()
+                    if not many:
+                        break
+                    next_batch = executor.submit(curs.fetchmany, self.cursor_itersize)
+                    for res in many:
+                        yield res
+            finally:
+                # Do not leave the cursor in use on early exit
+                if not next_batch.cancel():
+                    next_batch.exception()
+
     def run00(self, sql, callback = None):
         if self.explain_sql:
             self.logger.log(sql.strip())
@@ -528,18 +647,25 @@ WHERE
             for res in self.giscurs.fetchall():
                 self.logger.log(res[0])
 
+        if callback and self.streamable(sql):
+            # Named cursor: rows stay on the server side until fetched
+            curs = self.gisconn.cursor(name="osmose_run00_{0}".format(next(self.cursor_counter)), cursor_factory=DictCursorUnicode.DictCursorUnicode63)
+            curs.itersize = self.cursor_itersize
+        elif callback:
+            # Own cursor, callbacks may query on giscurs while iterating
+            curs = self.gisconn.cursor(cursor_factory=DictCursorUnicode.DictCursorUnicode63)
+        else:
+            curs = self.giscurs
+
         try:
-            self.giscurs.execute(sql)
-        except:
-            self.logger.err("sql={0}".format(sql))
-            raise
+            try:
+                curs.execute(sql)
+            except:
+                self.logger.err("sql={0}".format(sql))
+                raise
 
-        if callback:
-            while True:
-                many = self.giscurs.fetchmany(1000)
-                if not many:
-                    break
-                for res in many:
+            if callback:
+                for res in self.fetch_batches(curs):
                     ret = None
                     try:
                         ret = callback(res)
@@ -547,6 +673,13 @@ WHERE
                         self.logger.err("res={0}".format(res))
                         self.logger.err("ret={0}".format(ret))
                         raise
+        finally:
+            if curs is not self.giscurs and not self.gisconn.closed:
+                try:
+                    curs.close()
+                except psycopg2.Error:
+                    # Transaction already aborted
+                    pass
 
     def run0(self, sql, callback = None):
         caller = getframeinfo(stack()[1][0])
@@ -635,6 +768,129 @@ WHERE
         for loc in self.get_points(res):
             self.geom["position"].append(loc)
 
+    # Whether the PostGIS ST_AsText() formats coordinates as format_coordinate,
+    # set by init_analyser()
+    wkb_as_text_local = None
+    # SQL function to use for the positionAsBinary() columns, ST_AsText when
+    # the WKB is not decoded locally
+    sql_as_binary = "ST_AsBinary"
+
+    def wkb_as_text(self, wkb):
+        self.wkbcurs.execute("SELECT ST_AsText(%s::geometry)", [psycopg2.Binary(wkb)])
+        return self.wkbcurs.fetchone()[0]
+
+    @staticmethod
+    def format_coordinate(c):
+        """
+        Format a double as PostGIS >= 3.1 ST_AsText() does: fixed notation,
+        at most 15 significant digits, without trailing zeros.
+        """
+        a = abs(c)
+        if a <= 1e-12:
+            return "0"
+        digits = 15 - (len(str(int(a))) if a >= 1 else 0)
+        s = repr(c)
+        if 'e' not in s and len(s) - s.index('.') - 1 <= digits:
+            # Shortest representation already fits
+            return s[:-2] if s.endswith('.0') else s
+        s = format(Decimal(c).quantize(Decimal(1).scaleb(-digits), ROUND_HALF_EVEN), 'f')
+        return s.rstrip('0').rstrip('.') if '.' in s else s
+
+    def get_points_xy(self, coords):
+        f = self.format_coordinate
+        return [{"lat": f(coords[i + 1]), "lon": f(coords[i])} for i in range(0, len(coords) - 1, 2)]
+
+    def positionXY(self, res):
+        """
+        Position from a double precision array of lon, lat pairs,
+        eg. ARRAY[ST_X(geom), ST_Y(geom)].
+        """
+        if res is None:
+            self.logger.err("NULL location provided")
+            return []
+        self.geom["position"].extend(self.get_points_xy(res))
+
+    def get_sequences_wkb(self, wkb, offset=0):
+        """
+        Decode ISO or extended WKB into flat x, y coordinate sequences, as
+        they are delimited in the WKT representation. Return the sequences and
+        the offset after the geometry. Coordinates are unpacked in bulk.
+        """
+        endian = '<' if wkb[offset] == 1 else '>'
+        (geom_type,) = struct.unpack_from(endian + 'I', wkb, offset + 1)
+        offset += 5
+        if geom_type & 0x20000000: # EWKB SRID
+            offset += 4
+        dims = 2 + bool(geom_type & 0x80000000) + bool(geom_type & 0x40000000)
+        geom_type &= 0x0fffffff
+        dims += {0: 0, 1: 1, 2: 1, 3: 2}[geom_type // 1000]
+        geom_type %= 1000
+
+        def coords(n):
+            c = struct.unpack_from(endian + '%dd' % (n * dims), wkb, offset)
+            if dims != 2:
+                c = [x for i in range(0, len(c), dims) for x in c[i:i+2]]
+            return c
+
+        if geom_type == 1: # Point
+            c = coords(1)
+            return ([] if c[0] != c[0] else [c]), offset + 8 * dims # NaN on POINT EMPTY
+        elif geom_type in (2, 3): # LineString, Polygon
+            if geom_type == 2:
+                nrings = 1
+            else:
+                (nrings,) = struct.unpack_from(endian + 'I', wkb, offset)
+                offset += 4
+            sequences = []
+            for _ in range(nrings):
+                (n,) = struct.unpack_from(endian + 'I', wkb, offset)
+                offset += 4
+                if n:
+                    sequences.append(coords(n))
+                offset += 8 * dims * n
+            return sequences, offset
+        elif geom_type in (4, 5, 6, 7): # Multi* and GeometryCollection
+            (n,) = struct.unpack_from(endian + 'I', wkb, offset)
+            offset += 4
+            sequences = []
+            for _ in range(n):
+                sub_sequences, offset = self.get_sequences_wkb(wkb, offset)
+                sequences += sub_sequences
+            if geom_type == 4 and sequences:
+                # MULTIPOINT(x y,x y) is a single sequence in WKT
+                sequences = [[x for c in sequences for x in c]]
+            return sequences, offset
+        else:
+            raise NotImplementedError('WKB geometry type {0}'.format(geom_type))
+
+    def get_points_wkb(self, wkb):
+        pts = []
+        for sequence in self.get_sequences_wkb(wkb)[0]:
+            # Keep the same points as get_points() on the WKT
+            pts += self.get_points_xy(sequence)[::2]
+        return pts
+
+    def positionAsBinary(self, res):
+        """
+        Position from a sql_as_binary(geom) column. The WKB is decoded locally,
+        PostGIS >= 3.1 formats coordinates the same way. With older PostGIS the
+        column is ST_AsText(geom). On unsupported geometry type, formatted by
+        ST_AsText().
+        """
+        if res is None:
+            self.logger.err("NULL location provided")
+            return []
+        if isinstance(res, str):
+            self.positionAsText(res)
+            return
+        if self.wkb_as_text_local:
+            try:
+                self.geom["position"].extend(self.get_points_wkb(res))
+                return
+            except NotImplementedError:
+                pass
+        self.positionAsText(self.wkb_as_text(res))
+
 #    def positionWay(self, res):
 #        self.geom["position"].append()
 
@@ -643,6 +899,7 @@ WHERE
 
 
 ###########################################################################
+import unittest
 from .Analyser import TestAnalyser
 from modules import IssuesFileOsmose
 
@@ -658,6 +915,7 @@ class TestAnalyserOsmosis(TestAnalyser):
         (conf, analyser_conf) = cls.init_config(osm_file, dst, analyser_options)
         class c_options:
             import_tool = "osmosis"
+            import_jobs = 1
         options = c_options()
 
         if not skip_db:
@@ -701,6 +959,87 @@ class TestAnalyserOsmosis(TestAnalyser):
         except OSError:
             pass
 
+class TestPosition(unittest.TestCase):
+    class analyser(Analyser_Osmosis):
+        def __init__(self):
+            pass
+
+    def test_format_coordinate(self):
+        f = Analyser_Osmosis.format_coordinate
+        self.assertEqual(f(2.0), "2")
+        self.assertEqual(f(-61.0), "-61")
+        self.assertEqual(f(-0.0), "0")
+        self.assertEqual(f(48.8566141), "48.8566141")
+        self.assertEqual(f(1e-05), "0.00001")
+        self.assertEqual(f(0.1 + 0.2), "0.3")
+        self.assertEqual(f(123.45678901234567), "123.456789012346")
+
+    def test_wkb(self):
+        import shapely.wkb
+        import shapely.wkt
+
+        a = self.analyser()
+        for wkt in ["POINT(-1.5 48.8566141)",
+                    "LINESTRING(1 2,3 4,5 6,7 8)",
+                    "POLYGON((0 0,1 0,1 1,0 0),(0.2 0.2,0.3 0.2,0.3 0.3,0.2 0.2))",
+                    "MULTIPOINT(1 2,3 4,5 6)",
+                    "MULTILINESTRING((1 2,3 4),(5 6,7 8,9 9))",
+                    "GEOMETRYCOLLECTION(POINT(1 2),LINESTRING(3 4,5 6,7 8))"]:
+            geom = shapely.wkt.loads(wkt)
+            self.assertEqual(a.get_points_wkb(shapely.wkb.dumps(geom)), a.get_points(wkt), wkt)
+            self.assertEqual(a.get_points_wkb(shapely.wkb.dumps(geom, big_endian=True)), a.get_points(wkt), wkt)
+        self.assertEqual(a.get_points_wkb(shapely.wkb.dumps(shapely.wkt.loads("POINT Z (1 2 3)"))), [{"lat": "2", "lon": "1"}])
+        self.assertEqual(a.get_points_wkb(shapely.wkb.dumps(shapely.wkt.loads("POINT (1 2)"), srid=4326)), [{"lat": "2", "lon": "1"}])
+
+    def test_wkb_fallback(self):
+        import shapely.wkb
+        import shapely.wkt
+
+        a = self.analyser()
+        a.geom = defaultdict(list)
+        a.wkb_as_text_local = True
+        a.wkb_as_text = lambda wkb: "CIRCULARSTRING(0 0,1 1,2 0)"
+        # Circular string, WKB type 8, formatted by PostGIS
+        a.positionAsBinary(b"\x01\x08\x00\x00\x00")
+        self.assertEqual(a.geom["position"], a.get_points("CIRCULARSTRING(0 0,1 1,2 0)"))
+
+        a.geom = defaultdict(list)
+        a.wkb_as_text_local = False
+        a.wkb_as_text = lambda wkb: "POINT(1 2)"
+        a.positionAsBinary(shapely.wkb.dumps(shapely.wkt.loads("POINT (1 2)")))
+        self.assertEqual(a.geom["position"], [{"lat": "2", "lon": "1"}])
+
+    def test_wkb_as_text_column(self):
+        a = self.analyser()
+        a.geom = defaultdict(list)
+        a.wkb_as_text_local = False
+        def wkb_as_text(wkb):
+            raise AssertionError("No query expected")
+        a.wkb_as_text = wkb_as_text
+        # PostGIS < 3.1, ST_AsText() column
+        a.positionAsBinary("LINESTRING(1 2,3 4)")
+        self.assertEqual(a.geom["position"], a.get_points("LINESTRING(1 2,3 4)"))
+
+    def test_wkb_local(self):
+        import shapely.wkb
+        import shapely.wkt
+
+        a = self.analyser()
+        a.geom = defaultdict(list)
+        a.wkb_as_text_local = True
+        def wkb_as_text(wkb):
+            raise AssertionError("No query expected")
+        a.wkb_as_text = wkb_as_text
+        a.positionAsBinary(memoryview(shapely.wkb.dumps(shapely.wkt.loads("LINESTRING (1.5 2.25, 3 4)"))))
+        self.assertEqual(a.geom["position"], a.get_points("LINESTRING(1.5 2.25,3 4)"))
+
+    def test_xy(self):
+        a = self.analyser()
+        a.geom = defaultdict(list)
+        a.positionXY([-1.5, 48.8566141])
+        self.assertEqual(a.geom["position"], a.get_points("POINT(-1.5 48.8566141)"))
+
+
 class Test(TestAnalyserOsmosis):
     from modules import config
     default_xml_res_path = config.dir_tmp + "/tests/osmosis/"
@@ -741,6 +1080,101 @@ class Test(TestAnalyserOsmosis):
                     self.root_err = self.load_errors()
                     self.check_num_err(min=0, max=5)
 
+    def test_run00_server_side_cursor(self):
+        # streamed rows must be the same as with the client side cursor
+        self.analyser_conf.error_file = None
+        with Analyser_Osmosis(self.analyser_conf, self.logger) as analyser_obj:
+            analyser_obj.cursor_itersize = 1000
+            sql = "SELECT i, 'N' || i FROM generate_series(1, 25000) AS t(i)"
+            self.assertTrue(analyser_obj.streamable(sql))
+            self.assertFalse(analyser_obj.streamable("CREATE TEMP TABLE t AS " + sql))
+            self.assertFalse(analyser_obj.streamable(sql + "; " + sql))
+
+            rows = []
+            analyser_obj.run00(sql, lambda res: rows.append((res[0], res[1])))
+            self.assertEqual(rows, [(i, 'N' + str(i)) for i in range(1, 25001)])
+
+            rows = []
+            analyser_obj.run00("CREATE TEMP TABLE t AS " + sql + "; SELECT * FROM t ORDER BY i", lambda res: rows.append((res[0], res[1])))
+            self.assertEqual(len(rows), 25000)
+
+            # Callbacks querying giscurs do not discard the iterated rows
+            def callback(res):
+                analyser_obj.giscurs.execute("SELECT %s", [res[0]])
+                rows.append(analyser_obj.giscurs.fetchone()[0])
+            for q in [sql, "SELECT * FROM t ORDER BY i; " + sql]:
+                rows = []
+                analyser_obj.run00(q, callback)
+                self.assertEqual(rows, list(range(1, 25001)))
+
+    def test_position_binary(self):
+        # Same positions as from ST_AsText() of the configured PostGIS
+        self.analyser_conf.error_file = None
+        with Analyser_Osmosis(self.analyser_conf, self.logger) as analyser_obj:
+            analyser_obj.init_analyser()
+            for wkt in ["POINT(-1.5 48.8566141)",
+                        "POINT(2.35222190000001 48.856614)",
+                        "POINT(0.1 0.00001)",
+                        "LINESTRING(123.45678901234567 -0.30000000000000004,3 4,5 6)",
+                        "POLYGON((0 0,1 0,1 1,0 0))",
+                        "MULTIPOINT(1 2,3 4)",
+                        "GEOMETRYCOLLECTION(POINT(1 2),LINESTRING(3 4,5 6,7 8))",
+                        "CIRCULARSTRING(0 0,1 1,2 0)"]:
+                analyser_obj.giscurs.execute("SELECT ST_AsText(ST_GeomFromText(%s)), {0}(ST_GeomFromText(%s))".format(analyser_obj.sql_as_binary), [wkt, wkt])
+                text, wkb = analyser_obj.giscurs.fetchone()
+                analyser_obj.geom = defaultdict(list)
+                analyser_obj.positionAsBinary(wkb)
+                self.assertEqual(analyser_obj.geom["position"], analyser_obj.get_points(text), wkt)
+
+    def test_touched(self):
+        # transitive_touched must match the original join based computation
+        self.conf.osmosis_manager.set_pgsql_schema()
+
+        for script in self.conf.osmosis_change_init_post_scripts:
+            self.conf.osmosis_manager.psql_f(script)
+
+        self.conf.osmosis_manager.psql_c("TRUNCATE TABLE actions;"
+                                         "INSERT INTO actions (SELECT 'R', 'M', id FROM relations WHERE id % 3 = 0);"
+                                         "INSERT INTO actions (SELECT 'W', 'M', id FROM ways WHERE id % 5 = 0);"
+                                         "INSERT INTO actions (SELECT 'N', 'M', id FROM nodes WHERE id % 7 = 0);")
+
+        for script in self.conf.osmosis_change_post_scripts:
+            self.conf.osmosis_manager.psql_f(script)
+
+        sql = """
+WITH
+n AS (
+    SELECT 'N' AS data_type, id FROM actions WHERE data_type = 'N' AND action IN ('C', 'M')
+),
+w AS (
+    SELECT 'W' AS data_type, id FROM actions WHERE data_type = 'W' AND action IN ('C', 'M')
+    UNION
+    SELECT 'W', way_nodes.way_id FROM way_nodes JOIN actions ON way_nodes.node_id = actions.id AND data_type = 'N' AND action = 'M'
+),
+r AS (
+    SELECT 'R' AS data_type, id FROM actions WHERE data_type = 'R' AND action IN ('C', 'M')
+    UNION
+    SELECT 'R', relation_members.relation_id FROM relation_members JOIN actions ON relation_members.member_id = actions.id AND data_type = 'N' AND action = 'M' WHERE relation_members.member_type = 'N'
+    UNION
+    SELECT 'R', relation_members.relation_id FROM relation_members JOIN w ON relation_members.member_id = w.id WHERE relation_members.member_type = 'W'
+),
+expected AS (
+    SELECT * FROM n UNION SELECT * FROM w UNION SELECT * FROM r
+)
+SELECT
+    (SELECT count(*) FROM expected),
+    (SELECT count(*) FROM transitive_touched),
+    (SELECT count(*) FROM expected FULL JOIN transitive_touched USING (data_type, id) WHERE expected.id IS NULL OR transitive_touched.id IS NULL)
+"""
+        self.analyser_conf.error_file = None
+        with Analyser_Osmosis(self.analyser_conf, self.logger) as analyser_obj:
+            analyser_obj.init_analyser()
+            analyser_obj.giscurs.execute(sql)
+            (expected, touched, diff) = analyser_obj.giscurs.fetchone()
+        self.assertGreater(expected, 0)
+        self.assertEqual(expected, touched)
+        self.assertEqual(diff, 0)
+
     def test_change_empty(self):
         # run all available osmosis analysers, for basic SQL check
         import importlib
@@ -19,63 +19,40 @@
 ##                                                                       ##
 ###########################################################################
 
+import os
 from modules.OsmoseTranslation import T_
+from modules import SourceVersion
+from modules import config as modules_config
 from .Analyser_Osmosis import Analyser_Osmosis
 
 sql10 = """
 CREATE TEMP TABLE c1 AS
-WITH
-cvqnotag AS (
-    SELECT
-        ways.id,
-        tags - ARRAY['source', 'created_by'] AS tags,
-        CASE
-            WHEN ST_X(ST_StartPoint(linestring)) = ST_X(ST_StartPoint(linestring)) THEN
-                CASE
-                    WHEN ST_Y(ST_StartPoint(linestring)) < ST_Y(ST_StartPoint(linestring)) THEN linestring
-                    ELSE ST_Reverse(linestring)
-                END
-            WHEN ST_X(ST_StartPoint(linestring)) < ST_X(ST_StartPoint(linestring)) THEN linestring
-            ELSE ST_Reverse(linestring)
-        END as linestring,
-        sha224(ST_AsBinary(
-            CASE
-                WHEN ST_X(ST_StartPoint(linestring)) = ST_X(ST_StartPoint(linestring)) THEN
-                    CASE
-                        WHEN ST_Y(ST_StartPoint(linestring)) < ST_Y(ST_StartPoint(linestring)) THEN linestring
-                        ELSE ST_Reverse(linestring)
-                    END
-                WHEN ST_X(ST_StartPoint(linestring)) < ST_X(ST_StartPoint(linestring)) THEN linestring
-                ELSE ST_Reverse(linestring)
-            END
-        )) as linestring_hash
-    FROM
-        ways
-        LEFT JOIN relation_members ON
-            relation_members.member_id = ways.id AND
-            relation_members.member_type = 'W'
-    WHERE
-        relation_members.member_id IS NULL AND
-        ways.tags = ''::hstore AND
-        ST_NPoints(ways.linestring) > 1 AND
-        ST_IsValid(linestring)
-),
-c AS (
-    SELECT
-        id,
-        tags,
-        linestring_hash,
-        linestring,
-        COUNT(*) OVER (PARTITION BY linestring_hash) as count
-    FROM
-        cvqnotag
-)
 SELECT
-    *
+    ways.id,
+    linestring_normalized(ways.linestring) AS linestring,
+    way_fingerprints.linestring_hash
 FROM
-    c
+    (
+        SELECT
+            linestring_hash
+        FROM
+            way_fingerprints
+        GROUP BY
+            linestring_hash
+        HAVING
+            COUNT(*) >= 2
+    ) AS duplicates
+    JOIN way_fingerprints ON
+        way_fingerprints.linestring_hash = duplicates.linestring_hash
+    JOIN ways ON
+        ways.id = way_fingerprints.id
+    LEFT JOIN relation_members ON
+        relation_members.member_id = ways.id AND
+        relation_members.member_type = 'W'
 WHERE
-    count >= 2
+    relation_members.member_id IS NULL AND
+    ways.tags = ''::hstore AND
+    way_fingerprints.is_valid
 """
 
 sql11 = """
@@ -98,59 +75,35 @@ WHERE
 
 sql20 = """
 CREATE TEMP TABLE c2 AS
-WITH
-cvqn AS (
-    SELECT
-        ways.id,
-        tags - ARRAY['source', 'created_by'] AS tags,
-        CASE
-            WHEN ST_X(ST_StartPoint(linestring)) = ST_X(ST_StartPoint(linestring)) THEN
-                CASE
-                    WHEN ST_Y(ST_StartPoint(linestring)) < ST_Y(ST_StartPoint(linestring)) THEN linestring
-                    ELSE ST_Reverse(linestring)
-                END
-            WHEN ST_X(ST_StartPoint(linestring)) < ST_X(ST_StartPoint(linestring)) THEN linestring
-            ELSE ST_Reverse(linestring)
-        END as linestring,
-        sha224(ST_AsBinary(
-            CASE
-                WHEN ST_X(ST_StartPoint(linestring)) = ST_X(ST_StartPoint(linestring)) THEN
-                    CASE
-                        WHEN ST_Y(ST_StartPoint(linestring)) < ST_Y(ST_StartPoint(linestring)) THEN linestring
-                        ELSE ST_Reverse(linestring)
-                    END
-                WHEN ST_X(ST_StartPoint(linestring)) < ST_X(ST_StartPoint(linestring)) THEN linestring
-                ELSE ST_Reverse(linestring)
-            END
-        )) as linestring_hash
-    FROM
-        ways
-        LEFT JOIN relation_members ON
-            relation_members.member_id = ways.id AND
-            relation_members.member_type = 'W'
-    WHERE
-        relation_members.member_id IS NULL AND
-        ways.tags != ''::hstore AND
-        tags ?| ARRAY['area', 'name', 'natural', 'landuse', 'waterway', 'amenity', 'highway', 'leisure', 'barrier', 'railway', 'addr:interpolation', 'man_made', 'power', 'aeroway'] AND
-        ST_NPoints(ways.linestring) > 1 AND
-        ST_IsValid(linestring)
-),
-c AS (
-    SELECT
-        id,
-        tags,
-        linestring_hash,
-        linestring,
-        COUNT(*) OVER (PARTITION BY linestring_hash) as count
-    FROM
-        cvqn
-)
 SELECT
-    *
+    ways.id,
+    ways.tags - ARRAY['source', 'created_by'] AS tags,
+    way_fingerprints.tags_hash,
+    linestring_normalized(ways.linestring) AS linestring,
+    way_fingerprints.linestring_hash
 FROM
-    c
+    (
+        SELECT
+            linestring_hash
+        FROM
+            way_fingerprints
+        GROUP BY
+            linestring_hash
+        HAVING
+            COUNT(*) >= 2
+    ) AS duplicates
+    JOIN way_fingerprints ON
+        way_fingerprints.linestring_hash = duplicates.linestring_hash
+    JOIN ways ON
+        ways.id = way_fingerprints.id
+    LEFT JOIN relation_members ON
+        relation_members.member_id = ways.id AND
+        relation_members.member_type = 'W'
 WHERE
-    count >= 2
+    relation_members.member_id IS NULL AND
+    ways.tags != ''::hstore AND
+    ways.tags ?| ARRAY['area', 'name', 'natural', 'landuse', 'waterway', 'amenity', 'highway', 'leisure', 'barrier', 'railway', 'addr:interpolation', 'man_made', 'power', 'aeroway'] AND
+    way_fingerprints.is_valid
 """
 
 sql21 = """
@@ -162,8 +115,7 @@ SELECT
     b1.id AS id1,
     b2.id AS id2,
     ST_AsText(ST_Centroid(b1.linestring)),
---    ((b1.tags @> b2.tags ) AND (b2.tags @> b1.tags ))
-    b1.tags = b2.tags
+    b1.tags_hash = b2.tags_hash
 FROM
     c2 AS b1
     JOIN c2 AS b2 ON
@@ -280,6 +232,16 @@ GROUP BY
 
 class Analyser_Osmosis_Duplicated_Geotag(Analyser_Osmosis):
 
+    # The duplicated ways are compared on linestring_normalized() from
+    # CreateFunctions.sql, part of the version. It normalizes the direction,
+    # since then the ways duplicated in opposite directions are reported too.
+    @classmethod
+    def class_version(cls):
+        return SourceVersion.version(cls, os.path.join(modules_config.dir_osmose, "osmosis", "CreateFunctions.sql"))
+
+    def analyser_version(self):
+        return self.class_version()
+
     def __init__(self, config, logger = None):
         Analyser_Osmosis.__init__(self, config, logger)
         self.classs[1] = self.def_class(item = 1230, level = 1, tags = ['geom', 'fix:chair'],
@@ -33,29 +33,20 @@ SELECT
   ST_Transform(nodes.geom, {0}) AS geom
 FROM (
   SELECT
-    t.id,
-    t.nid,
-    t.nodes
-  FROM (
-    SELECT
-      id,
-      linestring,
-      ends(nodes) AS nid,
-      nodes
-    FROM
-      highways
-    WHERE
-      highway NOT IN ('motorway', 'motorway_link', 'trunk', 'trunk_link', 'service', 'footway', 'path', 'platform', 'steps') AND
-      NOT is_construction AND
-      NOT is_polygon AND
-      ST_Length(linestring_proj) > 10
-    ) AS t
-    LEFT JOIN highways ON
-      highways.id != t.id AND
-      highways.linestring && t.linestring AND
-      t.nid = ANY(highways.nodes)
-    WHERE
-      highways.id IS NULL
+    highways.id,
+    topology.nid,
+    highways.nodes
+  FROM
+    highways
+    JOIN highway_node_topology AS topology ON
+      topology.id = highways.id AND
+      topology.is_end AND
+      topology.degree = 1 -- no other highway on the end
+  WHERE
+    highways.highway NOT IN ('motorway', 'motorway_link', 'trunk', 'trunk_link', 'service', 'footway', 'path', 'platform', 'steps') AND
+    NOT highways.is_construction AND
+    NOT highways.is_polygon AND
+    ST_Length(highways.linestring_proj) > 10
   ) as t
   JOIN nodes ON
     nodes.id = t.nid AND
@@ -94,7 +85,7 @@ WHERE
 
 class Analyser_Osmosis_Highway_Almost_Junction(Analyser_Osmosis):
 
-    requires_tables_common = ['highways']
+    requires_tables_common = ['highways', 'highway_node_topology']
 
     def __init__(self, config, logger = None):
         Analyser_Osmosis.__init__(self, config, logger)
@@ -27,7 +27,7 @@ sql20 = """
 SELECT
     wid,
     nid,
-    ST_AsText(geom),
+    {as_binary}(geom),
     highway
 FROM (
 SELECT
@@ -37,10 +37,11 @@ SELECT
     MIN(way_ends.highway) AS highway
 FROM
     {0}highway_ends AS way_ends
-    JOIN highways ON
-        highways.linestring && way_ends.linestring AND
-        way_ends.nid = ANY(highways.nodes) AND
-        NOT highways.is_construction
+    JOIN highway_node_topology AS topology ON
+        topology.nid = way_ends.nid AND
+        topology.id = way_ends.id AND
+        topology.is_end AND
+        topology.degree - topology.degree_construction = 1 -- the only highway on the node
     JOIN nodes ON
         nodes.id = way_ends.nid AND
         (NOT nodes.tags?'amenity' OR nodes.tags->'amenity' != 'bicycle_parking') AND
@@ -75,46 +76,41 @@ sql30 = """
 CREATE TEMP TABLE oneway AS
 SELECT
   id,
-  t.nid,
+  nid,
   nid_index
 FROM (
   SELECT
-    id,
-    CASE oneway_1
-      WHEN false THEN nodes[nid_index]
-      WHEN true THEN nodes[length - nid_index + 1]
-    END AS nid,
-    nid_index,
-    length
-  FROM (
-    SELECT
-      id,
-      nodes,
-      tags?'oneway' AND tags->'oneway' = '-1' AS oneway_1,
-      generate_subscripts(nodes, 1) AS nid_index,
-      array_length(nodes, 1) AS length
-    FROM
-      highways
-    WHERE
-      NOT highways.is_construction AND
-      highway != 'motorway' AND -- Ignore motorway even with oneway tag
-      highway != 'raceway' AND -- Usually not part of the regular road network
-      (
-        is_oneway OR
-        is_roundabout
-      )
-  ) AS t
+    topology.id,
+    topology.nid,
+    -- Order of the nodes in the way direction
+    CASE highways.tags?'oneway' AND highways.tags->'oneway' = '-1'
+      WHEN false THEN topology.position
+      WHEN true THEN -topology.position
+    END AS nid_index,
+    topology.is_end
+  FROM
+    highways
+    JOIN highway_node_topology AS topology ON
+      topology.id = highways.id
+  WHERE
+    NOT highways.is_construction AND
+    highway != 'motorway' AND -- Ignore motorway even with oneway tag
+    highway != 'raceway' AND -- Usually not part of the regular road network
+    (
+      is_oneway OR
+      is_roundabout
+    )
 ) AS t
   JOIN way_nodes ON
     way_nodes.node_id = t.nid
 GROUP BY
   id,
-  t.nid,
+  nid,
   nid_index,
-  length
+  is_end
 HAVING
   COUNT(*) > 1 OR
-  nid_index IN (1, length)
+  is_end
 """
 
 sql31 = """
@@ -199,7 +195,7 @@ SELECT
   DISTINCT ON (oneway.id)
   oneway.id,
   oneway.nid,
-  (SELECT ST_AsText(geom) FROM nodes WHERE id = oneway.nid)
+  (SELECT {as_binary}(geom) FROM nodes WHERE id = oneway.nid)
 FROM
   oneway
   LEFT JOIN r ON
@@ -211,19 +207,16 @@ WHERE
 sql40 = """
 SELECT
   drivethroughs.id,
-  nid,
-  ST_AsText(nodes.geom)
+  topology.nid,
+  {as_binary}(nodes.geom)
 FROM
   highways AS drivethroughs
-  JOIN highway_ends ON
-    drivethroughs.linestring && highway_ends.geom AND
-    highway_ends.nid = ANY(drivethroughs.nodes)
-  LEFT JOIN highways AS other_highways ON
-    other_highways.linestring && highway_ends.geom AND
-    highway_ends.nid = ANY(other_highways.nodes) AND
-    other_highways.id != drivethroughs.id
+  JOIN highway_node_topology AS topology ON
+    topology.id = drivethroughs.id AND
+    topology.is_end AND
+    topology.degree = 1 -- no other highway on the node
   JOIN nodes ON
-    nodes.id = highway_ends.nid AND
+    nodes.id = topology.nid AND
     (NOT nodes.tags?'highway' OR (
       nodes.tags->'highway' != 'turning_circle' AND
       nodes.tags->'highway' != 'turning_loop' AND
@@ -235,14 +228,14 @@ WHERE
   drivethroughs.tags?'service' AND
   drivethroughs.tags->'service' = 'drive-through' AND
   NOT drivethroughs.is_oneway AND
-  other_highways.id IS NULL
+  NOT drivethroughs.is_area
 """
 
 class Analyser_Osmosis_Highway_DeadEnd(Analyser_Osmosis):
 
-    requires_tables_common = ['highways', 'highway_ends']
-    requires_tables_full = ['highway_ends']
-    requires_tables_diff = ['touched_highway_ends']
+    requires_tables_common = ['highways', 'highway_ends', 'highway_node_topology']
+    requires_tables_full = ['highway_ends', 'highway_node_topology']
+    requires_tables_diff = ['touched_highway_ends', 'highway_node_topology']
 
     def __init__(self, config, logger = None):
         Analyser_Osmosis.__init__(self, config, logger)
@@ -276,7 +269,7 @@ Ensure that `service=drive-through` is the correct tag.''')),
 '''Review the type of the service road or draw the local road network.'''),
             resource = 'https://wiki.openstreetmap.org/wiki/Tag:service%3Ddrive-through')
 
-        self.callback20 = lambda res: {"class":1 if res[3] == 'cycleway' else 2, "data":[self.way_full, self.node_full, self.positionAsText]}
+        self.callback20 = lambda res: {"class":1 if res[3] == 'cycleway' else 2, "data":[self.way_full, self.node_full, self.positionAsBinary]}
 
     def analyser_osmosis_common(self):
         self.run(sql30)
@@ -284,14 +277,14 @@ Ensure that `service=drive-through` is the correct tag.''')),
         self.run(sql32)
         self.run(sql33)
         self.run(sql34)
-        self.run(sql35, lambda res: {"class":3, "data":[self.way_full, self.node, self.positionAsText]})
-        self.run(sql40, lambda res: {"class":5, "data":[self.way_full, self.node, self.positionAsText]})
+        self.run(sql35.format(as_binary=self.sql_as_binary), lambda res: {"class":3, "data":[self.way_full, self.node, self.positionAsBinary]})
+        self.run(sql40.format(as_binary=self.sql_as_binary), lambda res: {"class":5, "data":[self.way_full, self.node, self.positionAsBinary]})
 
     def analyser_osmosis_full(self):
-        self.run(sql20.format(''), self.callback20)
+        self.run(sql20.format('', as_binary=self.sql_as_binary), self.callback20)
 
     def analyser_osmosis_diff(self):
-        self.run(sql20.format('touched_'), self.callback20)
+        self.run(sql20.format('touched_', as_binary=self.sql_as_binary), self.callback20)
 
 
 ###########################################################################
@@ -20,7 +20,10 @@
 ##                                                                       ##
 ###########################################################################
 
+import numpy
+from array import array
 from modules.OsmoseTranslation import T_
+from modules.IdSet import IdSet
 from .Analyser_Osmosis import Analyser_Osmosis
 
 
@@ -64,10 +67,10 @@ sql11 = """
 CREATE INDEX idx_starts_linestring on starts USING gist(linestring)
 """
 
-sqlb13 = """
-CREATE TEMP TABLE islands0 AS
+sql12 = """
 SELECT
-  unnest(ST_ClusterIntersecting(linestring)) AS geom
+  id,
+  nodes
 FROM
   highways
 WHERE
@@ -75,49 +78,103 @@ WHERE
   (NOT tags?'golf' OR tags->'golf' != 'cartpath')
 """
 
-sqlb14 = """
-CREATE TEMP TABLE islands AS
+sql16 = """
 SELECT
-  ROW_NUMBER () OVER () AS cluster_id,
-  ST_SetSRID((ST_Dump(geom)).geom, 4326) AS linestring
+  a.id,
+  b.id
 FROM
-  islands0
+  floating
+  JOIN highways AS a ON
+    a.id = floating.id
+  JOIN highways AS b ON
+    a.id != b.id AND
+    ST_Intersects(a.linestring, b.linestring) AND
+    NOT a.nodes && b.nodes
+WHERE
+  NOT b.is_construction AND
+  (NOT b.tags?'golf' OR b.tags->'golf' != 'cartpath')
 """
 
-sqlb15 = """
-DROP TABLE islands0
+sql17 = """
+SELECT DISTINCT
+  highways.id
+FROM
+  starts
+  JOIN highways ON
+    ST_Intersects(starts.linestring, highways.linestring)
+WHERE
+  NOT highways.is_construction AND
+  (NOT highways.tags?'golf' OR highways.tags->'golf' != 'cartpath')
 """
 
-sqlb16 = """
-CREATE INDEX idx_islands_linestring on islands USING gist(linestring)
+sql13 = """
+CREATE TEMP TABLE floating (
+  id bigint PRIMARY KEY
+)
 """
 
-sqlb17 = """
-CREATE TEMP TABLE connected_islands AS
-SELECT
-  DISTINCT(islands.cluster_id) AS cluster_id
-FROM
-  islands
-  JOIN starts ON
-    ST_Intersects(starts.linestring, islands.linestring)
+sql14 = """
+INSERT INTO floating
+SELECT id FROM unnest(%(ids)s::bigint[]) AS v(id)
+"""
+
+sql18 = """
+TRUNCATE floating
 """
 
-sqlb18 = """
+sql15 = """
 SELECT
   highways.id,
   ST_AsText(way_locate(highways.linestring))
 FROM
-  highways
-  LEFT JOIN islands ON
-    islands.cluster_id IN (SELECT cluster_id FROM connected_islands) AND
-    ST_Intersects(islands.linestring, highways.linestring)
+  floating
+  JOIN highways ON
+    highways.id = floating.id
 WHERE
-  NOT highways.is_construction AND
-  (NOT tags?'golf' OR tags->'golf' != 'cartpath') AND
-  highways.level IS NOT NULL AND
-  islands.linestring IS NULL
+  highways.level IS NOT NULL
 """
 
+
+def connected_components(ways, nodes):
+    """
+    Label the ways by connected component, ways sharing a node being
+    connected.
+    @param ways index of the way of each node reference
+    @param nodes node ids of the node references
+    @return component label of each way, as the lowest way index of the
+    component
+    """
+    ways = numpy.asarray(ways, dtype=numpy.int64)
+    nodes = numpy.asarray(nodes, dtype=numpy.int64)
+    n = int(ways.max()) + 1 if len(ways) else 0
+    label = numpy.arange(n, dtype=numpy.int64)
+
+    # Consecutive ways on the same node, after sort by node
+    order = numpy.lexsort((ways, nodes))
+    ways, nodes = ways[order], nodes[order]
+    same = nodes[1:] == nodes[:-1]
+    u, v = ways[:-1][same], ways[1:][same]
+    keep = u != v
+    u, v = u[keep], v[keep]
+
+    # Hook the labels of the edge ends to the lowest one, then shortcut
+    # label chains, until stable
+    while True:
+        lu, lv = label[u], label[v]
+        low = numpy.minimum(lu, lv)
+        changed = label.copy()
+        numpy.minimum.at(changed, lu, low)
+        numpy.minimum.at(changed, lv, low)
+        while True:
+            jumped = changed[changed]
+            if numpy.array_equal(jumped, changed):
+                break
+            changed = jumped
+        if numpy.array_equal(changed, label):
+            return label
+        label = changed
+
+
 class Analyser_Osmosis_Highway_Floating_Islands(Analyser_Osmosis):
 
     requires_tables_common = ['highways']
@@ -143,9 +200,73 @@ class Analyser_Osmosis_Highway_Floating_Islands(Analyser_Osmosis):
 
         self.run(sql10.format(boundary_ids=boundary_relation))
         self.run(sql11)
-        self.run(sqlb13)
-        self.run(sqlb14)
-        self.run(sqlb15)
-        self.run(sqlb16)
-        self.run(sqlb17)
-        self.run(sqlb18, self.callback10)
+
+        # Highways by index, connected through their nodes, or crossing
+        # without a shared node on a fake node of negative id
+        ids = array('q')
+        ways = array('q')
+        nodes = array('q')
+        def add_highway(res):
+            ways.extend([len(ids)] * len(res[1]))
+            ids.append(res[0])
+            nodes.extend(res[1])
+        self.run(sql12, add_highway)
+        sorted_ids = numpy.frombuffer(ids, dtype=numpy.int64)
+        order = numpy.argsort(sorted_ids)
+        sorted_ids = sorted_ids[order]
+        index = lambda id: int(order[numpy.searchsorted(sorted_ids, id)])
+
+        # Highways touching an entry point
+        starts = array('q')
+        self.run(sql17, lambda res: starts.append(index(res[0])))
+
+        def floating_ids():
+            label = connected_components(numpy.frombuffer(ways, dtype=numpy.int64), numpy.frombuffer(nodes, dtype=numpy.int64))
+            if len(label) < len(ids):
+                # Trailing ways without nodes
+                label = numpy.concatenate((label, numpy.arange(len(label), len(ids), dtype=numpy.int64)))
+            connected = numpy.zeros(len(ids), dtype=bool)
+            connected[label[numpy.frombuffer(starts, dtype=numpy.int64)]] = True
+            return IdSet(numpy.frombuffer(ids, dtype=numpy.int64)[~connected[label]])
+
+        self.run(sql13)
+
+        # Only the highways not connected through the nodes are looked for
+        # crossings, other crossings do not change the result
+        for chunk in floating_ids().chunks(100000):
+            self.giscurs.execute(sql14, {'ids': chunk})
+        def add_crossing(res):
+            nodes.extend([- len(nodes) - 1] * 2)
+            ways.extend([index(res[0]), index(res[1])])
+        self.run(sql16, add_crossing)
+
+        self.run(sql18)
+        for chunk in floating_ids().chunks(100000):
+            self.giscurs.execute(sql14, {'ids': chunk})
+        self.run(sql15, self.callback10)
+
+
+###########################################################################
+import unittest
+
+class Test(unittest.TestCase):
+
+    def test_connected_components(self):
+        # 0 -1- 1 -2- 2, 3 alone, 4 -5- on a shared middle node
+        ways = [0, 0, 1, 1, 1, 2, 3, 3, 4, 4, 4, 5, 5]
+        nodes = [10, 11, 11, 12, 13, 13, 20, 21, 30, 31, 32, 40, 31]
+        self.assertEqual(connected_components(ways, nodes).tolist(), [0, 0, 0, 3, 4, 4])
+        self.assertEqual(connected_components([], []).tolist(), [])
+
+    def test_connected_components_chain(self):
+        # Ways linked in reverse order, a chain of labels to shortcut
+        n = 1000
+        ways = [w for w in range(n) for _ in range(2)]
+        nodes = [n - w + i for w in range(n) for i in range(2)]
+        self.assertEqual(connected_components(ways, nodes).tolist(), [0] * n)
+
+    def test_connected_components_crossing(self):
+        # 0 and 1 without shared node, crossing on a fake negative node
+        ways = [0, 0, 1, 1, 2, 2, 0, 1]
+        nodes = [10, 11, 20, 21, 30, 31, -1, -1]
+        self.assertEqual(connected_components(ways, nodes).tolist(), [0, 0, 2])
@@ -24,25 +24,33 @@ from modules.Stablehash import stablehash64
 from modules.OsmoseTranslation import T_
 from .Analyser_Osmosis import Analyser_Osmosis
 
+# Buffers of 0.001 overlap under 0.002 apart, clusters of nodes within
+# 0.002 hold the overlapping buffers. Polygons of less than 4 buffers are
+# under 1e-5.
 sql10 = """
 SELECT
     ST_AsText(ST_Centroid(geom))
 FROM
 (
     SELECT
-        (ST_Dump(ST_MemUnion(ST_Buffer(geom, 0.001, 'quad_segs=2')))).geom AS geom
+        (ST_Dump(ST_Union(ST_Buffer(geom, 0.001, 'quad_segs=2')))).geom AS geom
     FROM
     (
-        SELECT geom
-        FROM nodes
-        LEFT JOIN way_nodes ON
-            nodes.id = way_nodes.node_id
-        WHERE
-            way_nodes.node_id IS NULL AND
-            tags = ''::hstore AND
-            version = 1
-        LIMIT 3000
+        SELECT
+            geom,
+            ST_ClusterDBSCAN(geom, eps := 0.002, minpoints := 1) OVER () AS cluster_id
+        FROM
+        (
+            SELECT geom
+            FROM orphan_nodes
+            WHERE version = 1
+            LIMIT 3000
+        ) AS n
     ) AS n
+    GROUP BY
+        cluster_id
+    HAVING
+        COUNT(*) >= 4
 ) AS t
 WHERE
     ST_Area(geom) > 1e-5
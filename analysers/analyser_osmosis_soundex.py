@@ -25,134 +25,12 @@ from modules.OsmoseTranslation import T_
 from .Analyser_Osmosis import Analyser_Osmosis
 from modules import languages
 
-sql01_fr = u"""
--- http://www-lium.univ-lemans.fr/~carlier/recherche/soundex.html
---
-
-DROP FUNCTION IF EXISTS FN_SOUNDEX2(name VARCHAR (1024));
-
-CREATE FUNCTION FN_SOUNDEX2 (name_in VARCHAR (1024))
-RETURNS VARCHAR AS $$
-DECLARE
-    name VARCHAR(1024) := name_in;
-    prefixe VARCHAR(1024);
-    suffixe VARCHAR(1024);
-    i INT;
-    last_ VARCHAR(1024);
-BEGIN
-    IF name IS NULL THEN
-        RETURN NULL;
-    END IF;
-
--- Eliminer les blancs  droite et  gauche du nom
-
--- Convertir le nom en majuscule
-    name := UPPER(name);
-
--- Convertir les lettres accentues et le c cedille en lettres non accentues
-    name := TRANSLATE(name, 'ÀÂÄÉÈÊËÎÏÔÖÙÛÜÇ', 'AAAEEEEIIOOUUUC');
-
--- Eliminer les blancs et les tirets
-    name := REPLACE(name, ' ', '');
-    name := REPLACE(name, '-', '');
-
-    name := REPLACE(name, '''', '');
-    name := REPLACE(name, '/', '');
-
--- Remplacer les groupes de lettres suivantes par leur correspondance
-    name := REPLACE(name, 'GUI','KI');
-    name := REPLACE(name, 'GUE','KE');
-    name := REPLACE(name, 'GA',    'KA');
-    name := REPLACE(name, 'GO',    'KO');
-    name := REPLACE(name, 'GU',    'K');
-    name := REPLACE(name, 'CA',    'KA');
-    name := REPLACE(name, 'CO',    'KO');
-    name := REPLACE(name, 'CU',    'KU');
-    name := REPLACE(name, 'Q',    'K');
-    name := REPLACE(name, 'CC',    'K');
-    name := REPLACE(name, 'CK',    'K');
-
--- Remplacer toutes les voyelles sauf le Y par A excepte s'il y a un A en tete
-    name := SUBSTRING(name, 1, 1) || REPLACE(SUBSTRING(name, 2, LENGTH(name)), 'E',    'A');
-    name := SUBSTRING(name, 1, 1) || REPLACE(SUBSTRING(name, 2, LENGTH(name)), 'I',    'A');
-    name := SUBSTRING(name, 1, 1) || REPLACE(SUBSTRING(name, 2, LENGTH(name)), 'O',    'A');
-    name := SUBSTRING(name, 1, 1) || REPLACE(SUBSTRING(name, 2, LENGTH(name)), 'U',    'A');
-
--- Remplacer les prefixes suivants par leur correspondance
-    prefixe := SUBSTRING(name, 1, 3);
-    suffixe := SUBSTRING(name, 4, LENGTH(name));
-    IF prefixe = 'MAC' THEN
-        name := 'MCC' || suffixe;
-    ELSEIF prefixe = 'ASA' THEN
-        name := 'AZA' || suffixe;
-    ELSEIF prefixe = 'SCH' THEN
-        name := 'SSS' || suffixe;
-    ELSE
-        prefixe := SUBSTRING(name, 1, 2);
-        suffixe := SUBSTRING(name, 3, LENGTH(name));
-        IF prefixe = 'KN' THEN
-            name := 'NN' || suffixe;
-        ELSEIF prefixe = 'PH' THEN
-            name := 'FF' || suffixe;
-        END IF;
-    END IF;
-
--- Supprimer les H sauf s'ils sont precedes par C ou S
-    i := 1;
-    WHILE i <= LENGTH(name)-1 LOOP
-        IF SUBSTRING(name, i, 1) != 'C' AND SUBSTRING(name, i, 1) != 'S' AND SUBSTRING(name, i+1, 1) = 'H' THEN
-            name := SUBSTRING(name, 1, i) || SUBSTRING(name, i+2, LENGTH(name));
-        END IF;
-        i := i + 1;
-    END LOOP;
-
--- Supprimer les Y sauf s'il est precede d'un A
-    i := 1;
-    WHILE i <= LENGTH(name)-1 LOOP
-        IF SUBSTRING(name, i, 1) != 'A' AND SUBSTRING(name, i+1, 1) = 'Y' THEN
-            name := SUBSTRING(name, 1, i) || SUBSTRING(name, i+2, LENGTH(name));
-        END IF;
-        i := i + 1;
-    END LOOP;
-
--- Supprimer les terminaisons suivantes A, T, D et S
-    last_ := SUBSTRING(name, LENGTH(name), 1);
-    IF last_ = 'A' OR last_ = 'T' OR last_ = 'D' OR last_ = 'S' THEN
-        name := SUBSTRING(name, 1, LENGTH(name)-1);
-    END IF;
-
--- Enlever tous les A sauf le A de tete s'il y en a un
-    name := SUBSTRING(name, 1, 1) || REPLACE(SUBSTRING(name, 2, LENGTH(name)), 'A', '');
-
--- Enlever toutes les sous chaines de lettre repetitives
-    i := 1;
-    last_ := SUBSTRING(name, i, 1);
-    WHILE i <= LENGTH(name) LOOP
-        IF SUBSTRING(name, i+1, 1) = last_ THEN
-            name := SUBSTRING(name, 1, i) || SUBSTRING(name, i+2, LENGTH(name));
-        ELSE
-            i := i + 1;
-            last_ := SUBSTRING(name, i, 1);
-        END IF;
-    END LOOP;
-
--- Conserver les 4 premiers caractres du mot et si besoin le complter avec des blancs pour obtenir 4 caractres
---    name := RPAD(name, 4, ' ');
-
-    RETURN name;
-END
-$$ LANGUAGE plpgsql;
-"""
-
-sql03 = """
-CREATE TEMP TABLE way_tags_name_phonic AS
+sql01 = """
+CREATE TEMP TABLE way_tags_name AS
 SELECT
     id AS way_id,
-    {0}(ways.tags -> 'name') AS phonic_all,
     substring(ways.tags -> 'name' for position(' ' in ways.tags -> 'name')-1) AS name_1,
-    {0}(substring(ways.tags -> 'name' for position(' ' in ways.tags -> 'name')-1)) AS phonic_1,
-    substring(ways.tags -> 'name' from position(' ' in ways.tags -> 'name')+1) AS name_2oo,
-    {0}(substring(ways.tags -> 'name' from position(' ' in ways.tags -> 'name')+1)) AS phonic_2oo
+    substring(ways.tags -> 'name' from position(' ' in ways.tags -> 'name')+1) AS name_2oo
 FROM
     ways
 WHERE
@@ -165,6 +43,24 @@ WHERE
     regexp_replace(substring(tags->'name' from position(' ' in tags->'name')+1), '^[- 0-9_/]+$', '' ) != ''
 """
 
+sql02 = """
+SELECT DISTINCT
+    name_2oo
+FROM
+    way_tags_name
+"""
+
+sql03 = """
+CREATE TEMP TABLE way_tags_name_phonic AS
+SELECT
+    way_tags_name.*,
+    phonic_keys.key AS phonic_2oo
+FROM
+    way_tags_name
+    JOIN phonic_keys ON
+        phonic_keys.name = way_tags_name.name_2oo
+"""
+
 sql03i = """
 CREATE INDEX way_tags_name_phonic_phonic_2oo ON way_tags_name_phonic(phonic_2oo)
 """
@@ -259,11 +155,12 @@ his name not need be transformed into "Jean Monnet",
         if not self.scripts:
             return
 
+        self.run(sql01)
         if "language" in self.config.options and isinstance(self.config.options["language"], str) and self.config.options["language"].startswith("fr"):
-            self.run(sql01_fr)
-            self.run(sql03.format("fn_soundex2"))
+            self.create_phonetic_keys("phonic_keys", sql02, "soundex2")
         else:
-            self.run(sql03.format("dmetaphone"))
+            self.create_phonetic_keys("phonic_keys", sql02, "dmetaphone")
+        self.run(sql03)
         self.run(sql03i)
         self.run(sql04)
         self.run(sql05)
@@ -29,12 +29,81 @@ import modules.config
 from modules import OsmoseLog
 from modules import OsmReader
 from modules import SourceVersion
+from modules.DenseFileArray import DenseFileArray
+from modules.IdSet import IdSet
+from modules.PluginProfile import PluginProfile
+
+
+class PluginKeyIndex:
+    """
+    Plugin methods, in load order, indexed by the tag keys plugins declare
+    in trigger_keys. A key ending by ":*" is a prefix. Methods of plugins
+    without trigger_keys are always selected.
+    """
+
+    def __init__(self):
+        self.methods = []
+        self.keys = {}
+        self.prefixes = {}
+        self._cache = {}
+
+    def append(self, meth, trigger_keys=None):
+        i = len(self.methods)
+        self.methods.append((i, meth, trigger_keys is None))
+        for key in trigger_keys or []:
+            if key.endswith(":*"):
+                self.prefixes.setdefault(key[:-1], []).append(i)
+            else:
+                self.keys.setdefault(key, []).append(i)
+        self._cache = {}
+
+    def __iter__(self):
+        return iter([meth for (i, meth, always) in self.methods])
+
+    def __len__(self):
+        return len(self.methods)
+
+    def select(self, tags):
+        """
+        Methods to call on an object with these tags, in load order.
+        """
+        triggered = [key for key in tags if key in self.keys]
+        if self.prefixes:
+            for key in tags:
+                p = key.find(':')
+                if p >= 0 and key[:p + 1] in self.prefixes:
+                    triggered.append(key[:p + 1])
+        triggered = frozenset(triggered)
+        try:
+            return self._cache[triggered]
+        except KeyError:
+            selected = set()
+            for key in triggered:
+                selected.update(self.keys.get(key, []) + self.prefixes.get(key, []))
+            methods = self._cache[triggered] = [meth for (i, meth, always) in self.methods if always or i in selected]
+            return methods
 
 
 class Analyser_Sax(Analyser):
 
+    # Conversions from parsed coordinates to the ones of the reader, that
+    # depend on the tool that loaded it. The ones matching the reader on
+    # node_cache_check nodes are used, the reader is still asked for the nodes
+    # they disagree on.
+    node_cache_conversions = [
+        ("osmosis", lambda c: 1e-9 * (100 * round(c * 10000000))),
+        ("osmium", lambda c: round(c * 10000000) / 10000000),
+        ("osmbin", lambda c: float(int((c*10000000)+1800000000)-1800000000)/10000000),
+        ("parser", lambda c: c),
+    ]
+    node_cache_check = 1000
+    node_cache_max_id = 2**34 # Reserved when filled by the parser, sparse
+
     def __init__(self, config, logger = OsmoseLog.logger()):
         Analyser.__init__(self, config, logger)
+        self.profile = None
+        if getattr(self.config, 'plugin_profile', None):
+            self.profile = PluginProfile(self.config.plugin_profile)
         if self.config.plugins:
             plugins = map(lambda plugin: self._load_plugin(plugin) if isinstance(plugin, str) else plugin, self.config.plugins)
         else:
@@ -46,6 +115,7 @@ class Analyser_Sax(Analyser):
         # open database connections
         self._load_reader()
         self.parser = OsmReader.open(self.config.src, self.logger.sub(), getattr(self.config, 'src_state', None))
+        self._load_node_cache()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -53,6 +123,7 @@ class Analyser_Sax(Analyser):
         self._log(u"Closing reader and parser")
         del self.parser
         del self._reader
+        self._close_node_cache()
         Analyser.__exit__(self, exc_type, exc_value, traceback)
 
     def timestamp(self):
@@ -61,6 +132,10 @@ class Analyser_Sax(Analyser):
     def analyser_version(self):
         return SourceVersion.version(*([self.__class__] + list(map(lambda p: p.__class__, self.plugins.values()))))
 
+    @classmethod
+    def class_version(cls):
+        return None
+
     def analyser(self):
         self.logger.log("run sax all")
 
@@ -83,18 +158,10 @@ class Analyser_Sax(Analyser):
             self._run_analyse()
 
             if timestamp:
-                filtered_nodes = set(self.parser.filtered_nodes())
-                for id in self.already_issued_objects['N']:
-                    if id not in filtered_nodes:
-                        self.error_file.delete('node', id)
-                filtered_ways = set(self.parser.filtered_ways())
-                for id in self.already_issued_objects['W']:
-                    if id not in filtered_ways:
-                        self.error_file.delete('way', id)
-                filtered_relations = set(self.parser.filtered_relations())
-                for id in self.already_issued_objects['R']:
-                    if id not in filtered_relations:
-                        self.error_file.delete('relation', id)
+                # Issued objects not filtered by the timestamp are changed or deleted
+                for (t, type, filtered) in (('N', 'node', self.parser.filtered_nodes()), ('W', 'way', self.parser.filtered_ways()), ('R', 'relation', self.parser.filtered_relations())):
+                    for id in IdSet(self.already_issued_objects[t]).difference(filtered):
+                        self.error_file.delete(type, id)
         finally:
             self._close_output()
 
@@ -147,6 +214,32 @@ class Analyser_Sax(Analyser):
     def UserGet(self, UserId):
         return self._reader.UserGet(UserId)
 
+    def NodePosition(self, NodeId):
+        # Node with only lat and lon, from the coordinates cache when available
+        if self._node_cache is not None and self._node_cache_conversions:
+            c = self._node_cache.get(NodeId)
+            if c and c != [0.0, 0.0]:
+                if self._node_cache_checked >= self.node_cache_check:
+                    # Only when the conversions still matching the reader
+                    # agree, else the reader decides between them
+                    positions = set((conv(c[0]), conv(c[1])) for (name, conv) in self._node_cache_conversions)
+                    if len(positions) == 1:
+                        (lat, lon), = positions
+                        return {"id": NodeId, "lat": lat, "lon": lon}
+                node = self.NodeGet(NodeId)
+                self._check_node_cache(c, node)
+                return node
+        return self.NodeGet(NodeId)
+
+    def WayFirstNodePosition(self, WayId):
+        if self._way_cache is not None and self._node_cache_conversions:
+            c = self._way_cache.get(WayId)
+            if c and c[0]:
+                return self.NodePosition(c[0])
+        way = self.WayGet(WayId)
+        if way:
+            return self.NodePosition(way[u"nd"][0])
+
     def ExtendData(self, data):
         if "uid" in data and not "user" in data:
             user = self.UserGet(data["uid"])
@@ -170,6 +263,9 @@ class Analyser_Sax(Analyser):
     #### Node parsing
 
     def NodeCreate(self, data):
+        if self._node_cache is not None and not self._node_cache_by_parser and data["id"] > 0:
+            self._node_cache.set(data["id"], [data["lat"], data["lon"]])
+
         # Initialisation
         err  = []
         tags = data[u"tag"]
@@ -178,7 +274,7 @@ class Analyser_Sax(Analyser):
             return
 
         # Running jobs
-        for meth in self.pluginsNodeMethodes:
+        for meth in self.pluginsNodeMethodes.select(tags):
             try:
                 res = meth(data, tags)
             except:
@@ -232,8 +328,11 @@ class Analyser_Sax(Analyser):
         tags = data[u"tag"]
         nds  = data[u"nd"]
 
+        if self._way_cache is not None and nds and data["id"] > 0:
+            self._way_cache.set(data["id"], [nds[0]])
+
         # Run jobs
-        for meth in self.pluginsWayMethodes:
+        for meth in self.pluginsWayMethodes.select(tags):
             try:
                 res = meth(data, tags, nds)
             except:
@@ -253,7 +352,7 @@ class Analyser_Sax(Analyser):
                 if tmp_data:
                     # way from reader can be None if there is only one node on it
                     data = tmp_data
-            node = self.NodeGet(nds[len(nds)//2])
+            node = self.NodePosition(nds[len(nds)//2])
             if not node:
                 node = {u"lat":0, u"lon":0}
             data = self.ExtendData(data)
@@ -292,11 +391,9 @@ class Analyser_Sax(Analyser):
         node = None
         for memb in data[u"member"]:
             if memb[u"type"] == u"node":
-                node = self.NodeGet(memb[u"ref"])
+                node = self.NodePosition(memb[u"ref"])
             elif memb[u"type"] == "way":
-                way = self.WayGet(memb[u"ref"])
-                if way:
-                    node = self.NodeGet(way[u"nd"][0])
+                node = self.WayFirstNodePosition(memb[u"ref"])
             if node:
                 break
         if not node:
@@ -320,7 +417,7 @@ class Analyser_Sax(Analyser):
         members = data[u"member"]
 
         # Run jobs
-        for meth in self.pluginsRelationMethodes:
+        for meth in self.pluginsRelationMethodes.select(tags):
             try:
                 res = meth(data, tags, members)
             except:
@@ -390,6 +487,38 @@ class Analyser_Sax(Analyser):
             # self._reader = OsmSaxAlea.OsmSaxReader(self.config.src, self.config.src_state)
             raise RuntimeError('No OSM reader available')
 
+    def _load_node_cache(self):
+        self._node_cache = None
+        self._way_cache = None
+        if getattr(self.config, 'node_cache', False) and not self.parser.is_change():
+            # Nodes come before the ways in the file, coordinates used to
+            # locate issues can be kept during the parsing
+            d = modules.config.dir_tmp if os.path.isdir(modules.config.dir_tmp) else None
+            self._node_cache = DenseFileArray(d, 'd', 2)
+            self._way_cache = DenseFileArray(d, 'q', 1)
+            # The parser may fill the coordinates of all the nodes itself,
+            # including the ones without tags not sent to NodeCreate()
+            self._node_cache.reserve(self.node_cache_max_id)
+            self._node_cache_by_parser = self.parser.set_node_coordinates(self._node_cache.buffer())
+            self._node_cache_conversions = list(self.node_cache_conversions)
+            self._node_cache_checked = 0
+
+    def _check_node_cache(self, coords, node):
+        self._node_cache_conversions = [(name, conv) for (name, conv) in self._node_cache_conversions
+            if node and conv(coords[0]) == node["lat"] and conv(coords[1]) == node["lon"]]
+        self._node_cache_checked += 1
+        if not self._node_cache_conversions:
+            self._sublog(u"Node cache disabled, coordinates do not match the reader")
+        elif self._node_cache_checked == self.node_cache_check:
+            self._sublog(u"Node cache enabled, with {0} coordinates".format(self._node_cache_conversions[0][0]))
+
+    def _close_node_cache(self):
+        if getattr(self, '_node_cache', None) is not None:
+            self._node_cache.close()
+            self._way_cache.close()
+        self._node_cache = None
+        self._way_cache = None
+
     ################################################################################
 
     def _load_plugin(self, plugin):
@@ -417,9 +546,9 @@ class Analyser_Sax(Analyser):
     def _init_plugins(self, available_plugin_classes):
         self._Err = {}
         self.plugins = {}
-        self.pluginsNodeMethodes = []
-        self.pluginsWayMethodes = []
-        self.pluginsRelationMethodes = []
+        self.pluginsNodeMethodes = PluginKeyIndex()
+        self.pluginsWayMethodes = PluginKeyIndex()
+        self.pluginsRelationMethodes = PluginKeyIndex()
 
         conf_limit = set()
         for i in ("country", "language"):
@@ -449,13 +578,14 @@ class Analyser_Sax(Analyser):
                 pluginAvailableMethodes = pluginInstance.availableMethodes()
                 self.plugins[pluginClazz.__name__] = pluginInstance
 
-                # Fetch functions to call
+                # Fetch functions to call, only on objects with these keys if declared
+                trigger_keys = getattr(pluginClazz, "trigger_keys", None)
                 if "node" in pluginAvailableMethodes:
-                    self.pluginsNodeMethodes.append(pluginInstance.node)
+                    self.pluginsNodeMethodes.append(self._profile_method(pluginClazz.__name__, "node", pluginInstance.node), trigger_keys)
                 if "way" in pluginAvailableMethodes:
-                    self.pluginsWayMethodes.append(pluginInstance.way)
+                    self.pluginsWayMethodes.append(self._profile_method(pluginClazz.__name__, "way", pluginInstance.way), trigger_keys)
                 if "relation" in pluginAvailableMethodes:
-                    self.pluginsRelationMethodes.append(pluginInstance.relation)
+                    self.pluginsRelationMethodes.append(self._profile_method(pluginClazz.__name__, "relation", pluginInstance.relation), trigger_keys)
 
                 # Liste generated issues
                 for (cl, v) in self.plugins[pluginClazz.__name__].errors.items():
@@ -463,6 +593,12 @@ class Analyser_Sax(Analyser):
                         raise Exception("class {0} already present as item {1}".format(cl, self._Err[cl]['item']))
                     self._Err[cl] = v
 
+    def _profile_method(self, plugin, type, meth):
+        if self.profile:
+            return self.profile.wrap(plugin, type, meth)
+        else:
+            return meth
+
     ################################################################################
 
     def _load_output(self, change):
@@ -490,12 +626,23 @@ class Analyser_Sax(Analyser):
         self._log(u"Analysing file "+self.config.src)
         self.parser.CopyTo(self)
         self._log(u"Analyse finished")
+        for plugin in self.plugins.values():
+            plugin.end(self.logger.sub())
 
     ################################################################################
 
     def _close_output(self):
         self.error_file.analyser_end()
 
+        if self.profile and isinstance(self.error_file.dst, str):
+            # Next to the result file
+            dst = self.error_file.dst
+            if dst.endswith(".bz2"):
+                dst = dst[:-len(".bz2")]
+            dst = os.path.splitext(dst)[0] + ".profile.json"
+            self._log(u"Write plugins profile to " + dst)
+            self.profile.dump(dst)
+
 ################################################################################
 from .Analyser import TestAnalyser
 from modules import IssuesFileOsmose
@@ -557,6 +704,110 @@ class TestAnalyserOsmosis(TestAnalyser):
         self.root_err = self.load_errors()
         self.check_num_err(min=33)
 
+    def test_node_cache(self):
+        from plugins.Plugin import Plugin
+
+        class Plugin_Position(Plugin):
+            def init(self, logger):
+                Plugin.init(self, logger)
+                self.errors[1] = self.def_class(item = 1, level = 3, tags = [], title = {"en": "test"})
+            def way(self, data, tags, nds):
+                if tags.get("highway"):
+                    return {"class": 1}
+            def relation(self, data, tags, members):
+                return {"class": 1}
+
+        # Reader with the coordinates as loaded by osmosis
+        class Reader(TestAnalyserOsmosis.MockupReader):
+            def __init__(self):
+                self.nodes = {}
+                self.ways = {}
+            def NodeCreate(self, data):
+                self.nodes[data["id"]] = {"id": data["id"], "lat": 1e-9 * (100 * round(data["lat"] * 10000000)), "lon": 1e-9 * (100 * round(data["lon"] * 10000000)), "tag": data["tag"]}
+            def WayCreate(self, data):
+                self.ways[data["id"]] = {"id": data["id"], "nd": data["nd"], "tag": data["tag"]}
+            def RelationCreate(self, data):
+                pass
+            def NodeGet(self, id):
+                return self.nodes.get(id)
+            def WayGet(self, id, dump_sub_elements=False):
+                return self.ways.get(id)
+
+        self.config.reader = Reader()
+        OsmReader.open(self.config.src).CopyTo(self.config.reader)
+        self.config.plugins = [Plugin_Position]
+
+        for node_cache in (False, True):
+            self.config.node_cache = node_cache
+            self.xml_res_file = os.path.join(self.dirname, "sax.test_node_cache_{0}.xml".format(node_cache))
+            self.config.error_file = IssuesFileOsmose.IssuesFileOsmose(self.xml_res_file)
+            with Analyser_Sax(self.config) as analyser_obj:
+                analyser_obj.node_cache_check = 10
+                analyser_obj.analyser()
+                if node_cache:
+                    self.assertEqual(analyser_obj._node_cache_conversions[0][0], "osmosis")
+                    self.assertGreaterEqual(analyser_obj._node_cache_checked, 10)
+
+        self.compare_results(os.path.join(self.dirname, "sax.test_node_cache_False.xml"))
+        self.root_err = self.load_errors()
+        self.check_num_err(min=100)
+
+    def test_node_cache_mismatch(self):
+        analyser_obj = Analyser_Sax.__new__(Analyser_Sax)
+        analyser_obj._node_cache = {1: [1.25, 2.5], 2: [1.5, 2.75]}
+        analyser_obj._node_cache_conversions = [("a", lambda c: c), ("b", lambda c: round(c, 1))]
+        analyser_obj._node_cache_checked = analyser_obj.node_cache_check
+        nodes = {1: {"id": 1, "lat": 1.25, "lon": 2.5}, 2: {"id": 2, "lat": 1.5, "lon": 2.75}}
+        gets = []
+        analyser_obj.NodeGet = lambda id: gets.append(id) or nodes[id]
+
+        # Conversions disagree, asked to the reader, the mismatching one is dropped
+        self.assertEqual(analyser_obj.NodePosition(1), nodes[1])
+        self.assertEqual(gets, [1])
+        self.assertEqual([name for (name, conv) in analyser_obj._node_cache_conversions], ["a"])
+        self.assertEqual(analyser_obj.NodePosition(2), {"id": 2, "lat": 1.5, "lon": 2.75})
+        self.assertEqual(gets, [1])
+
+    def test_plugin_key_index(self):
+        index = PluginKeyIndex()
+        index.append("always")
+        index.append("name", ["name"])
+        index.append("wikipedia", ["wikipedia", "wikipedia:*"])
+        index.append("always2")
+        self.assertEqual(list(index), ["always", "name", "wikipedia", "always2"])
+        self.assertEqual(index.select({}), ["always", "always2"])
+        self.assertEqual(index.select({"highway": "primary", "name": "A"}), ["always", "name", "always2"])
+        self.assertEqual(index.select({"wikipedia:fr": "A", "name": "A"}), ["always", "name", "wikipedia", "always2"])
+        self.assertEqual(index.select({"wikipedia": "fr:A"}), ["always", "wikipedia", "always2"])
+        self.assertEqual(index.select({"name:fr": "A"}), ["always", "always2"])
+
+    def test_profile(self):
+        from plugins.Plugin import Plugin
+
+        class Plugin_Highway(Plugin):
+            def init(self, logger):
+                Plugin.init(self, logger)
+                self.errors[1] = self.def_class(item = 1, level = 3, tags = [], title = {"en": "test"})
+            def way(self, data, tags, nds):
+                if tags.get("highway"):
+                    return {"class": 1, "subclass": 2}
+
+        self.xml_res_file = os.path.join(self.dirname, "sax.test_profile.xml.bz2")
+        self.config.error_file = IssuesFileOsmose.IssuesFileOsmose(self.xml_res_file)
+        self.config.plugins = [Plugin_Highway]
+        self.config.plugin_profile = 10
+        with Analyser_Sax(self.config) as analyser_obj:
+            analyser_obj.analyser()
+
+        import json
+        with open(os.path.join(self.dirname, "sax.test_profile.profile.json")) as f:
+            profile = json.load(f)
+        way = profile["plugins"]["Plugin_Highway"]["way"]
+        self.assertEqual(way["calls"], 625)
+        self.assertEqual(way["timed_calls"], 62)
+        self.assertGreater(way["issues"], 100)
+        self.assertEqual(profile["rules"], {"Plugin_Highway": {"1/2": way["issues"]}})
+
     def test_resume_full(self):
         # Test with an older timestamp than older object in extract
         self.xml_res_file = os.path.join(self.dirname, "sax.test_resume_full.xml")
@@ -0,0 +1,108 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Fixed size records indexed by OSM id, in a sparse temporary file mapped in
+# memory, like osmium dense_file_array. Only the pages of used ids take
+# space. The file grows with the max id.
+
+import array
+import mmap
+import tempfile
+
+
+class DenseFileArray:
+
+    grow = 1024 * 1024 # Records
+
+    def __init__(self, dir=None, typecode='q', width=1):
+        self.typecode = typecode
+        self.width = width
+        self._record = width * memoryview(bytes(8)).cast(typecode).itemsize
+        self._file = tempfile.TemporaryFile(dir=dir)
+        self._mmap = None
+        self._view = None
+        self.size = 0
+
+    def _resize(self, size):
+        if self._view is not None:
+            self._view.release()
+            self._mmap.close()
+        self.size = size
+        self._file.truncate(size * self._record)
+        self._mmap = mmap.mmap(self._file.fileno(), size * self._record)
+        self._view = memoryview(self._mmap).cast(self.typecode)
+
+    def reserve(self, size):
+        if size > self.size:
+            self._resize(size)
+
+    def buffer(self):
+        """
+        Writable buffer of all the records, valid until the next resize.
+        """
+        return self._view
+
+    def set(self, id, values):
+        if id >= self.size:
+            self._resize(max(2 * self.size, (id // self.grow + 1) * self.grow))
+        i = id * self.width
+        self._view[i:i + self.width] = array.array(self.typecode, values)
+
+    def get(self, id):
+        """
+        Return the record of id, all zeros when not set.
+        """
+        if id < 0 or id >= self.size:
+            return None
+        i = id * self.width
+        return self._view[i:i + self.width].tolist()
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._mmap.close()
+            self._view = None
+        self._file.close()
+
+
+###########################################################################
+import unittest
+
+class Test(unittest.TestCase):
+
+    def test(self):
+        a = DenseFileArray(typecode='d', width=2)
+        self.assertEqual(a.get(10), None)
+        a.set(10, [1.5, -2.5])
+        self.assertEqual(a.get(10), [1.5, -2.5])
+        self.assertEqual(a.get(11), [0.0, 0.0])
+        a.set(5 * DenseFileArray.grow + 3, [3, 4])
+        self.assertEqual(a.get(10), [1.5, -2.5])
+        self.assertEqual(a.get(5 * DenseFileArray.grow + 3), [3, 4])
+        a.close()
+
+        a = DenseFileArray()
+        a.set(0, [7])
+        self.assertEqual(a.get(0), [7])
+        a.reserve(2**34)
+        a.buffer()[2**34 - 1] = 8
+        self.assertEqual(a.get(2**34 - 1), [8])
+        a.close()
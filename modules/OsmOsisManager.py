@@ -23,6 +23,8 @@ from modules import download
 from modules.lockfile import lockfile
 from modules.OsmOsis import OsmOsis
 from modules.OsmState import OsmState
+from modules.SqlDag import SqlDag
+from modules import OsmPbfPgsql
 import sys
 import os
 import psycopg2
@@ -93,6 +95,18 @@ class OsmOsisManager:
       del self._osmosis
 
 
+  def timestamp(self):
+    # Data timestamp of the database, kept until the metainfo are updated
+    if not hasattr(self, '_timestamp'):
+      self._timestamp = self.osmosis().timestamp()
+      self.osmosis_close()
+    return self._timestamp
+
+  def timestamp_reset(self):
+    if hasattr(self, '_timestamp'):
+      del self._timestamp
+
+
   def psql_c(self, sql):
     cmd  = ["psql"]
     cmd += self.db_psql_args
@@ -177,6 +191,20 @@ class OsmOsisManager:
     else:
       parallel = False
 
+    if options.import_tool == "osmium":
+      # Data loaded directly, only the other import statements are run
+      dag = SqlDag()
+    elif not parallel and options.import_jobs > 1:
+      # Named fifos need all the COPY to run at once, not compatible
+      dag = SqlDag()
+    else:
+      dag = None
+    # With a single job, keep post scripts on psql
+    dag_post_scripts = dag and options.import_jobs > 1
+    post_scripts = conf.osmosis_post_scripts[:]
+    for table in conf.update_tables():
+      post_scripts += [script for script in conf.osmosis_update_tables[table]["create"] if script not in post_scripts]
+
     self.logger.log(self.logger.log_av_r+"import osmosis data"+self.logger.log_ap)
     cmd  = [conf.bin_osmosis]
     dst_ext = os.path.splitext(conf.download["dst"])[1]
@@ -200,21 +228,38 @@ class OsmOsisManager:
     try:
       bg_proc = []
 
-      bg_proc.append((self.logger.execute_err(cmd, background=parallel), "osmosis"))
-      if parallel:
-        # Reading stdout/stderr must not block
-        os.set_blocking(bg_proc[-1][0].stdout.fileno(), False)
-        os.set_blocking(bg_proc[-1][0].stderr.fileno(), False)
-
-      for script in conf.osmosis_import_prepare_scripts:
-        self.psql_f(script, cwd=dir_country_tmp)
+      if options.import_tool == "osmium":
+        for script in conf.osmosis_import_prepare_scripts:
+          self.psql_f(script, cwd=dir_country_tmp)
+        OsmPbfPgsql.import_pbf(conf.download["dst"], lambda: psycopg2.connect(self.db_string), self.logger.sub())
 
-      for script in conf.osmosis_import_scripts:
-        bg_proc.append((self.psql_f(script, cwd=dir_country_tmp, background=parallel), os.path.basename(script)))
+      else:
+        bg_proc.append((self.logger.execute_err(cmd, background=parallel), "osmosis"))
         if parallel:
+          # Reading stdout/stderr must not block
           os.set_blocking(bg_proc[-1][0].stdout.fileno(), False)
           os.set_blocking(bg_proc[-1][0].stderr.fileno(), False)
 
+        for script in conf.osmosis_import_prepare_scripts:
+          self.psql_f(script, cwd=dir_country_tmp)
+
+      if dag:
+        # Import and post import statements, as a dependency graph
+        for script in conf.osmosis_import_scripts:
+          dag.add_script(script, cwd=dir_country_tmp, copy=options.import_tool != "osmium")
+        if dag_post_scripts:
+          for script in post_scripts:
+            dag.add_script(script)
+        self.logger.log(self.logger.log_av_r+"import osmosis data with %d jobs" % max(1, options.import_jobs)+self.logger.log_ap)
+        dag.run(lambda: psycopg2.connect(self.db_string), max(1, options.import_jobs), self.logger.sub())
+
+      else:
+        for script in conf.osmosis_import_scripts:
+          bg_proc.append((self.psql_f(script, cwd=dir_country_tmp, background=parallel), os.path.basename(script)))
+          if parallel:
+            os.set_blocking(bg_proc[-1][0].stdout.fileno(), False)
+            os.set_blocking(bg_proc[-1][0].stderr.fileno(), False)
+
       if parallel:
         # Wait for all background processes, and get their stdout/stderr messages
         while bg_proc:
@@ -249,9 +294,10 @@ class OsmOsisManager:
       shutil.rmtree(dir_country_tmp, ignore_errors=True)
 
     # post import scripts
-    self.logger.log(self.logger.log_av_r+"import osmosis post scripts"+self.logger.log_ap)
-    for script in conf.osmosis_post_scripts:
-      self.psql_f(script)
+    if not dag_post_scripts:
+      self.logger.log(self.logger.log_av_r+"import osmosis post scripts"+self.logger.log_ap)
+      for script in post_scripts:
+        self.psql_f(script)
 
     self.osmosis_close()
 
@@ -269,6 +315,7 @@ class OsmOsisManager:
     osm_state = OsmPbfReader(dst_pbf, state_file=state_file).timestamp()
 
     giscurs.execute("UPDATE metainfo SET tstamp = %s", [osm_state])
+    self.timestamp_reset()
     self.logger.sub().log("OSM data timestamp: {}".format(osm_state))
 
     gisconn.commit()
@@ -546,6 +593,33 @@ class OsmOsisManager:
     self.set_pgsql_schema(reset=True)
 
 
+  def create_update_tables(self, conf):
+    # Create the kept up to date tables missing from databases imported before
+    # them or before their analyser was configured, drop the no longer used
+    update_tables = conf.update_tables()
+    giscurs = self.osmosis().conn().cursor()
+    missing = []
+    unused = []
+    for table in conf.osmosis_update_tables:
+      giscurs.execute("SELECT to_regclass(%s)", [table])
+      present = giscurs.fetchone()[0] is not None
+      if not present and table in update_tables:
+        missing.append(table)
+      elif present and table not in update_tables:
+        unused.append(table)
+    giscurs.close()
+    self.osmosis_close()
+
+    for table in missing:
+      self.logger.log("create missing table {0}".format(table))
+      for script in conf.osmosis_update_tables[table]["create"]:
+        self.psql_f(script)
+    for table in unused:
+      self.logger.log("drop unused table {0}".format(table))
+      for script in conf.osmosis_update_tables[table].get("drop", []):
+        self.psql_f(script)
+
+
   def run_change(self, conf):
     self.logger.log(self.logger.log_av_r+"run osmosis replication"+self.logger.log_ap)
     diff_path = conf.download["diff_path"]
@@ -572,9 +646,14 @@ class OsmOsisManager:
       self.logger.execute_err(cmd)
 
       self.logger.log(self.logger.log_av_r+"import osmosis change post scripts"+self.logger.log_ap)
+      self.create_update_tables(conf)
       for script in conf.osmosis_change_post_scripts:
         self.logger.log(script)
         self.psql_f(script)
+      for table in conf.update_tables():
+        for script in conf.osmosis_update_tables[table]["update"]:
+          self.logger.log(script)
+          self.psql_f(script)
       self.set_pgsql_schema(reset=True)
       del osmosis_lock
 
@@ -585,6 +664,7 @@ class OsmOsisManager:
       osm_state = OsmState(os.path.join(diff_path, "state.txt"))
       osm_state_old = OsmState(os.path.join(diff_path, "state.txt.old"))
       giscurs.execute("UPDATE metainfo SET tstamp = %s, tstamp_action = %s", [osm_state.timestamp(), osm_state_old.timestamp()])
+      self.timestamp_reset()
 
       gisconn.commit()
       giscurs.close()
@@ -605,6 +685,7 @@ class OsmOsisManager:
     self.set_pgsql_schema()
     for script in conf.osmosis_resume_init_post_scripts:
       self.psql_f(script)
+    self.create_update_tables(conf)
 
 
   def postgis_version(self):
@@ -0,0 +1,297 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Load an OSM extract into the osmosis pgsnapshot schema, without osmosis
+# and without intermediate dump files. Rows are encoded in the PostgreSQL
+# binary COPY format and streamed to one connection per table.
+
+import os
+import struct
+import threading
+import time
+SimpleHandler: type
+try: # osmium still optional for now
+    import osmium # type: ignore
+    SimpleHandler = osmium.SimpleHandler
+except ImportError:
+    SimpleHandler = object
+
+
+PG_EPOCH = 946684800 # 2000-01-01 in unix time
+OID_INT8 = 20
+SRID = 4326
+
+copy_header = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+copy_trailer = struct.pack('>h', -1)
+
+pack_int2 = struct.Struct('>h').pack
+pack_int4 = struct.Struct('>i').pack
+pack_int8_field = struct.Struct('>iq').pack
+pack_int4_field = struct.Struct('>ii').pack
+
+
+def field_int8(v):
+    return pack_int8_field(8, v)
+
+def field_int4(v):
+    return pack_int4_field(4, v)
+
+def field_text(s):
+    b = s.encode('utf-8')
+    return pack_int4(len(b)) + b
+
+def field_timestamp(ts):
+    # Microseconds since 2000-01-01, timestamp without time zone, as UTC
+    return pack_int8_field(8, (int(ts.timestamp()) - PG_EPOCH) * 1000000)
+
+def field_hstore(tags):
+    data = [pack_int4(len(tags))]
+    for k, v in tags:
+        k = k.encode('utf-8')
+        v = v.encode('utf-8')
+        data += [pack_int4(len(k)), k, pack_int4(len(v)), v]
+    data = b''.join(data)
+    return pack_int4(len(data)) + data
+
+def field_int8_array(values):
+    if not values:
+        data = struct.pack('>iii', 0, 0, OID_INT8)
+    else:
+        data = struct.pack('>iiiii', 1, 0, OID_INT8, len(values), 1) + b''.join(pack_int8_field(8, v) for v in values)
+    return pack_int4(len(data)) + data
+
+def field_point(lon, lat):
+    # EWKB, little endian, with SRID
+    return pack_int4(25) + struct.pack('<BIIdd', 1, 0x20000001, SRID, lon, lat)
+
+def field_linestring(coords):
+    # coords is a flat list of lon, lat
+    data = struct.pack('<BIII', 1, 0x20000002, SRID, len(coords) // 2) + struct.pack('<%dd' % len(coords), *coords)
+    return pack_int4(len(data)) + data
+
+field_null = pack_int4(-1)
+
+
+class CopyWriter:
+    """
+    Send rows to a COPY FROM STDIN (FORMAT binary) running in a background
+    thread, through a pipe.
+    """
+
+    buffer_size = 1024 * 1024
+
+    def __init__(self, conn, table, columns):
+        self.table = table
+        self.rows = 0
+        self.error = None
+        self.buffer = bytearray(copy_header)
+        r, w = os.pipe()
+        self._in = os.fdopen(r, 'rb')
+        self._out = os.fdopen(w, 'wb')
+        sql = "COPY {0} ({1}) FROM STDIN (FORMAT binary)".format(table, ', '.join(columns))
+
+        def copy():
+            try:
+                with conn.cursor() as curs:
+                    curs.execute("SET synchronous_commit TO OFF")
+                    curs.copy_expert(sql, self._in)
+                conn.commit()
+            except Exception as e:
+                self.error = e
+            finally:
+                self._in.close()
+
+        self._thread = threading.Thread(target=copy, name="copy-" + table)
+        self._thread.start()
+
+    def write(self, fields):
+        self.buffer += pack_int2(len(fields))
+        for f in fields:
+            self.buffer += f
+        self.rows += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        try:
+            self._out.write(self.buffer)
+        except BrokenPipeError:
+            self._thread.join()
+            raise self.error or RuntimeError("COPY {0} stopped".format(self.table))
+        self.buffer = bytearray()
+
+    def abort(self):
+        # Incomplete COPY data, makes the COPY fail and the thread end
+        try:
+            self._out.close()
+        except BrokenPipeError:
+            pass
+        self._thread.join()
+
+    def close(self):
+        self.buffer += copy_trailer
+        self.flush()
+        self._out.close()
+        self._thread.join()
+        if self.error:
+            raise self.error
+
+
+class OsmPbfPgsql(SimpleHandler):
+    """
+    Fill nodes, ways, way_nodes, relations, relation_members and users like
+    osmosis --write-pgsql-dump with enableLinestringBuilder and
+    enableKeepPartialLinestring.
+    """
+
+    tables = {
+        "nodes": ["id", "version", "user_id", "tstamp", "changeset_id", "tags", "geom"],
+        "ways": ["id", "version", "user_id", "tstamp", "changeset_id", "tags", "nodes", "linestring"],
+        "way_nodes": ["way_id", "node_id", "sequence_id"],
+        "relations": ["id", "version", "user_id", "tstamp", "changeset_id", "tags"],
+        "relation_members": ["relation_id", "member_id", "member_type", "member_role", "sequence_id"],
+        "users": ["id", "name"],
+    }
+
+    def __init__(self, writers):
+        SimpleHandler.__init__(self)
+        self.writers = writers
+        self.users = set()
+
+    def meta(self, o):
+        if o.uid == 0 and not o.user:
+            # osmosis OsmUser.NONE
+            user_id = -1
+        else:
+            user_id = o.uid
+            if user_id not in self.users:
+                self.users.add(user_id)
+                self.writers["users"].write([field_int4(user_id), field_text(o.user)])
+        return [field_int8(o.id), field_int4(o.version), field_int4(user_id), field_timestamp(o.timestamp), field_int8(o.changeset)]
+
+    def node(self, n):
+        self.writers["nodes"].write(self.meta(n) + [
+            field_hstore([(t.k, t.v) for t in n.tags]),
+            field_point(n.location.lon, n.location.lat) if n.location.valid() else field_null,
+        ])
+
+    def way(self, w):
+        refs = []
+        coords = []
+        for nd in w.nodes:
+            refs.append(nd.ref)
+            if nd.location.valid():
+                coords += [nd.location.lon, nd.location.lat]
+
+        self.writers["ways"].write(self.meta(w) + [
+            field_hstore([(t.k, t.v) for t in w.tags]),
+            field_int8_array(refs),
+            field_linestring(coords) if len(coords) >= 4 else field_null,
+        ])
+        way_id = field_int8(w.id)
+        way_nodes = self.writers["way_nodes"]
+        for i, ref in enumerate(refs):
+            way_nodes.write([way_id, field_int8(ref), field_int4(i)])
+
+    def relation(self, r):
+        self.writers["relations"].write(self.meta(r) + [
+            field_hstore([(t.k, t.v) for t in r.tags]),
+        ])
+        relation_id = field_int8(r.id)
+        relation_members = self.writers["relation_members"]
+        for i, m in enumerate(r.members):
+            relation_members.write([relation_id, field_int8(m.ref), field_text(m.type.upper()), field_text(m.role), field_int4(i)])
+
+
+def import_pbf(src, connect, logger):
+    """
+    Load src into the pgsnapshot tables, with one connection per table
+    created by `connect()`.
+    """
+    start = time.time()
+    conns = []
+    writers = {}
+    try:
+        for table, columns in OsmPbfPgsql.tables.items():
+            conns.append(connect())
+            writers[table] = CopyWriter(conns[-1], table, columns)
+
+        handler = OsmPbfPgsql(writers)
+        # Node locations are kept in memory to build the way linestrings
+        handler.apply_file(src, locations=True, idx='flex_mem')
+
+        for table, writer in writers.items():
+            writer.close()
+            logger.log("{0}: {1} rows".format(table, writer.rows))
+    except:
+        for writer in writers.values():
+            writer.abort()
+        raise
+    finally:
+        for conn in conns:
+            conn.close()
+
+    logger.log("loaded in {0:.1f}s".format(time.time() - start))
+
+
+###########################################################################
+import unittest
+
+class MockWriter:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, fields):
+        self.rows.append(fields)
+
+class Test(unittest.TestCase):
+
+    def test_fields(self):
+        import datetime
+        self.assertEqual(field_int8(-1), b'\x00\x00\x00\x08' + b'\xff' * 8)
+        self.assertEqual(field_text(u"é"), b'\x00\x00\x00\x02\xc3\xa9')
+        self.assertEqual(field_timestamp(datetime.datetime(2000, 1, 1, 0, 0, 1, tzinfo=datetime.timezone.utc)), struct.pack('>iq', 8, 1000000))
+        self.assertEqual(field_hstore([]), struct.pack('>ii', 4, 0))
+        self.assertEqual(field_hstore([("a", "b")]), struct.pack('>iiicic', 4 + 4 + 1 + 4 + 1, 1, 1, b'a', 1, b'b'))
+        self.assertEqual(field_int8_array([]), struct.pack('>iiii', 12, 0, 0, OID_INT8))
+        self.assertEqual(field_int8_array([5]), struct.pack('>iiiiiiiq', 32, 1, 0, OID_INT8, 1, 1, 8, 5))
+
+        import shapely.wkb
+        self.assertEqual(shapely.wkb.loads(field_point(1.5, 2.5)[4:]).wkt, "POINT (1.5 2.5)")
+        self.assertEqual(shapely.get_srid(shapely.wkb.loads(field_point(1.5, 2.5)[4:])), SRID)
+        self.assertEqual(shapely.wkb.loads(field_linestring([1, 2, 3, 4])[4:]).wkt, "LINESTRING (1 2, 3 4)")
+
+    def test_handler(self):
+        if SimpleHandler is object:
+            self.skipTest("osmium not available")
+
+        writers = dict((table, MockWriter()) for table in OsmPbfPgsql.tables)
+        handler = OsmPbfPgsql(writers)
+        handler.apply_file("tests/saint_barthelemy.osm.pbf", locations=True, idx='flex_mem')
+
+        for table, columns in OsmPbfPgsql.tables.items():
+            for row in writers[table].rows:
+                self.assertEqual(len(row), len(columns))
+        self.assertEqual(len(writers["ways"].rows), 625)
+        self.assertEqual(len(writers["relations"].rows), 16)
+        self.assertEqual(len(writers["way_nodes"].rows), sum(struct.unpack_from('>i', w[6], 16)[0] for w in writers["ways"].rows))
+        self.assertTrue(len(writers["nodes"].rows) > 83)
+        self.assertTrue(len(writers["users"].rows) > 0)
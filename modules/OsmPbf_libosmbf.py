@@ -25,6 +25,7 @@ from .osm_pbf_parser import osm_pbf_parser
 from .OsmState import OsmState
 import subprocess
 from .OsmReader import OsmReader, dummylog
+from .IdSet import IdSet
 try: # osmium still optional for now
     import osmium # type: ignore
     have_osmium = True
@@ -43,10 +44,24 @@ class OsmPbfReader(OsmReader, osm_pbf_parser.Visitor):
         self._state_file = state_file
         self._logger = logger
         self._got_error = False
+        self._node_coordinates = None
 
     def set_filter_since_timestamp(self, since_timestamp):
         self.set_since_timestamp(int(since_timestamp.timestamp()) if since_timestamp else 0)
 
+    def filtered_nodes(self):
+        return IdSet.frombuffer(osm_pbf_parser.Visitor.filtered_nodes(self))
+
+    def filtered_ways(self):
+        return IdSet.frombuffer(osm_pbf_parser.Visitor.filtered_ways(self))
+
+    def filtered_relations(self):
+        return IdSet.frombuffer(osm_pbf_parser.Visitor.filtered_relations(self))
+
+    def set_node_coordinates(self, buffer):
+        self._node_coordinates = buffer
+        return True
+
     def timestamp(self):
         if have_osmium:
             try:
@@ -82,7 +97,12 @@ class OsmPbfReader(OsmReader, osm_pbf_parser.Visitor):
 
     def CopyTo(self, output):
         self._output = output
-        osm_pbf_parser.read_osm_pbf(self._pbf_file, self)
+        if self._node_coordinates is not None:
+            osm_pbf_parser.Visitor.set_node_coordinates(self, self._node_coordinates)
+        try:
+            osm_pbf_parser.read_osm_pbf(self._pbf_file, self)
+        finally:
+            osm_pbf_parser.Visitor.clear_node_coordinates(self)
 
 
     def node(self, osmid, lon, lat, tags):
@@ -165,3 +185,22 @@ class Test(unittest.TestCase):
         self.assertEqual(o1.num_ways, 3833)
         self.assertEqual(o1.num_rels, 55)
         self.assertEqual(i1.timestamp(), dateutil.parser.parse("2017-09-03T23:40:03Z").replace(tzinfo=None))
+
+    def test_node_coordinates(self):
+        from .DenseFileArray import DenseFileArray
+        coords = DenseFileArray(None, 'd', 2)
+        try:
+            coords.reserve(2**32)
+            i1 = OsmPbfReader("tests/saint_barthelemy.osm.pbf")
+            self.assertTrue(i1.set_node_coordinates(coords.buffer()))
+            o1 = MockCountObjects()
+            i1.CopyTo(o1)
+            self.assertEqual(o1.num_nodes, 83)
+            # All the nodes, including the ones without tags
+            for (id, lat, lon) in ((266053077, 17.9031745, -62.8363074), (2619283352, 17.9005419, -62.8327042)):
+                c = coords.get(id)
+                self.assertAlmostEqual(c[0], lat, places=7)
+                self.assertAlmostEqual(c[1], lon, places=7)
+            self.assertEqual(coords.get(266053076), [0.0, 0.0])
+        finally:
+            coords.close()
@@ -38,6 +38,11 @@ class OsmReader:
     def set_filter_since_timestamp(self, since_timestamp) -> None:
         pass
 
+    def set_node_coordinates(self, buffer) -> bool:
+        # Buffer of lat, lon doubles by node id, to fill with all the nodes
+        # during CopyTo(). False when not supported.
+        return False
+
     def timestamp(self):
         pass
 
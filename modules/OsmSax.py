@@ -19,6 +19,7 @@
 ##                                                                       ##
 ###########################################################################
 
+import array
 import bz2
 import gzip
 from xml.sax import make_parser, handler
@@ -29,6 +30,7 @@ from .OsmState import OsmState
 import subprocess
 from io import StringIO
 from .OsmReader import OsmReader, dummylog
+from .IdSet import IdSet
 
 ###########################################################################
 
@@ -73,18 +75,18 @@ class OsmSaxReader(OsmReader, handler.ContentHandler):
 
     def set_filter_since_timestamp(self, since_timestamp):
         self.since_timestamp = since_timestamp.isoformat()
-        self.filtered_nodes_osmid = []
-        self.filtered_wayss_osmid = []
-        self.filtered_relationss_osmid = []
+        self.filtered_nodes_osmid = array.array('q')
+        self.filtered_wayss_osmid = array.array('q')
+        self.filtered_relationss_osmid = array.array('q')
 
     def filtered_nodes(self):
-        return self.filtered_nodes_osmid
+        return IdSet.frombuffer(self.filtered_nodes_osmid, dtype='q')
 
     def filtered_ways(self):
-        return self.filtered_wayss_osmid
+        return IdSet.frombuffer(self.filtered_wayss_osmid, dtype='q')
 
     def filtered_relations(self):
-        return self.filtered_relationss_osmid
+        return IdSet.frombuffer(self.filtered_relationss_osmid, dtype='q')
 
     def timestamp(self):
         if self._state_file:
@@ -19,9 +19,71 @@
 ##                                                                       ##
 ###########################################################################
 
+import atexit
+import collections
+import queue
 import time
 import sys
 import subprocess
+import threading
+
+
+# Output of all the loggers of the process is written by a single background
+# thread, in the order it was logged, and flushed at most every
+# flush_interval seconds, or every flush_size characters
+flush_interval = 0.5
+flush_size = 64 * 1024
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_writer_thread = None
+_writer_lock = threading.Lock()
+
+def _write(out, line):
+    global _writer_thread
+    if _writer_thread is None:
+        with _writer_lock:
+            if _writer_thread is None:
+                _writer_thread = threading.Thread(target=_writer, name="log-writer", daemon=True)
+                _writer_thread.start()
+                atexit.register(flush)
+    _queue.put((out, line))
+
+def _writer():
+    size = 0
+    outs = set()
+    last_flush = time.monotonic()
+    while True:
+        try:
+            item = _queue.get(timeout=flush_interval if size else None)
+        except queue.Empty:
+            item = None
+        try:
+            if isinstance(item, tuple):
+                out, line = item
+                out.write(line)
+                outs.add(out)
+                size += len(line)
+                if size < flush_size and time.monotonic() - last_flush < flush_interval:
+                    continue
+            for out in outs:
+                out.flush()
+        except Exception:
+            # Keep the thread alive for the waiting flush()
+            pass
+        size = 0
+        outs = set()
+        last_flush = time.monotonic()
+        if isinstance(item, threading.Event):
+            item.set()
+
+def flush():
+    """
+    Wait for all the logged lines to be written and flushed.
+    """
+    if _writer_thread is not None:
+        done = threading.Event()
+        _queue.put(done)
+        done.wait()
+
 
 class logger:
 
@@ -35,13 +97,21 @@ class logger:
         self.log_ap       = u'\033[0m'     # reset color
 
 
+    def _write(self, line):
+        _write(self._out, line)
+
+    def flush(self):
+        """
+        Wait for all the logged lines to be written and flushed.
+        """
+        flush()
+
     def _log(self, txt, level):
         pre  = u""
         pre += time.strftime("%Y-%m-%d %H:%M:%S ")
         pre += u"  "*level
         suf  = u""
-        print(u'{0}{1}{2}'.format(pre, txt, suf), file=self._out)
-        self._out.flush()
+        self._write(u'{0}{1}{2}\n'.format(pre, txt, suf))
 
     def log(self, txt):
         self._log(txt, 0)
@@ -63,21 +133,36 @@ class logger:
     def sub(self):
         return sublog(self, 1)
 
+    def _execute(self, proc, log, other, time_format, tail_size=0):
+        # Drain the other output in background, so the child never blocks
+        # on a full pipe. Only keep its last tail_size bytes.
+        tail = collections.deque()
+        def drain_other():
+            size = 0
+            for chunk in iter(lambda: other.read1(64 * 1024), b''):
+                tail.append(chunk)
+                size += len(chunk)
+                while len(tail) > 1 and size - len(tail[0]) >= tail_size:
+                    size -= len(tail.popleft())
+        drain = threading.Thread(target=drain_other, daemon=True)
+        drain.start()
+
+        for line in log:
+            line = line.decode('utf-8').strip()
+            if line == '':
+                continue
+            if self._showall:
+                self._write(u'{0}   {1}\n'.format(time.strftime(time_format), line))
+        proc.wait()
+        drain.join()
+        return b''.join(tail)[-tail_size:] if tail_size else b''
+
     def execute_err(self, cmd, valid_return_code=(0,), background=False):
         proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         if background:
             return proc
 
-        while True:
-            cerr = proc.stderr.readline().decode('utf-8').strip()
-            if cerr == '' and proc.poll() is not None:
-                break
-            if cerr == '':
-                continue
-            if self._showall:
-                self._out.write(u'{0}   {1}\n'.format(time.strftime("%Y-%m-%d %H:%M:%S"), cerr))
-                self._out.flush()
-        proc.wait()
+        self._execute(proc, proc.stderr, proc.stdout, "%Y-%m-%d %H:%M:%S")
         if proc.returncode not in valid_return_code:
             raise RuntimeError("'%s' exited with status %s" % (' '.join(cmd), repr(proc.returncode)))
         return proc.returncode
@@ -87,18 +172,9 @@ class logger:
         if background:
             return proc
 
-        while True:
-            cerr = proc.stdout.readline().decode('utf-8').strip()
-            if cerr == '' and proc.poll() is not None:
-                break
-            if cerr == '':
-                continue
-            if self._showall:
-                self._out.write(u'{0}   {1}\n'.format(time.strftime("%Y-%m-%d %H:%M:%S "), cerr))
-                self._out.flush()
-        proc.wait()
+        stderr = self._execute(proc, proc.stdout, proc.stderr, "%Y-%m-%d %H:%M:%S ", tail_size=64 * 1024)
         if proc.returncode not in valid_return_code:
-            raise RuntimeError("'%s' exited with status %s :\n%s" % (' '.join(cmd), repr(proc.returncode), proc.stderr.read()))
+            raise RuntimeError("'%s' exited with status %s :\n%s" % (' '.join(cmd), repr(proc.returncode), stderr))
         return proc.returncode
 
     def send_alert_email(self, email_to, err_msg):
@@ -152,3 +228,51 @@ if __name__ == "__main__":
     a.err("test 1")
     a.sub().err("test 2")
     a.sub().sub().err("test 3")
+    a.flush()
+
+
+###########################################################################
+import unittest
+
+class Test(unittest.TestCase):
+
+    def test_log(self):
+        import io
+        out = io.StringIO()
+        a = logger(out)
+        for i in range(1000):
+            a.sub().log(i)
+        a.err("end")
+        a.flush()
+        lines = out.getvalue().split("\n")
+        self.assertEqual(len(lines), 1002)
+        self.assertRegex(lines[0], r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d   0$")
+        self.assertEqual([int(l.split(" ")[-1]) for l in lines[0:1000]], list(range(1000)))
+        self.assertTrue(lines[1000].endswith(u"\033[0;31merror: end\033[0m"))
+
+    def test_execute(self):
+        import io
+        out = io.StringIO()
+        a = logger(out)
+        # Lot of output on stdout, not read by execute_err
+        a.execute_err(["sh", "-c", "head -c 1000000 /dev/zero; echo err1 >&2; echo >&2; echo err2 >&2"])
+        a.execute_out(["sh", "-c", "head -c 1000000 /dev/zero >&2; echo out1"])
+        a.flush()
+        lines = out.getvalue().split("\n")
+        self.assertEqual([l[19:] for l in lines], ["   err1", "   err2", "    out1", ""])
+
+        with self.assertRaises(RuntimeError) as cm:
+            a.execute_out(["sh", "-c", "head -c 1000000 /dev/zero | tr '\\0' a >&2; echo fails >&2; exit 1"])
+        self.assertTrue(str(cm.exception).endswith("aaaafails\\n'"))
+        self.assertLess(len(str(cm.exception)), 70 * 1024)
+
+    def test_loggers(self):
+        import io
+        out = io.StringIO()
+        a = logger(out)
+        b = logger(out)
+        for i in range(1000):
+            (a if i % 2 else b).log(i)
+        a.flush()
+        lines = out.getvalue().split("\n")
+        self.assertEqual([int(l.split(" ")[-1]) for l in lines[0:1000]], list(range(1000)))
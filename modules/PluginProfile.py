@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Cost of the sax analyser plugins: number of calls, time and issues by
+# plugin and object type, and issues by class and subclass, that is by
+# rule for the MapCSS plugins. Only one call in `sample` is timed.
+#
+# Compare two reports:
+#   ./modules/PluginProfile.py baseline.profile.json current.profile.json
+
+import json
+import sys
+import time
+
+
+class PluginProfile:
+
+    def __init__(self, sample=100):
+        self.sample = sample
+        self.counters = {} # (plugin, type) -> [calls, timed calls, time ns, issues]
+        self.rules = {} # plugin -> {"class/subclass": issues}
+
+    def wrap(self, plugin, type, meth):
+        """
+        Return meth counting its calls and issues, and timing a sample.
+        """
+        counter = self.counters[(plugin, type)] = [0, 0, 0, 0]
+        rules = self.rules.setdefault(plugin, {})
+        sample = self.sample
+        perf_counter_ns = time.perf_counter_ns
+
+        def profiled(*args):
+            counter[0] += 1
+            if counter[0] % sample:
+                res = meth(*args)
+            else:
+                t = perf_counter_ns()
+                res = meth(*args)
+                counter[2] += perf_counter_ns() - t
+                counter[1] += 1
+            if res:
+                for e in ([res] if isinstance(res, dict) else res):
+                    counter[3] += 1
+                    rule = "{0}/{1}".format(e.get("class"), e.get("subclass", 0))
+                    rules[rule] = rules.get(rule, 0) + 1
+            return res
+
+        profiled.__name__ = getattr(meth, "__name__", type)
+        profiled.__qualname__ = getattr(meth, "__qualname__", type)
+        return profiled
+
+    def report(self):
+        plugins = {}
+        for (plugin, type), (calls, timed, time_ns, issues) in self.counters.items():
+            plugins.setdefault(plugin, {})[type] = {
+                "calls": calls,
+                "timed_calls": timed,
+                # Extrapolated from the timed calls
+                "time_ms": round(time_ns * calls / timed / 1e6, 3) if timed else 0,
+                "issues": issues,
+            }
+        return {
+            "sample": self.sample,
+            "plugins": plugins,
+            "rules": dict((plugin, rules) for plugin, rules in self.rules.items() if rules),
+        }
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=1, sort_keys=True)
+
+
+def compare(baseline, current, ratio=1.5, min_time_ms=1000):
+    """
+    Plugins slower by call than `ratio` times the baseline, and taking at
+    least `min_time_ms`. Return a list of (plugin, type, baseline time by
+    call, current time by call, current time).
+    """
+    regressions = []
+    for plugin, types in sorted(current["plugins"].items()):
+        for type, c in sorted(types.items()):
+            if c["time_ms"] < min_time_ms or not c["calls"]:
+                continue
+            b = baseline["plugins"].get(plugin, {}).get(type)
+            current_call = c["time_ms"] / c["calls"]
+            baseline_call = b["time_ms"] / b["calls"] if b and b["calls"] else None
+            if baseline_call is None or current_call > ratio * baseline_call:
+                regressions.append((plugin, type, baseline_call, current_call, c["time_ms"]))
+    return regressions
+
+
+def main(args):
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options] baseline.json current.json")
+    parser.add_option("--ratio", dest="ratio", type=float, default=1.5,
+                      help="Report plugins slower by call than ratio times the baseline")
+    parser.add_option("--min-time", dest="min_time", type=float, default=1000,
+                      help="Ignore plugins running less than this time (in ms)")
+    (options, args) = parser.parse_args(args)
+    if len(args) != 2:
+        parser.print_help()
+        return 2
+
+    baseline = json.load(open(args[0]))
+    current = json.load(open(args[1]))
+    regressions = compare(baseline, current, options.ratio, options.min_time)
+    for (plugin, type, baseline_call, current_call, time_ms) in regressions:
+        if baseline_call is None:
+            print("{0} {1}: new, {2:.0f} ms".format(plugin, type, time_ms))
+        else:
+            print("{0} {1}: {2:.1f} -> {3:.1f} us by call, {4:.0f} ms".format(plugin, type, baseline_call * 1000, current_call * 1000, time_ms))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
+
+
+###########################################################################
+import unittest
+
+class Test(unittest.TestCase):
+
+    def test(self):
+        p = PluginProfile(sample=2)
+        node = p.wrap("P", "node", lambda data, tags: {"class": 1} if tags else None)
+        way = p.wrap("P", "way", lambda data, tags, nds: [{"class": 2, "subclass": 3}, {"class": 2, "subclass": 3}])
+        for i in range(10):
+            node(None, {"a": "b"} if i < 3 else {})
+        way(None, {}, [])
+
+        r = p.report()
+        self.assertEqual(r["plugins"]["P"]["node"]["calls"], 10)
+        self.assertEqual(r["plugins"]["P"]["node"]["timed_calls"], 5)
+        self.assertEqual(r["plugins"]["P"]["node"]["issues"], 3)
+        self.assertEqual(r["plugins"]["P"]["way"]["issues"], 2)
+        self.assertEqual(r["plugins"]["P"]["way"]["timed_calls"], 0)
+        self.assertEqual(r["rules"], {"P": {"1/0": 3, "2/3": 2}})
+
+    def test_compare(self):
+        baseline = {"plugins": {"A": {"node": {"calls": 100, "time_ms": 1000}}, "B": {"way": {"calls": 10, "time_ms": 2000}}}}
+        current = {"plugins": {
+            "A": {"node": {"calls": 200, "time_ms": 2500}}, # +25% by call
+            "B": {"way": {"calls": 10, "time_ms": 4000}},
+            "C": {"node": {"calls": 10, "time_ms": 5000}},
+            "D": {"node": {"calls": 10, "time_ms": 10}},
+        }}
+        self.assertEqual(compare(baseline, current), [("B", "way", 200, 400, 4000), ("C", "node", None, 500, 5000)])
+        self.assertEqual(compare(baseline, current, ratio=1.2), [("A", "node", 10, 12.5, 2500), ("B", "way", 200, 400, 4000), ("C", "node", None, 500, 5000)])
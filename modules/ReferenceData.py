@@ -0,0 +1,177 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Reference data downloaded from the wikis, Wikidata or the NSI by the
+# plugins, prebuilt once into pickled artifacts, instead of downloading and
+# parsing it again in each process. Without an artifact, or with one of
+# another version, the data is built from the network as before.
+#
+# Build all the artifacts, into config.dir_reference or $OSMOSE_REFERENCE_DATA:
+#   python -m modules.ReferenceData
+# or some of them into an other directory:
+#   python -m modules.ReferenceData --dir /tmp/reference postcode deprecated
+#
+# The plugin tests run offline on the small hand made artifacts of
+# tests/reference.
+
+import importlib
+import os
+import pickle
+import sys
+import time
+from . import config
+
+
+# name -> (version, builder). Bump the version when the built data changes
+# of format. The builder is "module:function" or "module:Plugin.method".
+sources = {
+    "postcode": (1, "plugins.TagFix_Postcode:TagFix_Postcode.postcode_formats"),
+    "deprecated": (1, "plugins.TagFix_Deprecated:TagFix_Deprecated.deprecated_list"),
+    "wikidata_chain_store": (1, "plugins.TagFix_Wikidata:TagFix_Wikidata.black_list"),
+    "tagging_mistakes": (1, "plugins.TagWatchFrViPofm:TagWatchFrViPofm.tagging_mistakes"),
+    "nsi": (1, "plugins.modules.name_suggestion_index:download_nsi"),
+    "nsi_matcher": (1, "plugins.modules.name_suggestion_index:compile_nsi"),
+}
+
+
+def path(name, dir=None):
+    return os.path.join(dir or config.dir_reference, name + ".pickle")
+
+
+def builder(name):
+    module, attr = sources[name][1].split(":")
+    obj = importlib.import_module(module)
+    cls, _, meth = attr.rpartition(".")
+    if cls:
+        # Plugin methods building reference data do not use the analyser
+        return getattr(getattr(obj, cls)(None), meth)
+    return getattr(obj, meth)
+
+
+def load(name, build=None, dir=None):
+    """
+    Return the prebuilt data `name`, or build it with `build`, by default
+    the builder of the source.
+    """
+    try:
+        with open(path(name, dir), "rb") as f:
+            artifact = pickle.load(f)
+        if artifact["name"] == name and artifact["version"] == sources[name][0]:
+            return artifact["data"]
+    except (IOError, EOFError, ValueError, pickle.UnpicklingError, KeyError, TypeError):
+        pass
+    return (build or builder(name))()
+
+
+def build(name, dir=None):
+    dir = dir or config.dir_reference
+    os.makedirs(dir, exist_ok=True)
+    artifact = {
+        "name": name,
+        "version": sources[name][0],
+        "date": int(time.time()),
+        "data": builder(name)(),
+    }
+    file = path(name, dir)
+    tmp = "{0}.{1}".format(file, os.getpid())
+    with open(tmp, "wb") as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, file)
+    return file
+
+
+def main(args):
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options] [name...]")
+    parser.add_option("--dir", dest="dir", default=None,
+                      help="Directory of the artifacts, default {0}".format(config.dir_reference))
+    parser.add_option("--list", dest="list", action="store_true",
+                      help="List the reference data")
+    (options, args) = parser.parse_args(args)
+
+    if options.list:
+        for name, (version, b) in sorted(sources.items()):
+            print("{0} v{1} {2}".format(name, version, b))
+        return 0
+
+    for name in args:
+        if name not in sources:
+            parser.error("unknown reference data {0}".format(name))
+
+    for name in args or sorted(sources):
+        start = time.time()
+        file = build(name, options.dir)
+        print("{0}: {1} ({2:.1f} s)".format(name, file, time.time() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
+
+
+###########################################################################
+import unittest
+import tempfile
+from unittest import mock
+
+class Test(unittest.TestCase):
+
+    def test(self):
+        calls = []
+        def fetch():
+            calls.append(1)
+            return {"a": ["b"]}
+
+        with tempfile.TemporaryDirectory() as dir, mock.patch.dict(sources, {"test": (1, "x:y")}), mock.patch(__name__ + ".builder", return_value=fetch):
+            # No artifact, built from the source
+            self.assertEqual(load("test", fetch, dir), {"a": ["b"]})
+            self.assertEqual(load("test", dir=dir), {"a": ["b"]})
+            self.assertEqual(len(calls), 2)
+
+            build("test", dir)
+            self.assertEqual(len(calls), 3)
+            self.assertEqual(load("test", fetch, dir), {"a": ["b"]})
+            self.assertEqual(len(calls), 3)
+
+            # Other version
+            sources["test"] = (2, "x:y")
+            self.assertEqual(load("test", fetch, dir), {"a": ["b"]})
+            self.assertEqual(len(calls), 4)
+
+            # Broken artifact
+            with open(path("test", dir), "wb") as f:
+                f.write(b"broken")
+            self.assertEqual(load("test", fetch, dir), {"a": ["b"]})
+            self.assertEqual(len(calls), 5)
+
+    def test_builder(self):
+        for name in sources:
+            self.assertTrue(callable(builder(name)), name)
+
+    def test_fixtures(self):
+        # Hand made artifacts used by the plugin tests, to update on version change
+        dir = "tests/reference"
+        for fn in os.listdir(dir):
+            name = fn[:-len(".pickle")]
+            with open(path(name, dir), "rb") as f:
+                artifact = pickle.load(f)
+            self.assertEqual((artifact["name"], artifact["version"]), (name, sources[name][0]), fn)
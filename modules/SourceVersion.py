@@ -19,32 +19,102 @@
 ##                                                                       ##
 ###########################################################################
 
+import atexit
 import inspect
+import json
 import os
 import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+from . import config
 
 
-def version(*sources):
-    h = hashlib.md5()
+# Versions already computed, keyed by the source paths, with the mtime and
+# size of the files they were computed from. Shared between runs, saved once
+# at exit.
+cache_file = os.path.join(config.dir_cache, "source_version.json")
+_cache: Optional[Dict[str, list]] = None
+_dirty = False
+_contents: Dict[Tuple, bytes] = {}
+_lock = threading.Lock()
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return [path, st.st_mtime_ns, st.st_size]
+
+def _content(key):
+    k = tuple(key)
+    if k not in _contents:
+        with open(key[0], 'rb') as f:
+            _contents[k] = f.read()
+    return _contents[k]
+
+def _source_keys(sources):
+    keys = []
     for source in sources:
         if isinstance(source, str) and os.path.exists(source):
-            h.update(open(source, 'rb').read())
+            keys.append(_file_key(source))
         elif isinstance(source, int):
-            h.update(str(source).encode('utf-8'))
+            keys.append(source)
         elif inspect.isclass(source):
             cc = inspect.getmro(source)
             for c in cc:
                 try:
-                    h.update(open(inspect.getsourcefile(c), 'rb').read())
-                except TypeError: # No python source file
-                    try:
-                        h.update(inspect.getsource(c))
-                    except TypeError: # Built-in
-                        pass
+                    keys.append(_file_key(inspect.getsourcefile(c)))
+                except TypeError: # No python source file, or built-in
+                    pass
         else:
             raise NotImplementedError(source.__class__)
+    return keys
+
+def _load():
+    global _cache
+    if _cache is None:
+        try:
+            with open(cache_file, 'r') as f:
+                _cache = json.load(f)
+        except (IOError, ValueError):
+            _cache = {}
+    return _cache
+
+def _save():
+    global _dirty
+    if not _dirty:
+        return
+    _dirty = False
+    try:
+        tmp = "{0}.{1}".format(cache_file, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(_cache, f)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
 
-    return int(h.hexdigest(), 16) % 2147483647
+
+def version(*sources):
+    global _dirty
+    keys = _source_keys(sources)
+    cache_key = json.dumps([key if isinstance(key, int) else key[0] for key in keys])
+    with _lock:
+        cache = _load()
+        entry = cache.get(cache_key)
+        if isinstance(entry, list) and entry[0] == keys:
+            return entry[1]
+
+        h = hashlib.md5()
+        for key in keys:
+            if isinstance(key, int):
+                h.update(str(key).encode('utf-8'))
+            else:
+                h.update(_content(key))
+
+        v = int(h.hexdigest(), 16) % 2147483647
+        cache[cache_key] = [keys, v]
+        if not _dirty:
+            _dirty = True
+            atexit.register(_save)
+        return v
 
 
 ###########################################################################
@@ -63,3 +133,34 @@ class Test(unittest.TestCase):
             assert False
         except:
             pass
+
+    def test_cache(self):
+        global cache_file, _cache
+        import tempfile
+        saved = (cache_file, _cache)
+        try:
+            with tempfile.TemporaryDirectory() as d:
+                cache_file = os.path.join(d, "source_version.json")
+                _cache = None
+                self.assertEqual(version(PointInPolygon), 1846769484)
+                self.assertFalse(os.path.exists(cache_file))
+                _save()
+                self.assertTrue(os.path.exists(cache_file))
+
+                # Next runs use the persisted versions
+                _cache = None
+                _contents.clear()
+                self.assertEqual(version(PointInPolygon), 1846769484)
+                self.assertEqual(_contents, {})
+
+                # A changed file is hashed again, only its last version is kept
+                src = os.path.join(d, "source.py")
+                with open(src, 'w') as f:
+                    f.write("1")
+                v = version(src)
+                os.utime(src, ns=(0, 0))
+                self.assertEqual(version(src), v)
+                self.assertEqual(len(_load()), 2)
+                self.assertEqual(_load()[json.dumps([src])][0], [_file_key(src)])
+        finally:
+            cache_file, _cache = saved
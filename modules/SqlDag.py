@@ -0,0 +1,328 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def split_sql(text):
+    """
+    Split a psql script into statements. Handle comments, quoted strings,
+    dollar quoted bodies, and psql meta-commands ending at the end of line.
+    """
+    statements = []
+    current = []
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == '-' and text.startswith('--', i):
+            j = text.find('\n', i)
+            i = n if j == -1 else j + 1
+            continue
+        elif c == '\\' and ''.join(current).strip() == '':
+            j = text.find('\n', i)
+            j = n if j == -1 else j
+            statements.append(text[i:j].strip())
+            current = []
+            i = j + 1
+            continue
+        elif c == "'":
+            j = i + 1
+            while True:
+                j = text.find("'", j)
+                if j == -1:
+                    j = n
+                    break
+                if text.startswith("''", j):
+                    j += 2
+                else:
+                    break
+            current.append(text[i:j + 1])
+            i = j + 1
+            continue
+        elif c == '$':
+            m = re.match(r'\$[A-Za-z_0-9]*\$', text[i:])
+            if m:
+                tag = m.group(0)
+                j = text.find(tag, i + len(tag))
+                j = n if j == -1 else j + len(tag)
+                current.append(text[i:j])
+                i = j
+                continue
+        elif c == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+            i += 1
+            continue
+        current.append(c)
+        i += 1
+
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+class SqlNode:
+
+    def __init__(self, name, sql, cwd=None):
+        self.name = name
+        self.sql = sql
+        self.cwd = cwd
+        self.deps = set()
+        self.duration = None
+
+    def __repr__(self):
+        return self.name
+
+
+class SqlDag:
+    """
+    Dependency graph of the statements of psql scripts, to run them on a pool
+    of connections.
+
+    Statements are attached to the table they work on. On a table, loads,
+    ALTER and ANALYZE wait for all the previous statements, index builds only
+    wait for the previous exclusive statement, so the indexes of a table are
+    built concurrently. Statements without known table are barriers. SET
+    statements are applied to each connection of the pool.
+    """
+
+    re_copy = re.compile(r'^\\copy\s+(\w+)\s*(\([^)]*\))?\s+FROM\s+\'([^\']+)\'', re.IGNORECASE)
+    re_index = re.compile(r'^CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?\w+\s+ON\s+(?:ONLY\s+)?(\w+)', re.IGNORECASE)
+    re_table = re.compile(r'^(?:ALTER\s+TABLE\s+(?:ONLY\s+)?|ANALYZE\s+|VACUUM\s+(?:ANALYZE\s+)?|CLUSTER\s+)(\w+)', re.IGNORECASE)
+    re_set = re.compile(r'^SET\s', re.IGNORECASE)
+
+    def __init__(self):
+        self.nodes = []
+        self.setup = []
+        self._last_exclusive = {}
+        self._since_exclusive = {}
+        self._barrier = None
+
+    def add_script(self, script, cwd=None, copy=True):
+        with open(script, 'r') as f:
+            statements = split_sql(f.read())
+        for i, sql in enumerate(statements):
+            if not copy and self.re_copy.match(sql):
+                continue
+            self.add("{0}:{1}".format(os.path.basename(script), i + 1), sql, cwd)
+
+    def add(self, name, sql, cwd=None):
+        if self.re_set.match(sql):
+            if sql not in self.setup:
+                self.setup.append(sql)
+            return None
+
+        node = SqlNode(name, sql, cwd)
+        m = self.re_index.match(sql)
+        if m:
+            table, exclusive = m.group(1), False
+        else:
+            m = self.re_copy.match(sql) or self.re_table.match(sql)
+            table, exclusive = (m.group(1), True) if m else (None, True)
+
+        if table is None:
+            # Barrier
+            node.deps = set(self._last_exclusive.values()) | set(sum(self._since_exclusive.values(), []))
+            if self._barrier:
+                node.deps.add(self._barrier)
+            self._barrier = node
+            self._last_exclusive = {}
+            self._since_exclusive = {}
+        else:
+            if table in self._last_exclusive:
+                node.deps.add(self._last_exclusive[table])
+            elif self._barrier:
+                node.deps.add(self._barrier)
+            if exclusive:
+                node.deps |= set(self._since_exclusive.get(table, []))
+                self._last_exclusive[table] = node
+                self._since_exclusive[table] = []
+            else:
+                self._since_exclusive.setdefault(table, []).append(node)
+
+        self.nodes.append(node)
+        return node
+
+    def run(self, connect, workers, logger):
+        """
+        Run the graph on at most `workers` connections created by `connect()`.
+        """
+        local = threading.local()
+        conns = []
+        lock = threading.Lock()
+
+        def execute(node):
+            if not hasattr(local, 'conn'):
+                local.conn = connect()
+                local.conn.autocommit = True
+                with lock:
+                    conns.append(local.conn)
+                with local.conn.cursor() as curs:
+                    for sql in self.setup:
+                        curs.execute(sql)
+
+            start = time.time()
+            with local.conn.cursor() as curs:
+                m = self.re_copy.match(node.sql)
+                if m:
+                    # Bytes as read by psql, whatever the locale
+                    with open(os.path.join(node.cwd or '.', m.group(3)), 'rb') as f:
+                        curs.copy_expert("COPY {0} {1} FROM STDIN".format(m.group(1), m.group(2) or ''), f)
+                else:
+                    curs.execute(node.sql)
+            node.duration = time.time() - start
+            return node
+
+        dependents = dict((node, []) for node in self.nodes)
+        remaining = {}
+        for node in self.nodes:
+            remaining[node] = len(node.deps)
+            for dep in node.deps:
+                dependents[dep].append(node)
+
+        start = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                running = set(executor.submit(execute, node) for node in self.nodes if remaining[node] == 0)
+                while running:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            node = future.result()
+                        except:
+                            for f in running:
+                                f.cancel()
+                            raise
+                        logger.log("{0}: {1:.1f}s - {2}".format(node.name, node.duration, node.sql.split('\n')[0][:100]))
+                        for dependent in dependents[node]:
+                            remaining[dependent] -= 1
+                            if remaining[dependent] == 0:
+                                running.add(executor.submit(execute, dependent))
+        finally:
+            for conn in conns:
+                conn.close()
+
+        logger.log("{0} statements in {1:.1f}s".format(len(self.nodes), time.time() - start))
+
+
+###########################################################################
+import unittest
+
+class Test(unittest.TestCase):
+
+    def test_split_sql(self):
+        self.assertEqual(split_sql("SELECT 1; -- comment; \nSELECT ';'\n;"), ["SELECT 1", "SELECT ';'"])
+        self.assertEqual(split_sql("\\copy nodes FROM 'nodes.txt'\nANALYZE nodes;"), ["\\copy nodes FROM 'nodes.txt'", "ANALYZE nodes"])
+        self.assertEqual(split_sql("CREATE FUNCTION f() AS $$ BEGIN; END; $$ LANGUAGE plpgsql;\nSELECT 'it''s';"), ["CREATE FUNCTION f() AS $$ BEGIN; END; $$ LANGUAGE plpgsql", "SELECT 'it''s'"])
+
+    def test_osmosis_scripts(self):
+        from modules import config
+        dag = SqlDag()
+        for script in ["ImportDatabase_Nodes.sql", "ImportDatabase_Ways.sql", "CreateTagsIndex.sql", "CreateFunctions.sql"]:
+            dag.add_script(os.path.join(config.dir_osmose, "osmosis", script))
+        nodes = dict((node.sql.split('\n')[0], node) for node in dag.nodes)
+
+        self.assertEqual(dag.setup, ["SET synchronous_commit TO OFF"])
+        load_nodes = nodes["\\copy nodes FROM 'nodes.txt'"]
+        load_ways = [n for k, n in nodes.items() if k.startswith("\\copy ways")][0]
+        self.assertEqual(load_nodes.deps, set())
+        self.assertEqual(load_ways.deps, set())
+        pk_ways = nodes["ALTER TABLE ONLY ways ADD CONSTRAINT pk_ways PRIMARY KEY (id)"]
+        self.assertEqual(pk_ways.deps, set([load_ways]))
+        idx_geom = nodes["CREATE INDEX idx_ways_linestring ON ways USING gist (linestring)"]
+        idx_highway = nodes["CREATE INDEX idx_ways_highway ON ways USING gist(tags) WHERE tags != ''::hstore AND tags?'highway'"]
+        idx_building = nodes["CREATE INDEX idx_ways_building ON ways USING gist(tags) WHERE tags != ''::hstore AND tags?'building'"]
+        analyze_ways = nodes["ANALYZE ways"]
+        self.assertEqual(idx_geom.deps, set([pk_ways]))
+        self.assertIn(idx_geom, nodes["ALTER TABLE ONLY ways CLUSTER ON idx_ways_linestring"].deps)
+        self.assertIn(analyze_ways, idx_highway.deps)
+        self.assertEqual(idx_highway.deps, idx_building.deps)
+
+        # Functions are created after every thing else
+        functions = [n for n in dag.nodes if n.name.startswith("CreateFunctions.sql")]
+        self.assertTrue(idx_highway in functions[0].deps)
+
+    def test_run(self):
+        class curs:
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                pass
+            def execute(self, sql):
+                executed.append(sql)
+        class conn:
+            def cursor(self):
+                return curs()
+            def close(self):
+                pass
+        class logger:
+            def log(self, txt):
+                pass
+
+        executed = []
+        dag = SqlDag()
+        dag.add("1", "SET work_mem = '1GB'")
+        a = dag.add("2", "ALTER TABLE a ADD CONSTRAINT pk PRIMARY KEY (id)")
+        b = dag.add("3", "CREATE INDEX i ON a(x)")
+        c = dag.add("4", "CREATE INDEX j ON a(y)")
+        d = dag.add("5", "ANALYZE a")
+        dag.run(conn, 2, logger())
+
+        self.assertEqual(executed[0], "SET work_mem = '1GB'")
+        statements = [s for s in executed if not s.startswith("SET")]
+        self.assertEqual(sorted(statements), sorted(n.sql for n in [a, b, c, d]))
+        self.assertEqual(statements[0], a.sql)
+        self.assertEqual(statements[-1], d.sql)
+
+    def test_run_copy(self):
+        import tempfile
+        class curs:
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                pass
+            def copy_expert(self, sql, f):
+                copied.append((sql, f.read()))
+        class conn:
+            def cursor(self):
+                return curs()
+            def close(self):
+                pass
+        class logger:
+            def log(self, txt):
+                pass
+
+        copied = []
+        with tempfile.TemporaryDirectory() as dir:
+            with open(os.path.join(dir, "nodes.txt"), "wb") as f:
+                f.write(u"1\tname=>Hôtel\n".encode("utf-8"))
+            dag = SqlDag()
+            dag.add("1", "\\copy nodes FROM 'nodes.txt'", cwd=dir)
+            dag.run(conn, 1, logger())
+        self.assertEqual(copied, [("COPY nodes  FROM STDIN", u"1\tname=>Hôtel\n".encode("utf-8"))])
@@ -0,0 +1,210 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Get the frontend status of the next analysers of a country concurrently,
+# while the current one runs, instead of one request by analyser in the
+# analyse loop. Only a window of status is kept ahead, the issued objects
+# lists of resume mode can be large.
+
+import collections
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+from . import downloader
+from .IdSet import IdSet
+
+
+class StatusError(Exception):
+    pass
+
+
+# Lists of issued objects, parsed apart from the rest of the status
+re_objects = re.compile(r'"(nodes|ways|relations)"\s*:\s*(null|\[([-0-9,\s]*)\])')
+
+def parse_status(text):
+    """
+    Parse a status of the frontend. The lists of issued objects, that can
+    be millions of ids, are directly converted to IdSet, without building
+    Python ints.
+    """
+    objects = {}
+    def sub(match):
+        ids = match.group(3)
+        if ids and ids.strip():
+            objects[match.group(1)] = IdSet(numpy.fromstring(ids, dtype=numpy.int64, sep=','))
+        else:
+            objects[match.group(1)] = IdSet()
+        return '"{0}":null'.format(match.group(1))
+
+    status = json.loads(re_objects.sub(sub, text))
+    if status:
+        status.update(objects)
+    return status
+
+
+class StatusPrefetch:
+
+    def __init__(self, url_frontend_update, country, window=8, workers=8, query=downloader.request_get):
+        self.url_frontend_update = url_frontend_update
+        self.country = country
+        self.window = window
+        self.query = query
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        # Status in order of use, with their request once in the window
+        self._futures = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fetch(self, analyser_name, objects):
+        url = self.url_frontend_update + "/../../control/status/%s/%s?%s" % (self.country, analyser_name, 'objects=true' if objects else '')
+        resp = self.query(url)
+        if not resp.ok:
+            raise StatusError("Fails to get status from frontend: {0}".format(resp.status_code))
+        return parse_status(resp.text)
+
+    def _fill(self):
+        for key in list(self._futures)[:self.window]:
+            if self._futures[key] is None:
+                self._futures[key] = self._executor.submit(self._fetch, key[1], key[2])
+
+    def prefetch(self, analyser_name, objects=False):
+        """
+        Queue the status of the analyser, in order of use. It is requested
+        once among the next `window` ones.
+        """
+        key = (self.country, analyser_name, objects)
+        with self._lock:
+            if key not in self._futures:
+                self._futures[key] = None
+                self._fill()
+
+    def get(self, analyser_name, objects=False):
+        """
+        Return the status of the analyser, fetched ahead or now. Raise the
+        error of the request if it failed. The status queued before it are
+        not used anymore.
+        """
+        key = (self.country, analyser_name, objects)
+        with self._lock:
+            future = None
+            if key in self._futures:
+                while True:
+                    k, future = self._futures.popitem(last=False)
+                    if k == key:
+                        break
+                    if future:
+                        future.cancel()
+            if future is None:
+                future = self._executor.submit(self._fetch, analyser_name, objects)
+            self._fill()
+        return future.result()
+
+    def close(self):
+        with self._lock:
+            for future in self._futures.values():
+                if future:
+                    future.cancel()
+            self._futures.clear()
+        self._executor.shutdown(wait=True)
+
+
+###########################################################################
+import unittest
+import http.server
+import time
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        requests = self.requests = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests.append(self.path)
+                time.sleep(0.2)
+                if "/missing" in self.path:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                status = {"timestamp": "2026-01-01T00:00:00Z", "analyser_version": 3}
+                if "objects=true" in self.path:
+                    status.update({"nodes": [3, 1, 2], "ways": [], "relations": None})
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(json.dumps(status).encode('utf-8'))
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{0}/control/send-update".format(self.server.server_address[1])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_parse(self):
+        self.assertEqual(parse_status('null'), None)
+        status = parse_status('{"timestamp": "t", "nodes": [1, 5,\n 2], "ways": [], "relations": null, "analyser_version": "1"}')
+        self.assertEqual(status["timestamp"], "t")
+        self.assertEqual(status["analyser_version"], "1")
+        self.assertEqual(list(status["nodes"]), [1, 2, 5])
+        self.assertEqual(len(status["ways"]), 0)
+        self.assertEqual(len(status["relations"]), 0)
+
+    def test_prefetch(self):
+        p = StatusPrefetch(self.url, "test", window=10, workers=10)
+        start = time.time()
+        for i in range(10):
+            p.prefetch("a{0}".format(i))
+        p.prefetch("r", objects=True)
+        p.prefetch("missing")
+        for i in range(10):
+            self.assertEqual(p.get("a{0}".format(i))["analyser_version"], 3)
+        # Concurrent requests
+        self.assertLess(time.time() - start, 1.5)
+        self.assertIn("/control/status/test/a0", self.requests)
+
+        status = p.get("r", objects=True)
+        self.assertEqual(list(status["nodes"]), [1, 2, 3])
+        self.assertEqual(len(status["relations"]), 0)
+        self.assertRaises(StatusError, p.get, "missing")
+        self.assertEqual(len(self.requests), 12)
+
+        # Not prefetched
+        self.assertEqual(p.get("b")["analyser_version"], 3)
+        p.close()
+
+    def test_window(self):
+        p = StatusPrefetch(self.url, "test", window=2, workers=10)
+        for i in range(6):
+            p.prefetch("a{0}".format(i))
+        time.sleep(0.5)
+        self.assertEqual(sorted(self.requests), ["/control/status/test/a0", "/control/status/test/a1"])
+
+        # Window moves with the used status, skipped ones are dropped
+        p.get("a0")
+        p.get("a2")
+        time.sleep(0.5)
+        self.assertEqual(sorted(self.requests)[2:], ["/control/status/test/a2", "/control/status/test/a3", "/control/status/test/a4"])
+        self.assertEqual(list(p._futures), [("test", "a3", False), ("test", "a4", False), ("test", "a5", False)])
+        p.close()
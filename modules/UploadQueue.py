@@ -0,0 +1,297 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Upload analyser results to the frontend in background threads, while the
+# next analysers run. Results are first copied to a spool directory, and
+# only removed from it once uploaded, so failed uploads are sent again on
+# the next run instead of running the analyser again. Results that can not
+# be uploaded again are moved to the "error" sub-directory of the spool.
+
+import hashlib
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+class UploadQueue:
+
+    def __init__(self, spool_dir, logger, workers=2, tries=3, backoff=15, timeout=1800):
+        self.spool_dir = spool_dir
+        self.logger = logger
+        self.tries = tries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.err_code = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._counter = 0
+
+    def _key(self, country, analyser_name, url):
+        return "{0}-{1}-{2}".format(country, analyser_name, hashlib.sha1(url.encode('utf-8')).hexdigest()[:8])
+
+    def submit(self, url, country, analyser, analyser_name, password, src):
+        """
+        Spool `src` and queue its upload. `analyser` is the key of the
+        password in the country configuration, to upload it again later.
+        """
+        key = self._key(country, analyser_name, url)
+        with self._lock:
+            self._counter += 1
+            entry = "{0}.{1}.{2}".format(key, int(time.time() * 1000), self._counter)
+        path = os.path.join(self.spool_dir, entry)
+        # Copy, the results file is rewritten in place by the next run
+        shutil.copyfile(src, path + ".data")
+        with open(path + ".json", "w") as f:
+            json.dump({"url": url, "country": country, "analyser": analyser, "analyser_name": analyser_name}, f)
+        self._queue(key, entry, url, country, analyser_name, password)
+
+    def resume(self, conf):
+        """
+        Queue the uploads of the country left in the spool by previous runs.
+        """
+        entries = {}
+        for fn in sorted(os.listdir(self.spool_dir)):
+            if not fn.endswith(".json"):
+                continue
+            entry = fn[:-len(".json")]
+            try:
+                with open(os.path.join(self.spool_dir, fn)) as f:
+                    meta = json.load(f)
+            except (IOError, ValueError):
+                self._discard(entry, "unreadable spool entry")
+                continue
+            if meta["country"] != conf.country:
+                continue
+            key = self._key(meta["country"], meta["analyser_name"], meta["url"])
+            if key in entries:
+                # Only the last result of an analyser is useful
+                self._remove(entries[key][0])
+            entries[key] = (entry, meta)
+
+        for key, (entry, meta) in entries.items():
+            password = conf.analyser.get(meta["analyser"])
+            if not password or password == "xxx":
+                self._discard(entry, "no password for {0}".format(meta["analyser_name"]))
+                continue
+            self.logger.log("resume upload {0}".format(meta["analyser_name"]))
+            self._queue(key, entry, meta["url"], meta["country"], meta["analyser_name"], password)
+
+    def _queue(self, key, entry, url, country, analyser_name, password):
+        with self._lock:
+            self._latest[key] = entry
+            self._futures.append(self._executor.submit(self._upload, key, entry, url, country, analyser_name, password))
+
+    def _remove(self, entry):
+        for ext in (".data", ".json"):
+            try:
+                os.remove(os.path.join(self.spool_dir, entry + ext))
+            except OSError:
+                pass
+
+    def _discard(self, entry, reason):
+        self.logger.err("discard upload {0}: {1}".format(entry, reason))
+        error_dir = os.path.join(self.spool_dir, "error")
+        os.makedirs(error_dir, exist_ok=True)
+        for ext in (".data", ".json"):
+            try:
+                os.replace(os.path.join(self.spool_dir, entry + ext), os.path.join(error_dir, entry + ext))
+            except OSError:
+                pass
+
+    def _upload(self, key, entry, url, country, analyser_name, password):
+        logger = self.logger
+        err_code = 0
+        update_finished = False
+        was_on_timeout = False
+        for nb_iter in range(1, self.tries + 1):
+            if self._latest[key] != entry:
+                logger.log("{0}: skip upload, superseded by a newer result".format(analyser_name))
+                update_finished = True
+                break
+            if nb_iter > 1:
+                # Exponential backoff, with jitter to spread the retries of the threads
+                time.sleep(self.backoff * 2 ** (nb_iter - 2) * random.uniform(0.5, 1.5))
+            logger.log("{0}: iteration={1}".format(analyser_name, nb_iter))
+            try:
+                u = url + '?analyser=' + analyser_name + '&country=' + country
+                with open(os.path.join(self.spool_dir, entry + ".data"), 'rb') as content:
+                    r = requests.post(u, timeout=self.timeout, data={
+                        'analyser': analyser_name,
+                        'country': country,
+                        'code': password
+                    }, files={
+                        'content': content
+                    })
+                r.raise_for_status()
+                logger.log("{0}: {1}".format(analyser_name, r.text.strip()))
+                update_finished = True
+                break
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code == 504:
+                    was_on_timeout = True
+                    logger.sub().err('got an HTTP timeout status')
+                else:
+                    dt = r.text.strip()
+                    logger.sub().err(u"UPDATE ERROR %s/%s : %s\n" % (country, analyser_name, dt))
+                    if dt == "FAIL: Already up to date":
+                        update_finished = True
+                        break
+                    if nb_iter >= self.tries and not was_on_timeout:
+                        err_code |= 4
+            except Exception as e:
+                if isinstance(e, requests.exceptions.ConnectTimeout):
+                    was_on_timeout = True
+                    logger.sub().err('got a connection timeout')
+                else:
+                    tb = traceback.format_exc()
+                    logger.err('error on update...')
+                    for l in tb.splitlines():
+                        logger.sub().log(l)
+
+        if update_finished:
+            self._remove(entry)
+        else:
+            logger.err("{0}: upload failed, kept in spool for next run".format(analyser_name))
+            err_code |= 1
+
+        with self._lock:
+            self.err_code |= err_code
+
+    def wait(self):
+        """
+        Wait for the queued uploads, and return the error code.
+        """
+        self._executor.shutdown(wait=True)
+        for future in self._futures:
+            future.result()
+        return self.err_code
+
+
+###########################################################################
+import unittest
+import http.server
+import tempfile
+
+class Test(unittest.TestCase):
+
+    class logger:
+        def log(self, txt):
+            pass
+        def err(self, txt):
+            pass
+        def sub(self):
+            return self
+
+    class conf:
+        country = "test"
+        analyser = {"a": "pass"}
+
+    def setUp(self):
+        received = self.received = []
+        responses = self.responses = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                received.append((self.path, body))
+                code, text = responses.pop(0) if responses else (200, "OK")
+                self.send_response(code)
+                self.end_headers()
+                self.wfile.write(text.encode('utf-8'))
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{0}/send-update".format(self.server.server_address[1])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.dir.name, "result.xml.bz2")
+        with open(self.src, "wb") as f:
+            f.write(b"result content")
+        self.spool = os.path.join(self.dir.name, "spool")
+        os.makedirs(self.spool)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def test_upload(self):
+        q = UploadQueue(self.spool, self.logger(), backoff=0.01)
+        q.submit(self.url, "test", "a", "A", "pass", self.src)
+        self.assertEqual(q.wait(), 0)
+        self.assertEqual(len(self.received), 1)
+        self.assertEqual(self.received[0][0], "/send-update?analyser=A&country=test")
+        self.assertIn(b"result content", self.received[0][1])
+        self.assertIn(b"pass", self.received[0][1])
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_retry(self):
+        self.responses += [(504, ""), (500, "error")]
+        q = UploadQueue(self.spool, self.logger(), backoff=0.01)
+        q.submit(self.url, "test", "a", "A", "pass", self.src)
+        self.assertEqual(q.wait(), 0)
+        self.assertEqual(len(self.received), 3)
+
+        self.responses += [(500, "FAIL: Already up to date")]
+        q = UploadQueue(self.spool, self.logger(), backoff=0.01)
+        q.submit(self.url, "test", "a", "A", "pass", self.src)
+        self.assertEqual(q.wait(), 0)
+        self.assertEqual(len(self.received), 4)
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_spool(self):
+        self.responses += [(500, "error")] * 3
+        q = UploadQueue(self.spool, self.logger(), backoff=0.01)
+        q.submit(self.url, "test", "a", "A", "pass", self.src)
+        self.assertEqual(q.wait(), 4 | 1)
+        self.assertEqual(len(os.listdir(self.spool)), 2)
+
+        # Result file rewritten in place by a later run, the spooled one is uploaded
+        with open(self.src, "w") as f:
+            f.write("later run content")
+        q = UploadQueue(self.spool, self.logger(), backoff=0.01)
+        q.resume(self.conf)
+        self.assertEqual(q.wait(), 0)
+        self.assertEqual(len(self.received), 4)
+        self.assertIn(b"result content", self.received[-1][1])
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_resume_no_password(self):
+        self.responses += [(500, "error")] * 3
+        q = UploadQueue(self.spool, self.logger(), backoff=0.01)
+        q.submit(self.url, "test", "b", "B", "pass", self.src)
+        self.assertEqual(q.wait(), 4 | 1)
+
+        q = UploadQueue(self.spool, self.logger(), backoff=0.01)
+        q.resume(self.conf)
+        self.assertEqual(q.wait(), 0)
+        self.assertEqual(len(self.received), 3)
+        self.assertEqual(os.listdir(self.spool), ["error"])
+        self.assertEqual(len(os.listdir(os.path.join(self.spool, "error"))), 2)
@@ -0,0 +1,203 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Cache of the results of a costly check of tag values, for values repeated
+# on many objects. Least recently used values are dropped above `size`.
+# When persistent, results are also kept between runs in the cache
+# directory, as JSON, and dropped when `version` changes.
+
+import json
+import os
+from collections import OrderedDict
+from . import config
+
+
+class ValueCache:
+
+    def __init__(self, name, version, size=100000, persistent=True, dir=None):
+        self.version = str(version)
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._disk = None
+        self._changed = False
+        dir = dir or config.dir_cache
+        self.file = None
+        if persistent and os.path.isdir(dir):
+            self.file = os.path.join(dir, "value_cache-{0}.json".format(name))
+
+    def _load(self):
+        if self._disk is None:
+            self._disk = {}
+            try:
+                with open(self.file, 'r') as f:
+                    data = json.load(f)
+                if data.get("version") == self.version:
+                    self._disk = data["values"]
+            except (IOError, ValueError, KeyError):
+                pass
+        return self._disk
+
+    def get(self, value, compute):
+        """
+        Return compute(value), from the cache when possible. `value` must be a
+        string and the result serializable in JSON when persistent.
+        """
+        try:
+            result = self._lru[value]
+            self._lru.move_to_end(value)
+            self.hits += 1
+            return result
+        except KeyError:
+            pass
+
+        if self.file and value in self._load():
+            result = self._disk[value]
+            self.hits += 1
+        else:
+            result = compute(value)
+            self.misses += 1
+            self._changed = True
+
+        self._lru[value] = result
+        if len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+        return result
+
+    def get_many(self, values, compute):
+        """
+        Return a dict value -> result of the values, computing the missing
+        ones at once with compute(list of values) -> list of results.
+        """
+        results = {}
+        missing = []
+        for value in values:
+            if value in results:
+                continue
+            if value in self._lru:
+                results[value] = self._lru[value]
+                self._lru.move_to_end(value)
+                self.hits += 1
+            elif self.file and value in self._load():
+                results[value] = self._lru[value] = self._disk[value]
+                self.hits += 1
+            else:
+                missing.append(value)
+                results[value] = None
+
+        if missing:
+            for value, result in zip(missing, compute(missing)):
+                results[value] = self._lru[value] = result
+            self.misses += len(missing)
+            self._changed = True
+
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+        return results
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def stats(self):
+        return "{0} values, {1} hits, {2} misses, hit ratio {3:.0%}".format(len(self._lru), self.hits, self.misses, self.hit_ratio())
+
+    def save(self):
+        if not self.file or not self._changed:
+            return
+        # Recently used values first, then the ones from previous runs
+        values = dict(self._lru)
+        for k, v in self._load().items():
+            if len(values) >= self.size:
+                break
+            values.setdefault(k, v)
+        try:
+            tmp = "{0}.{1}".format(self.file, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump({"version": self.version, "values": values}, f)
+            os.replace(tmp, self.file)
+            self._changed = False
+        except IOError:
+            pass
+
+
+###########################################################################
+import unittest
+import tempfile
+
+class Test(unittest.TestCase):
+
+    def test(self):
+        calls = []
+        def compute(value):
+            calls.append(value)
+            return {"isValid": value == "ok"}
+
+        c = ValueCache("test", 1, size=2, persistent=False)
+        self.assertEqual(c.get("ok", compute), {"isValid": True})
+        self.assertEqual(c.get("ok", compute), {"isValid": True})
+        self.assertEqual(c.get("ko", compute), {"isValid": False})
+        c.get("other", compute) # Drop "ok"
+        c.get("ok", compute)
+        self.assertEqual(calls, ["ok", "ko", "other", "ok"])
+        self.assertEqual((c.hits, c.misses), (1, 4))
+        self.assertEqual(c.hit_ratio(), 0.2)
+        c.save()
+
+    def test_persistent(self):
+        with tempfile.TemporaryDirectory() as dir:
+            calls = []
+            def compute(value):
+                calls.append(value)
+                return len(value)
+
+            c = ValueCache("test", "1.0", dir=dir)
+            c.get("a", compute)
+            c.get("bb", compute)
+            c.save()
+
+            c = ValueCache("test", "1.0", dir=dir)
+            self.assertEqual(c.get("bb", compute), 2)
+            self.assertEqual(calls, ["a", "bb"])
+            self.assertEqual(c.hits, 1)
+
+            # Results of other versions are not used
+            c = ValueCache("test", "2.0", dir=dir)
+            self.assertEqual(c.get("bb", compute), 2)
+            self.assertEqual(calls, ["a", "bb", "bb"])
+
+    def test_get_many(self):
+        with tempfile.TemporaryDirectory() as dir:
+            calls = []
+            def compute(values):
+                calls.append(values)
+                return [len(value) for value in values]
+
+            c = ValueCache("test", 1, dir=dir)
+            self.assertEqual(c.get_many(["a", "bb", "a"], compute), {"a": 1, "bb": 2})
+            c.save()
+
+            c = ValueCache("test", 1, size=2, dir=dir)
+            self.assertEqual(c.get_many(["bb", "ccc", "dddd"], compute), {"bb": 2, "ccc": 3, "dddd": 4})
+            self.assertEqual(calls, [["a", "bb"], ["ccc", "dddd"]])
+            self.assertEqual((c.hits, c.misses), (1, 2))
+            self.assertEqual(len(c._lru), 2)
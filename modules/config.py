@@ -51,3 +51,5 @@ dir_cache = os.path.join(dir_work, "cache")
 dir_results = os.path.join(dir_work, "results")
 dir_extracts = os.path.join(dir_work, "extracts")
 dir_diffs = os.path.join(dir_work, "diffs")
+dir_spool = os.path.join(dir_work, "spool")
+dir_reference = os.environ.get("OSMOSE_REFERENCE_DATA", os.path.join(dir_work, "reference"))
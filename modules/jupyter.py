@@ -50,6 +50,8 @@ def run(conf, analyser, plugin = None, format = 'osmose'):
         'verbose': False,
         'plugin': plugin and [plugin] or [],
         'change': False,
+        'sax_node_cache': False,
+        'sax_profile': None,
     })
 
     LOG = StringIO()
@@ -45,6 +45,12 @@ boost::python::list nodeIdToList(const std::vector<uint64_t> & refs) {
     return list;
 }
 
+// Ids as bytes of native uint64, to avoid a Python int object by id
+boost::python::object idsToBytes(const std::vector<uint64_t> & ids) {
+    return boost::python::object(boost::python::handle<>(PyBytes_FromStringAndSize(
+        reinterpret_cast<const char *>(ids.data()), ids.size() * sizeof(uint64_t))));
+}
+
 boost::python::list referencesToDict(const References & refs) {
     boost::python::list list;
     for (const auto & i: refs) {
@@ -78,7 +84,29 @@ struct Visitor
       since_timestamp = timestamp;
   }
 
+  void set_node_coordinates(boost::python::object buffer) {
+      // Writable buffer of lat, lon doubles indexed by node id, filled with
+      // all the nodes, including the ones without tags not sent to python
+      clear_node_coordinates();
+      if (PyObject_GetBuffer(buffer.ptr(), &node_coordinates, PyBUF_WRITABLE) != 0) {
+          throw_error_already_set();
+      }
+  }
+
+  void clear_node_coordinates() {
+      if (node_coordinates.buf) {
+          PyBuffer_Release(&node_coordinates);
+          node_coordinates.buf = NULL;
+      }
+  }
+
   void node_callback(uint64_t osmid, double lon, double lat, const Tags & tags, const uint64_t timestamp) {
+      if (node_coordinates.buf && osmid < node_coordinates.len / (2 * sizeof(double))) {
+          double * c = static_cast<double *>(node_coordinates.buf) + 2 * osmid;
+          c[0] = lat;
+          c[1] = lon;
+      }
+
       if (!tags.empty() && (since_timestamp == 0 || timestamp == 0 || timestamp >= since_timestamp)) {
           call_method<void>(self, "node", osmid, lon, lat, tagsToDict(tags));
       } else {
@@ -86,8 +114,8 @@ struct Visitor
       }
   }
 
-  boost::python::list filtered_nodes() const {
-      return nodeIdToList(filtered_nodes_osmid);
+  boost::python::object filtered_nodes() const {
+      return idsToBytes(filtered_nodes_osmid);
   }
 
   void way_callback(uint64_t osmid, const Tags & tags, const std::vector<uint64_t> & refs, const uint64_t timestamp) {
@@ -98,8 +126,8 @@ struct Visitor
       }
   }
 
-  boost::python::list filtered_ways() const {
-      return nodeIdToList(filtered_ways_osmid);
+  boost::python::object filtered_ways() const {
+      return idsToBytes(filtered_ways_osmid);
   }
 
   void relation_callback(uint64_t osmid, const Tags & tags, const References & refs, const uint64_t timestamp) {
@@ -110,13 +138,14 @@ struct Visitor
       }
   }
 
-  boost::python::list filtered_relations() const {
-      return nodeIdToList(filtered_relations_osmid);
+  boost::python::object filtered_relations() const {
+      return idsToBytes(filtered_relations_osmid);
   }
 
  private:
     PyObject* self;
     uint64_t since_timestamp = 0;
+    Py_buffer node_coordinates = {};
     std::vector<uint64_t> filtered_nodes_osmid;
     std::vector<uint64_t> filtered_ways_osmid;
     std::vector<uint64_t> filtered_relations_osmid;
@@ -127,6 +156,8 @@ BOOST_PYTHON_MODULE(osm_pbf_parser)
 {
     class_<Visitor, Visitor>("Visitor")
         .def("set_since_timestamp", &Visitor::set_since_timestamp)
+        .def("set_node_coordinates", &Visitor::set_node_coordinates)
+        .def("clear_node_coordinates", &Visitor::clear_node_coordinates)
         .def("node", &Visitor::filtered_nodes)
         .def("filtered_nodes", &Visitor::filtered_nodes)
         .def("way", &Visitor::way_callback)
@@ -4,16 +4,20 @@ class Visitor():
 
     def set_since_timestamp(self, timestamp: int) -> None: ...
 
+    def set_node_coordinates(self, buffer: memoryview) -> None: ...
+
+    def clear_node_coordinates(self) -> None: ...
+
     def node(self, osmid: int, lon: int, lat: int, tags: Dict[str, str]) -> None: ...
 
-    def filtered_nodes(self) -> List[int]: ...
+    def filtered_nodes(self) -> bytes: ...
 
     def way(self, osmid: int, tags: Dict, refs: List[int]) -> None: ...
 
-    def filtered_ways(self) -> List[int]: ...
+    def filtered_ways(self) -> bytes: ...
 
     def relation(self, osmid: int, tags: Dict, ref: List[Dict[str, Union[str, int]]]) -> None: ...
 
-    def filtered_relations(self) -> List[int]: ...
+    def filtered_relations(self) -> bytes: ...
 
 def read_osm_pbf(pbf: str, visitor: Visitor) -> None: ...
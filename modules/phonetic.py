@@ -0,0 +1,152 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Phonetic keys of names, kept between runs in a cache by algorithm and
+# algorithm version. The keys of the names not in the cache are computed at
+# once, in Python, or by PostgreSQL for the algorithms only available there.
+
+from .ValueCache import ValueCache
+
+
+_soundex2_accents = str.maketrans(u"ÀÂÄÉÈÊËÎÏÔÖÙÛÜÇ", u"AAAEEEEIIOOUUUC")
+_soundex2_groups = [
+    ("GUI", "KI"), ("GUE", "KE"), ("GA", "KA"), ("GO", "KO"), ("GU", "K"),
+    ("CA", "KA"), ("CO", "KO"), ("CU", "KU"), ("Q", "K"), ("CC", "K"), ("CK", "K"),
+]
+
+def soundex2(name):
+    """
+    French soundex, http://www-lium.univ-lemans.fr/~carlier/recherche/soundex.html
+    Same keys as the former PL/pgSQL FN_SOUNDEX2.
+    """
+    # Upper case, one character for one as PostgreSQL UPPER
+    name = "".join(c if len(c.upper()) != 1 else c.upper() for c in name)
+    name = name.translate(_soundex2_accents)
+    for c in (" ", "-", "'", "/"):
+        name = name.replace(c, "")
+    for group, replacement in _soundex2_groups:
+        name = name.replace(group, replacement)
+
+    # Vowels, but Y, to A, but the first letter
+    name = name[:1] + name[1:].replace("E", "A").replace("I", "A").replace("O", "A").replace("U", "A")
+
+    if name[:3] == "MAC":
+        name = "MCC" + name[3:]
+    elif name[:3] == "ASA":
+        name = "AZA" + name[3:]
+    elif name[:3] == "SCH":
+        name = "SSS" + name[3:]
+    elif name[:2] == "KN":
+        name = "NN" + name[2:]
+    elif name[:2] == "PH":
+        name = "FF" + name[2:]
+
+    # Remove H not after C or S
+    i = 1
+    while i <= len(name) - 1:
+        if name[i - 1] != "C" and name[i - 1] != "S" and name[i] == "H":
+            name = name[:i] + name[i + 1:]
+        i += 1
+
+    # Remove Y not after A
+    i = 1
+    while i <= len(name) - 1:
+        if name[i - 1] != "A" and name[i] == "Y":
+            name = name[:i] + name[i + 1:]
+        i += 1
+
+    if name[-1:] in ("A", "T", "D", "S"):
+        name = name[:-1]
+
+    # Remove A, but the first letter
+    name = name[:1] + name[1:].replace("A", "")
+
+    # Remove repeated letters
+    i = 1
+    last = name[:1]
+    while i <= len(name):
+        if name[i:i + 1] == last:
+            name = name[:i] + name[i + 1:]
+        else:
+            i += 1
+            last = name[i - 1:i]
+
+    return name
+
+
+# name -> (version, Python function, or None when computed by PostgreSQL).
+# Bump the version when the keys change.
+algorithms = {
+    "soundex2": (1, soundex2),
+    "dmetaphone": (1, None),
+}
+
+
+class PhoneticKeys:
+
+    def __init__(self, algorithm, size=1000000, persistent=True, dir=None):
+        self.algorithm = algorithm
+        version, self.function = algorithms[algorithm]
+        self.cache = ValueCache("phonetic-" + algorithm, version, size=size, persistent=persistent, dir=dir)
+
+    def keys(self, names, sql_keys=None):
+        """
+        Return a dict name -> key. sql_keys(list of names) -> list of keys
+        computes the keys of algorithms of PostgreSQL.
+        """
+        if self.function:
+            compute = lambda names: [self.function(name) for name in names]
+        else:
+            compute = sql_keys
+        return self.cache.get_many(names, compute)
+
+    def save(self):
+        self.cache.save()
+
+
+###########################################################################
+import unittest
+
+class Test(unittest.TestCase):
+
+    def test_soundex2(self):
+        self.assertEqual(soundex2(u"Pierre"), soundex2(u"Piere"))
+        self.assertEqual(soundex2(u"Gaulle"), soundex2(u"Gaules"))
+        self.assertEqual(soundex2(u"Général"), soundex2(u"General"))
+        self.assertEqual(soundex2(u"Mac Donald"), "MCDNL")
+        self.assertEqual(soundex2(u"Philippe"), "FLP")
+        self.assertEqual(soundex2(u"Schmitt"), "SMT")
+        self.assertEqual(soundex2(u"Anne"), "AN")
+        self.assertEqual(soundex2(u""), "")
+        self.assertEqual(soundex2(u"ß"), u"ß")
+
+    def test_keys(self):
+        k = PhoneticKeys("soundex2", persistent=False)
+        self.assertEqual(k.keys([u"Piere", u"Pierre"]), {u"Piere": "PR", u"Pierre": "PR"})
+
+        calls = []
+        def sql_keys(names):
+            calls.append(names)
+            return [name.upper() for name in names]
+        k = PhoneticKeys("dmetaphone", persistent=False)
+        self.assertEqual(k.keys(["a", "b"], sql_keys), {"a": "A", "b": "B"})
+        self.assertEqual(k.keys(["a", "c"], sql_keys), {"a": "A", "c": "C"})
+        self.assertEqual(calls, [["a", "b"], ["c"]])
@@ -72,6 +72,7 @@ class template_config:
     osmosis_change_init_post_scripts = [  # Scripts to run on database initialisation
         dir_scripts + "/osmosis/pgsimple_schema_0.6_action_drop.sql",
         dir_scripts + "/osmosis/osmosis-0.48.3-34-gb5383475-SNAPSHOT/script/pgsnapshot_schema_0.6_action.sql",
+        dir_scripts + "/osmosis/CreateTouchedIndex.sql",
     ]
     osmosis_change_post_scripts = [  # Scripts to run each time the database is updated
         dir_scripts + "/osmosis/CreateTouched.sql",
@@ -79,14 +80,30 @@ class template_config:
     osmosis_resume_init_post_scripts = [  # Scripts to run on database initialisation
         dir_scripts + "/osmosis/pgsimple_schema_0.6_action_drop.sql",
         dir_scripts + "/osmosis/osmosis-0.48.3-34-gb5383475-SNAPSHOT/script/pgsnapshot_schema_0.6_action.sql",
+        dir_scripts + "/osmosis/CreateTouchedIndex.sql",
     ]
     osmosis_resume_post_scripts = [  # Scripts to run each time the database is updated
         dir_scripts + "/osmosis/ActionFromTimestamp.sql",
         dir_scripts + "/osmosis/CreateTouched.sql",
     ]
+    osmosis_update_tables = {  # Tables kept up to date on database changes, only when their analyser is run, if any
+        "way_fingerprints": {
+            "analyser": "osmosis_duplicated_geotag",
+            "create": [dir_scripts + "/osmosis/CreateFunctions.sql", dir_scripts + "/osmosis/CreateWayFingerprints.sql"],
+            "update": [dir_scripts + "/osmosis/UpdateWayFingerprints.sql"],
+            "drop": [dir_scripts + "/osmosis/DropWayFingerprints.sql"],
+        },
+        "orphan_nodes": {
+            "analyser": "osmosis_orphan_nodes_cluster",
+            "create": [dir_scripts + "/osmosis/CreateOrphanNodes.sql"],
+            "update": [dir_scripts + "/osmosis/UpdateOrphanNodes.sql"],
+            "drop": [dir_scripts + "/osmosis/DropOrphanNodes.sql"],
+        },
+    }
     dir_results    = modules.config.dir_results
     dir_extracts   = modules.config.dir_extracts
     dir_diffs      = modules.config.dir_diffs
+    dir_spool      = modules.config.dir_spool
 
     db_base: Optional[str] = 'osmose'
     db_user: Optional[str] = 'osmose'
@@ -114,6 +131,10 @@ class template_config:
         self.db_extension_check = []
         self.analyser_updt_url = {}
 
+    def update_tables(self):
+        # Tables of osmosis_update_tables to keep for the analysers of the country
+        return [table for table, update in self.osmosis_update_tables.items() if update.get("analyser") is None or update["analyser"] in self.analyser]
+
     def init(self):
         if "diff" in self.download:
             self.download["diff_path"] = os.path.join(self.dir_diffs, self.country)
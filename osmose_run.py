@@ -22,10 +22,12 @@
 
 from modules import OsmoseLog, download
 from modules.lockfile import lockfile
-from modules import downloader
 from modules import IssuesFileOsmose
 from modules import IssuesFileCsv
 from modules import IssuesFileGeoJson
+from modules import UploadQueue
+from modules import StatusPrefetch
+from modules.IdSet import IdSet
 import sys
 import os
 import traceback
@@ -36,9 +38,7 @@ import osmose_config as config
 import importlib
 import inspect
 import subprocess
-import time
 import dateutil.parser
-import requests
 
 try:
     import sentry_sdk
@@ -60,7 +60,7 @@ def get_version():
 
 def check(conf, logger, options):
     ## check for working dirs and creates when needed
-    dirs = [conf.dir_tmp, conf.dir_cache, conf.dir_results, conf.dir_extracts, conf.dir_diffs]
+    dirs = [conf.dir_tmp, conf.dir_cache, conf.dir_results, conf.dir_extracts, conf.dir_diffs, conf.dir_spool]
     if "diff_path" in conf.download:
         dirs.append(conf.download["diff_path"])
 
@@ -99,6 +99,7 @@ class analyser_config:
         else:
             self.db_schema = conf.country
         self.db_schema_path = conf.db_schema_path
+        self.osmosis_update_post_scripts = [script for table in conf.update_tables() for script in conf.osmosis_update_tables[table]["update"]]
 
         self.options = conf.analyser_options
         self.polygon_id = conf.polygon_id
@@ -106,6 +107,8 @@ class analyser_config:
         self.source_url = conf.source_url
 
         self.plugins = options.plugin
+        self.node_cache = options.sax_node_cache
+        self.plugin_profile = options.sax_profile
 
         self.verbose = options.verbose
 
@@ -166,6 +169,7 @@ def execc(conf, logger, analysers, options, osmosis_manager):
                     if status:
                         newer = True
                 except Exception:
+                    logger.flush()
                     traceback.print_exc()
                     logger.log("Update with diff fails. Fallback to download.")
 
@@ -209,6 +213,24 @@ def execc(conf, logger, analysers, options, osmosis_manager):
 
     version = get_version()
 
+    upload_queue = None
+    if not options.skip_upload:
+        upload_queue = UploadQueue.UploadQueue(conf.dir_spool, logger.sub(), workers=options.upload_jobs)
+        upload_queue.resume(conf)
+
+    status_prefetch = None
+    if not options.skip_analyser and not options.skip_frontend_check:
+        # Get the frontend status of the next analysers, while one runs
+        status_prefetch = StatusPrefetch.StatusPrefetch(modules.config.url_frontend_update, conf.country)
+        for analyser in analysers:
+            if not options.analyser and analyser not in conf.analyser:
+                continue
+            resume = options.resume or (options.resume_analyser and analyser in options.resume_analyser)
+            for name, obj in inspect.getmembers(analysers[analyser]):
+                if (inspect.isclass(obj) and obj.__module__ == "analysers.analyser_" + analyser and
+                    (name.startswith("Analyser") or name.startswith("analyser"))):
+                    status_prefetch.prefetch(name[len("Analyser_"):], bool(resume))
+
     lunched_analyser = []
     lunched_analyser_change = []
     lunched_analyser_resume = []
@@ -241,27 +263,36 @@ def execc(conf, logger, analysers, options, osmosis_manager):
 
                     # analyse
                     if not options.skip_analyser:
-                        with obj(analyser_conf, logger.sub()) as analyser_obj:
-                            remote_timestamp = None
-                            if not options.skip_frontend_check:
-                                url = modules.config.url_frontend_update + "/../../control/status/%s/%s?%s" % (conf.country, analyser_name, 'objects=true' if resume else '')
-                                resp = downloader.request_get(url)
-                                if not resp.ok:
-                                    logger.sub().err("Fails to get status from frontend: {0}".format(resp.status_code))
-                                else:
-                                    try:
-                                        status = resp.json()
-                                        remote_timestamp = dateutil.parser.parse(status['timestamp']) if status else None
-                                        remote_analyser_version = int(status['analyser_version'])
-                                    except Exception as e:
-                                        logger.sub().err(e)
+                        remote_timestamp = None
+                        remote_analyser_version = None
+                        if not options.skip_frontend_check:
+                            try:
+                                status = status_prefetch.get(analyser_name, bool(resume))
+                            except (StatusPrefetch.StatusError, ValueError) as e:
+                                logger.sub().err(e)
+                            else:
+                                try:
+                                    remote_timestamp = dateutil.parser.parse(status['timestamp']) if status else None
+                                    remote_analyser_version = int(status['analyser_version'])
+                                except Exception as e:
+                                    logger.sub().err(e)
 
+                        if remote_timestamp:
+                            # Without building the analyser, when possible
+                            class_version = obj.class_version()
+                            config_timestamp = class_version == remote_analyser_version and obj.config_timestamp(analyser_conf)
+                            if config_timestamp and config_timestamp <= remote_timestamp:
+                                logger.sub().warn("Skip, frontend is already up to date")
+                                continue
+
+                        with obj(analyser_conf, logger.sub()) as analyser_obj:
                             if analyser_obj.timestamp() and remote_timestamp and analyser_obj.timestamp() <= remote_timestamp and analyser_obj.analyser_version() == remote_analyser_version:
                                 logger.sub().warn("Skip, frontend is already up to date")
                                 continue
 
                             if resume and remote_timestamp and analyser_obj.analyser_version() == remote_analyser_version:
-                                already_issued_objects = {'N': status['nodes'] or [], 'W': status['ways'] or [], 'R': status['relations'] or []}
+                                already_issued_objects = {'N': status.get('nodes') or IdSet(), 'W': status.get('ways') or IdSet(), 'R': status.get('relations') or IdSet()}
+                                del status
                                 analyser_obj.analyser_resume(remote_timestamp, already_issued_objects)
                                 lunched_analyser_resume.append([obj, analyser_conf])
                             else:
@@ -280,7 +311,7 @@ def execc(conf, logger, analysers, options, osmosis_manager):
 
                     # update
                     if not options.skip_upload and password != "xxx":
-                        logger.sub().log("update")
+                        logger.sub().log("queue upload")
 
                         if analyser in conf.analyser_updt_url:
                             list_urls = conf.analyser_updt_url[analyser]
@@ -288,48 +319,7 @@ def execc(conf, logger, analysers, options, osmosis_manager):
                             list_urls = [conf.updt_url]
 
                         for url in list_urls:
-                            update_finished = False
-                            nb_iter = 0
-                            was_on_timeout = False
-                            while not update_finished and nb_iter < 3:
-                                time.sleep(nb_iter * 15)
-                                nb_iter += 1
-                                logger.sub().sub().log("iteration=%d" % nb_iter)
-                                try:
-                                    u = url + '?analyser=' + analyser_name + '&country=' + conf.country
-                                    r = requests.post(u, timeout=1800, data={
-                                        'analyser': analyser_name,
-                                        'country': conf.country,
-                                        'code': password
-                                    }, files={
-                                        'content': open(analyser_conf.error_file.dst, 'rb')
-                                    })
-                                    r.raise_for_status()
-                                    logger.sub().sub().log(r.text.strip())
-                                    update_finished = True
-                                except requests.exceptions.HTTPError as e:
-                                    if e.response.status_code == 504:
-                                        was_on_timeout = True
-                                        logger.sub().sub().sub().err('got an HTTP timeout status')
-                                    else:
-                                        dt = r.text.strip()
-                                        logger.sub().sub().sub().err(u"UPDATE ERROR %s/%s : %s\n" % (conf.country, analyser_name, dt))
-                                        if dt == "FAIL: Already up to date":
-                                            update_finished = True
-                                        if nb_iter >= 3 and not was_on_timeout:
-                                            err_code |= 4
-                                except Exception as e:
-                                    if isinstance(e, requests.exceptions.ConnectTimeout):
-                                        was_on_timeout = True
-                                        logger.sub().sub().sub().err('got a connection timeout')
-                                    else:
-                                        tb = traceback.format_exc()
-                                        logger.sub().err('error on update...')
-                                        for l in tb.splitlines():
-                                            logger.sub().sub().log(l)
-
-                        if not update_finished:
-                            err_code |= 1
+                            upload_queue.submit(url, conf.country, analyser, analyser_name, password, analyser_conf.error_file.dst)
 
         except Exception as e:
             tb = traceback.format_exc()
@@ -344,6 +334,9 @@ def execc(conf, logger, analysers, options, osmosis_manager):
     if os.getenv('SENTRY_DSN'):
         sentry_sdk.set_tag('analyser', None)
 
+    if status_prefetch:
+        status_prefetch.close()
+
     if not options.no_clean:
         for (obj, analyser_conf) in lunched_analyser:
             analyser_conf.error_file = None
@@ -358,6 +351,10 @@ def execc(conf, logger, analysers, options, osmosis_manager):
             with obj(analyser_conf, logger.sub()) as analyser_obj:
                 analyser_obj.analyser_deferred_clean()
 
+    if upload_queue:
+        logger.log(logger.log_av_r + u"waiting for uploads" + logger.log_ap)
+        err_code |= upload_queue.wait()
+
     return err_code
 
 
@@ -397,6 +394,7 @@ def run(conf, logger, analysers, options):
             try:
                 osmosis_manager = modules.OsmOsisManager.OsmOsisManager(conf, conf.db_host, conf.db_user, conf.db_password, conf.db_base, conf.db_schema or conf.country, conf.db_persistent, logger)
             except:
+                logger.flush()
                 traceback.print_exc()
                 logger.err(u"error in database initialisation")
                 return 0x10
@@ -404,6 +402,7 @@ def run(conf, logger, analysers, options):
         return execc(conf, logger, analysers, options, osmosis_manager)
     except:
         # Log error in case finally also fails
+        logger.flush()
         traceback.print_exc()
         raise
     finally:
@@ -493,14 +492,16 @@ def main(options):
         try:
             base = '|'.join(map(str, [country_conf.db_base, country_conf.db_host]))
             lfil = "/tmp/analyse-{0}-{1}".format(country, base)
-            lock = lockfile(lfil)
+            lock = lockfile(lfil) if not options.locked else None
         except:
             logger.err("can't lock {0} ({1})".format(country, lfil))
             if options.cron:
+                logger.flush()
                 sys.stderr.write("can't lock %s\n" % country)
             for l in open(lfil).read().rstrip().split("\n"):
                 logger.log("  "+l)
                 if options.cron:
+                    logger.flush()
                     sys.stderr.write("  "+l+"\n")
             if options.cron:
                 sys.stderr.flush()
@@ -544,6 +545,12 @@ if __name__ == "__main__":
     parser.add_option("--plugin", dest="plugin", action="append",
                       help="Plugin to run (can be repeated). For analyser 'sax' only")
 
+    parser.add_option("--sax-node-cache", dest="sax_node_cache", action="store_true",
+                      help="Keep node coordinates of the extract in a temporary file to locate sax analyser issues, instead of reading them from the database")
+
+    parser.add_option("--sax-profile", dest="sax_profile", type=int, metavar="N",
+                      help="Count calls, issues and time, of one call in N, of sax analyser plugins. Written next to the result file")
+
     parser.add_option("--change", dest="change", action="store_true",
                       help="Run analyser on change mode when available")
     parser.add_option("--change_init", dest="change_init", action="store_true",
@@ -556,6 +563,8 @@ if __name__ == "__main__":
 
     parser.add_option("--skip-download", dest="skip_download", action="store_true",
                       help="Don't download extract")
+    parser.add_option("--locked", dest="locked", action="store_true",
+                      help="Country lock already held by the caller")
     parser.add_option("--skip-init", dest="skip_init", action="store_true",
                       help="Don't initialize database")
     parser.add_option("--skip-frontend-check", dest="skip_frontend_check", action="store_true",
@@ -564,6 +573,8 @@ if __name__ == "__main__":
                       help="Don't run the analyse part")
     parser.add_option("--skip-upload", dest="skip_upload", action="store_true",
                       help="Don't upload the analyse result")
+    parser.add_option("--upload-jobs", dest="upload_jobs", type=int, default=2,
+                      help="Number of results uploaded at the same time, in background of the analyses")
     parser.add_option("--no-clean", dest="no_clean", action="store_true",
                       help="Don't remove extract and database after analyses")
 
@@ -582,7 +593,9 @@ if __name__ == "__main__":
                       help="Use \"osmosis\" (default) or \"osmium\" to update the OSM extract")
 
     parser.add_option("--import-tool", dest="import_tool", action="store", default="osmosis",
-                      help="Use \"osmosis\" (default) or \"osmosis-parallel\" to import to postgresql database")
+                      help="Use \"osmosis\" (default), \"osmosis-parallel\" or \"osmium\" to import to postgresql database")
+    parser.add_option("--import-jobs", dest="import_jobs", type=int, default=1,
+                      help="Number of database connections used to load tables and build indexes after import (default 1, serial psql scripts)")
 
     parser.add_option("--version", dest="version", action="store_true",
                       help="Output version information and exit")
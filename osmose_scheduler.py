@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+# Run several countries concurrently, each one with osmose_run.py.
+#
+# A country is a sequence of stages, each stage needs some resources:
+#  - download: "net" and "disk", extract download, for countries without diff
+#  - analyse: "cpu", "db" and "disk", osmose_run.py itself
+# Stages are started by priority, longest countries first, as soon as their
+# resources are available. So the download of a country overlaps the
+# analyse of others.
+
+from modules import OsmoseLog, download
+from modules.lockfile import lockfile
+import modules.config
+import osmose_config as config
+
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+
+class Resources:
+
+    def __init__(self, capacities):
+        self.capacities = capacities
+        self.used = dict((k, 0) for k in capacities)
+
+    def fits(self, needs):
+        for k, v in needs.items():
+            if k not in self.capacities:
+                continue
+            # A need bigger than capacity runs alone
+            if self.used[k] > 0 and self.used[k] + v > self.capacities[k]:
+                return False
+        return True
+
+    def acquire(self, needs):
+        for k, v in needs.items():
+            if k in self.used:
+                self.used[k] += v
+
+    def release(self, needs):
+        for k, v in needs.items():
+            if k in self.used:
+                self.used[k] -= v
+
+
+class Stage:
+
+    def __init__(self, name, needs, run):
+        self.name = name
+        self.needs = needs
+        self.run = run # Return an error code, None to continue with next stage
+
+
+class Job:
+
+    def __init__(self, name, priority, stages):
+        self.name = name
+        self.priority = priority
+        self.stages = stages
+        self.err_code = 0
+
+
+class Scheduler:
+
+    def __init__(self, capacities, logger):
+        self.resources = Resources(capacities)
+        self.logger = logger
+        self.jobs = []
+        self.durations = {}
+        self._cond = threading.Condition()
+
+    def add(self, job):
+        self.jobs.append(job)
+
+    def run(self):
+        ready = sorted(self.jobs, key=lambda job: -job.priority)
+        running = 0
+        threads = []
+
+        def run_stage(job, stage):
+            nonlocal running
+            start = time.time()
+            try:
+                ret = stage.run()
+            except Exception as e:
+                self.logger.err("{0} {1}: {2}".format(job.name, stage.name, e))
+                ret = 0x40
+            with self._cond:
+                self.resources.release(stage.needs)
+                self.logger.log("{0} {1}: end {2:.0f}s, {3}".format(job.name, stage.name, time.time() - start, ret))
+                self.durations[job.name] = self.durations.get(job.name, 0) + time.time() - start
+                job.stages.pop(0)
+                if ret is not None:
+                    job.err_code |= ret
+                    job.stages = []
+                if job.stages:
+                    ready.append(job)
+                    ready.sort(key=lambda job: -job.priority)
+                running -= 1
+                self._cond.notify_all()
+
+        with self._cond:
+            while ready or running:
+                # First job by priority whose next stage fits
+                job = next((job for job in ready if self.resources.fits(job.stages[0].needs)), None)
+                if job is None:
+                    self._cond.wait()
+                    continue
+                ready.remove(job)
+                stage = job.stages[0]
+                self.resources.acquire(stage.needs)
+                running += 1
+                self.logger.log("{0} {1}: start".format(job.name, stage.name))
+                t = threading.Thread(target=run_stage, args=(job, stage), name=job.name)
+                threads.append(t)
+                t.start()
+
+        for t in threads:
+            t.join()
+
+        err_code = 0
+        for job in self.jobs:
+            err_code |= job.err_code
+        return err_code
+
+
+###########################################################################
+
+def country_lock(country_conf):
+    # Same lock as osmose_run.py
+    base = '|'.join(map(str, [country_conf.db_base, country_conf.db_host]))
+    return lockfile("/tmp/analyse-{0}-{1}".format(country_conf.country, base))
+
+
+def country_job(country, args, options, durations, logger):
+    country_conf = config.config[country]
+    country_conf.init()
+
+    size = 0
+    if "dst" in country_conf.download and os.path.exists(country_conf.download["dst"]):
+        size = os.path.getsize(country_conf.download["dst"])
+    size_gb = size / (1024.*1024*1024)
+
+    # Last duration, or estimation from the extract size, 1 MB ~ 10 s
+    priority = durations.get(country) or size / (1024*1024) * 10
+
+    run_args = list(args)
+    stages = []
+    held = {} # Country lock, from the download stage
+
+    if ("url" in country_conf.download and "diff" not in country_conf.download and
+        "--change" not in args and "--skip-download" not in args and "--skip-init" not in args):
+        # Without diff, osmose_run.py only downloads the extract, it can be done
+        # ahead, while other countries are analysed. The country lock is kept
+        # from the download to the end of the analyse, osmose_run.py is told it
+        # is already held.
+        def download_stage():
+            try:
+                held["lock"] = country_lock(country_conf)
+            except:
+                logger.err("can't lock {0}".format(country))
+                return 0x80
+            try:
+                newer = download.dl(country_conf.download["url"], country_conf.download["dst"], logger.sub(), min_file_size=8*1024)
+            except:
+                del held["lock"]
+                raise
+            if not newer:
+                del held["lock"]
+                return 0x11
+            run_args.extend(["--skip-download", "--locked"])
+
+        stages.append(Stage("download", {"net": 1, "disk": size_gb}, download_stage))
+
+    def analyse_stage():
+        cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "osmose_run.py"), "--country", country] + run_args
+        try:
+            if options.log_dir:
+                date = time.strftime("%Y-%m-%d_%H-%M-%S")
+                with open(os.path.join(options.log_dir, "analyse_{0}.{1}.log".format(date, country)), "w") as log, \
+                     open(os.path.join(options.log_dir, "analyse_{0}.{1}.err".format(date, country)), "w") as err:
+                    ret = subprocess.call(cmd, stdout=log, stderr=err)
+            else:
+                ret = subprocess.call(cmd)
+        finally:
+            held.pop("lock", None)
+        return ret
+
+    # Database and uncompressed data are bigger than the extract
+    stages.append(Stage("analyse", {"cpu": 1, "db": 1, "disk": size_gb * 4}, analyse_stage))
+
+    return Job(country, priority, stages)
+
+
+def main(options):
+    logger = OsmoseLog.logger(sys.stdout, True)
+
+    countries = []
+    for country in options.country or []:
+        countries.append((country, options.args))
+    if options.country_file:
+        # Same format as cron-launcher files: country [osmose_run.py options]
+        for line in open(options.country_file):
+            line = shlex.split(line)
+            if line:
+                countries.append((line[0], line[1:] + options.args))
+
+    durations_file = os.path.join(modules.config.dir_work, "scheduler-durations.json")
+    try:
+        durations = json.load(open(durations_file))
+    except (IOError, ValueError):
+        durations = {}
+
+    scheduler = Scheduler({
+        "cpu": options.jobs,
+        "db": options.db_jobs,
+        "net": options.download_jobs,
+        "disk": options.disk_space or float('inf'),
+    }, logger)
+
+    err_code = 0
+    for (country, args) in countries:
+        if country not in config.config:
+            logger.err("Failed to load country {0}".format(country))
+            err_code |= 8
+            continue
+        scheduler.add(country_job(country, args, options, durations, logger))
+
+    err_code |= scheduler.run()
+
+    durations.update(scheduler.durations)
+    try:
+        with open(durations_file, "w") as f:
+            json.dump(durations, f, indent=1, sort_keys=True)
+    except IOError as e:
+        logger.err(e)
+
+    return err_code
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options] [-- osmose_run.py options]")
+    parser.add_option("--country", dest="country", action="append",
+                      help="Country to analyse (can be repeated)")
+    parser.add_option("--country-file", dest="country_file",
+                      help="File with one country by line, optionally followed by osmose_run.py options")
+    parser.add_option("--jobs", dest="jobs", type=int, default=2,
+                      help="Number of countries analysed at the same time")
+    parser.add_option("--db-jobs", dest="db_jobs", type=int, default=2,
+                      help="Number of countries using the database at the same time")
+    parser.add_option("--download-jobs", dest="download_jobs", type=int, default=1,
+                      help="Number of extracts downloaded at the same time")
+    parser.add_option("--disk-space", dest="disk_space", type=float,
+                      help="Disk space available for extracts and databases (in GB)")
+    parser.add_option("--log-dir", dest="log_dir",
+                      help="Write osmose_run.py output of each country in this directory, as local-launcher")
+
+    (options, args) = parser.parse_args()
+    options.args = args
+
+    if not options.country and not options.country_file:
+        parser.print_help()
+        sys.exit(1)
+
+    sys.exit(main(options))
+
+
+###########################################################################
+import unittest
+
+class Test(unittest.TestCase):
+
+    class logger:
+        def log(self, txt):
+            pass
+        def err(self, txt):
+            pass
+
+    def test_resources(self):
+        r = Resources({"cpu": 2, "disk": 10})
+        self.assertTrue(r.fits({"cpu": 1, "disk": 20, "net": 5}))
+        r.acquire({"cpu": 1, "disk": 6})
+        self.assertTrue(r.fits({"cpu": 1, "disk": 4}))
+        self.assertFalse(r.fits({"cpu": 1, "disk": 5}))
+        r.acquire({"cpu": 1})
+        self.assertFalse(r.fits({"cpu": 1}))
+        r.release({"cpu": 2, "disk": 6})
+        self.assertTrue(r.fits({"cpu": 2, "disk": 10}))
+
+    def test_scheduler(self):
+        lock = threading.Lock()
+        events = []
+        concurrent = {"cpu": 0, "max_cpu": 0}
+
+        def stage(name, ret=None):
+            def run():
+                with lock:
+                    events.append(name)
+                    if name.endswith("analyse"):
+                        concurrent["cpu"] += 1
+                        concurrent["max_cpu"] = max(concurrent["max_cpu"], concurrent["cpu"])
+                time.sleep(0.05)
+                with lock:
+                    if name.endswith("analyse"):
+                        concurrent["cpu"] -= 1
+                return ret
+            return run
+
+        s = Scheduler({"cpu": 2, "net": 1}, self.logger())
+        s.add(Job("small", 1, [Stage("download", {"net": 1}, stage("small download")), Stage("analyse", {"cpu": 1}, stage("small analyse", 0))]))
+        s.add(Job("big", 10, [Stage("download", {"net": 1}, stage("big download")), Stage("analyse", {"cpu": 1}, stage("big analyse", 0))]))
+        s.add(Job("old", 5, [Stage("download", {"net": 1}, stage("old download", 0x11)), Stage("analyse", {"cpu": 1}, stage("old analyse", 0))]))
+        s.add(Job("c1", 3, [Stage("analyse", {"cpu": 1}, stage("c1 analyse", 2))]))
+        s.add(Job("c2", 2, [Stage("analyse", {"cpu": 1}, stage("c2 analyse", 0))]))
+
+        self.assertEqual(s.run(), 0x11 | 2)
+        # Downloads are one by one, analyses fill the cpu meanwhile
+        self.assertEqual(set(events[0:3]), set(["big download", "c1 analyse", "c2 analyse"]))
+        self.assertNotIn("old analyse", events)
+        self.assertIn("small analyse", events)
+        self.assertEqual(concurrent["max_cpu"], 2)
+        self.assertEqual(set(s.durations.keys()), set(["small", "big", "old", "c1", "c2"]))
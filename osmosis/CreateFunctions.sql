@@ -38,6 +38,24 @@ $$ LANGUAGE plpgsql
    RETURNS NULL ON NULL INPUT;
 
 
+-- Linestring in a direction independent of the way direction: from the
+-- lowest end point, by X then Y
+CREATE OR REPLACE FUNCTION linestring_normalized(linestring geometry) RETURNS geometry AS $$
+    SELECT
+        CASE
+            WHEN ST_X(ST_StartPoint(linestring)) = ST_X(ST_EndPoint(linestring)) THEN
+                CASE
+                    WHEN ST_Y(ST_StartPoint(linestring)) < ST_Y(ST_EndPoint(linestring)) THEN linestring
+                    ELSE ST_Reverse(linestring)
+                END
+            WHEN ST_X(ST_StartPoint(linestring)) < ST_X(ST_EndPoint(linestring)) THEN linestring
+            ELSE ST_Reverse(linestring)
+        END
+$$ LANGUAGE SQL
+   IMMUTABLE
+   RETURNS NULL ON NULL INPUT;
+
+
 CREATE OR REPLACE FUNCTION way_locate(linestring geometry) RETURNS geometry AS $$
 DECLARE BEGIN
     IF ST_NPoints(linestring) > 1 THEN
@@ -0,0 +1,43 @@
+-- Untagged nodes not referenced by any way, small compared to the nodes,
+-- for the orphan nodes lookups. Updated on database changes by
+-- UpdateOrphanNodes.sql.
+
+DROP TABLE IF EXISTS orphan_nodes CASCADE;
+CREATE TABLE orphan_nodes AS
+SELECT
+    nodes.id,
+    nodes.version,
+    nodes.geom
+FROM
+    nodes
+    LEFT JOIN way_nodes ON
+        way_nodes.node_id = nodes.id
+WHERE
+    nodes.tags = ''::hstore AND
+    way_nodes.node_id IS NULL
+;
+
+ALTER TABLE orphan_nodes ADD PRIMARY KEY (id);
+CREATE INDEX idx_orphan_nodes_geom ON orphan_nodes USING gist(geom);
+ANALYZE orphan_nodes;
+
+-- Nodes removed from ways by the database changes, that can be orphans
+-- now, recorded as osmosis applies the changes
+DROP TABLE IF EXISTS orphan_nodes_candidates CASCADE;
+CREATE TABLE orphan_nodes_candidates (
+    id bigint
+);
+
+CREATE OR REPLACE FUNCTION orphan_nodes_candidates_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO orphan_nodes_candidates SELECT DISTINCT node_id FROM old_way_nodes;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS way_nodes_orphan_nodes_candidates ON way_nodes;
+CREATE TRIGGER way_nodes_orphan_nodes_candidates
+    AFTER DELETE ON way_nodes
+    REFERENCING OLD TABLE AS old_way_nodes
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE orphan_nodes_candidates_insert();
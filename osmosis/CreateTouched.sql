@@ -8,92 +8,145 @@ CREATE TABLE transitive_touched (
 )
 ;
 
--- Row touched nodes, create or modify only
-INSERT INTO transitive_touched
-SELECT
-    'N',
-    id
-FROM
-    actions
-WHERE
-    data_type = 'N' AND
-    action IN ('C', 'M')
-;
+-- The set of changes in actions is small compared to the database, use it
+-- as driving set, to lookup ways and relations through member indexes.
+-- Relations containing touched relations are added up to
+-- osmose.touched_relation_depth levels (default 0, no relations from
+-- relations), eg. SET osmose.touched_relation_depth = 2;
+DO $$
+DECLARE
+    relation_depth integer := coalesce(nullif(current_setting('osmose.touched_relation_depth', true), ''), '0')::integer;
+    moved_nodes bigint[];
+    stage_start timestamp;
+    depth integer := 0;
+    n bigint;
+BEGIN
+    DROP TABLE IF EXISTS transitive_touched_timing;
+    CREATE TEMP TABLE transitive_touched_timing (
+        stage text,
+        duration interval,
+        rows bigint
+    );
 
+    ANALYZE actions;
 
-INSERT INTO transitive_touched
-(
--- Row touched ways, create or modify only
-SELECT
-    'W',
-    id
-FROM
-    actions
-WHERE
-    data_type = 'W' AND
-    action IN ('C', 'M')
-)
-UNION
-(
--- touched ways from nodes
-SELECT
-    DISTINCT ON (id)
-    'W',
-    way_nodes.way_id AS id
-FROM
-    way_nodes
-    JOIN actions ON
-        way_nodes.node_id = actions.id AND
+    -- Row touched nodes, create or modify only
+    stage_start := clock_timestamp();
+    INSERT INTO transitive_touched
+    SELECT
+        'N',
+        id
+    FROM
+        actions
+    WHERE
         data_type = 'N' AND
-        action = 'M'
-)
-;
+        action IN ('C', 'M')
+    ;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    INSERT INTO transitive_touched_timing VALUES ('nodes', clock_timestamp() - stage_start, n);
 
-INSERT INTO transitive_touched
-(
--- Row touched relation, create or modify only
-SELECT
-    'R',
-    id
-FROM
-    actions
-WHERE
-    data_type = 'R' AND
-    action IN ('C', 'M')
-)
-UNION
-(
--- touched relations from nodes
-SELECT
-    DISTINCT ON (id)
-    'R',
-    relation_members.relation_id AS id
-FROM
-    relation_members
-    JOIN actions ON
-        relation_members.member_id = actions.id AND
-        data_type = 'N' AND
-        action = 'M'
-WHERE
-    relation_members.member_type = 'N'
-)
-UNION
-(
--- touched relations from touched ways
-SELECT
-    DISTINCT ON (id)
-    'R',
-    relation_members.relation_id AS id
-FROM
-    relation_members
-    JOIN transitive_touched ON
-        transitive_touched.data_type = 'W' AND
-        relation_members.member_id = transitive_touched.id
-WHERE
-    relation_members.member_type = 'W'
-)
--- no touched relations from relations...
-;
+    moved_nodes := ARRAY(SELECT id FROM actions WHERE data_type = 'N' AND action = 'M');
+
+    stage_start := clock_timestamp();
+    INSERT INTO transitive_touched
+    (
+    -- Row touched ways, create or modify only
+    SELECT
+        'W',
+        id
+    FROM
+        actions
+    WHERE
+        data_type = 'W' AND
+        action IN ('C', 'M')
+    )
+    UNION
+    (
+    -- touched ways from nodes
+    SELECT
+        'W',
+        way_id
+    FROM
+        way_nodes
+    WHERE
+        node_id = ANY(moved_nodes)
+    )
+    ;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    INSERT INTO transitive_touched_timing VALUES ('ways', clock_timestamp() - stage_start, n);
+
+    ANALYZE transitive_touched;
+
+    stage_start := clock_timestamp();
+    INSERT INTO transitive_touched
+    (
+    -- Row touched relation, create or modify only
+    SELECT
+        'R',
+        id
+    FROM
+        actions
+    WHERE
+        data_type = 'R' AND
+        action IN ('C', 'M')
+    )
+    UNION
+    (
+    -- touched relations from nodes
+    SELECT
+        'R',
+        relation_id
+    FROM
+        relation_members
+    WHERE
+        member_id = ANY(moved_nodes) AND
+        member_type = 'N'
+    )
+    UNION
+    (
+    -- touched relations from touched ways
+    SELECT
+        'R',
+        relation_members.relation_id
+    FROM
+        transitive_touched
+        JOIN relation_members ON
+            relation_members.member_id = transitive_touched.id AND
+            relation_members.member_type = 'W'
+    WHERE
+        transitive_touched.data_type = 'W'
+    )
+    ;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    INSERT INTO transitive_touched_timing VALUES ('relations', clock_timestamp() - stage_start, n);
+
+    -- touched relations from touched relations
+    WHILE depth < relation_depth LOOP
+        depth := depth + 1;
+        stage_start := clock_timestamp();
+        INSERT INTO transitive_touched
+        SELECT DISTINCT
+            'R',
+            relation_members.relation_id
+        FROM
+            transitive_touched
+            JOIN relation_members ON
+                relation_members.member_id = transitive_touched.id AND
+                relation_members.member_type = 'R'
+        WHERE
+            transitive_touched.data_type = 'R'
+        ON CONFLICT DO NOTHING
+        ;
+        GET DIAGNOSTICS n = ROW_COUNT;
+        INSERT INTO transitive_touched_timing VALUES ('relations depth ' || depth, clock_timestamp() - stage_start, n);
+        EXIT WHEN n = 0;
+    END LOOP;
+
+    ANALYZE transitive_touched;
+END
+$$ LANGUAGE plpgsql;
+
+SELECT * FROM transitive_touched_timing;
 
 
 DROP VIEW IF EXISTS touched_nodes CASCADE;
@@ -0,0 +1,21 @@
+-- Reverse member indexes covering the parent id, for index-only lookups from
+-- changed objects to ways and relations in CreateTouched.sql. Replace the
+-- ones of databases imported without the parent id.
+DROP INDEX IF EXISTS idx_way_nodes_node_id_way_id;
+DROP INDEX IF EXISTS idx_relation_members_member_id_and_type_relation_id;
+
+DO $$
+BEGIN
+  IF to_regclass('idx_way_nodes_node_id') IS NULL OR (SELECT indnatts = indnkeyatts FROM pg_index WHERE indexrelid = to_regclass('idx_way_nodes_node_id')) THEN
+    DROP INDEX IF EXISTS idx_way_nodes_node_id;
+    CREATE INDEX idx_way_nodes_node_id ON way_nodes USING btree (node_id) INCLUDE (way_id);
+    ANALYZE way_nodes;
+  END IF;
+
+  IF to_regclass('idx_relation_members_member_id_and_type') IS NULL OR (SELECT indnatts = indnkeyatts FROM pg_index WHERE indexrelid = to_regclass('idx_relation_members_member_id_and_type')) THEN
+    DROP INDEX IF EXISTS idx_relation_members_member_id_and_type;
+    CREATE INDEX idx_relation_members_member_id_and_type ON relation_members USING btree (member_id, member_type) INCLUDE (relation_id);
+    ANALYZE relation_members;
+  END IF;
+END
+$$;
@@ -0,0 +1,20 @@
+-- Hashes of the direction normalized geometry and of the tags, without
+-- source and created_by, of the ways, for the duplicate geometry lookups.
+-- Updated on database changes by UpdateWayFingerprints.sql.
+
+DROP TABLE IF EXISTS way_fingerprints CASCADE;
+CREATE TABLE way_fingerprints AS
+SELECT
+    id,
+    sha224(ST_AsBinary(linestring_normalized(linestring))) AS linestring_hash,
+    sha224(convert_to((tags - ARRAY['source', 'created_by'])::text, 'UTF8')) AS tags_hash,
+    ST_IsValid(linestring) AS is_valid
+FROM
+    ways
+WHERE
+    ST_NPoints(linestring) > 1
+;
+
+ALTER TABLE way_fingerprints ADD PRIMARY KEY (id);
+CREATE INDEX idx_way_fingerprints_linestring_hash ON way_fingerprints USING hash (linestring_hash);
+ANALYZE way_fingerprints;
@@ -0,0 +1,6 @@
+-- Remove orphan_nodes and the recording of its candidates, no longer kept
+-- up to date
+DROP TRIGGER IF EXISTS way_nodes_orphan_nodes_candidates ON way_nodes;
+DROP FUNCTION IF EXISTS orphan_nodes_candidates_insert();
+DROP TABLE IF EXISTS orphan_nodes_candidates CASCADE;
+DROP TABLE IF EXISTS orphan_nodes CASCADE;
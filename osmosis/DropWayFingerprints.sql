@@ -0,0 +1,2 @@
+-- Remove way_fingerprints, no longer kept up to date
+DROP TABLE IF EXISTS way_fingerprints CASCADE;
@@ -4,5 +4,5 @@ SET synchronous_commit TO OFF;
 -- Relation members
 \copy relation_members FROM 'relation_members.txt'
 ALTER TABLE ONLY relation_members ADD CONSTRAINT pk_relation_members PRIMARY KEY (relation_id, sequence_id);
-CREATE INDEX idx_relation_members_member_id_and_type ON relation_members USING btree (member_id, member_type);
+CREATE INDEX idx_relation_members_member_id_and_type ON relation_members USING btree (member_id, member_type) INCLUDE (relation_id);
 ALTER TABLE ONLY relation_members CLUSTER ON pk_relation_members;
@@ -4,5 +4,5 @@ SET synchronous_commit TO OFF;
 -- Way nodes
 \copy way_nodes FROM 'way_nodes.txt'
 ALTER TABLE ONLY way_nodes ADD CONSTRAINT pk_way_nodes PRIMARY KEY (way_id, sequence_id);
-CREATE INDEX idx_way_nodes_node_id ON way_nodes USING btree (node_id);
+CREATE INDEX idx_way_nodes_node_id ON way_nodes USING btree (node_id) INCLUDE (way_id);
 ALTER TABLE ONLY way_nodes CLUSTER ON pk_way_nodes;
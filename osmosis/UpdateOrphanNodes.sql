@@ -0,0 +1,65 @@
+-- Update orphan_nodes from the changed nodes and ways, after CreateTouched.sql
+
+DELETE FROM
+    orphan_nodes
+USING
+    actions
+WHERE
+    actions.data_type = 'N' AND
+    orphan_nodes.id = actions.id
+;
+
+-- Nodes now in changed ways
+DELETE FROM
+    orphan_nodes
+USING
+    actions
+    JOIN way_nodes ON
+        way_nodes.way_id = actions.id
+WHERE
+    actions.data_type = 'W' AND
+    actions.action IN ('C', 'M') AND
+    orphan_nodes.id = way_nodes.node_id
+;
+
+INSERT INTO orphan_nodes
+SELECT
+    nodes.id,
+    nodes.version,
+    nodes.geom
+FROM
+    actions
+    JOIN nodes ON
+        nodes.id = actions.id
+    LEFT JOIN way_nodes ON
+        way_nodes.node_id = nodes.id
+WHERE
+    actions.data_type = 'N' AND
+    actions.action IN ('C', 'M') AND
+    nodes.tags = ''::hstore AND
+    way_nodes.node_id IS NULL
+;
+
+-- Nodes removed from changed or deleted ways, without change of the node
+INSERT INTO orphan_nodes
+SELECT
+    nodes.id,
+    nodes.version,
+    nodes.geom
+FROM
+    (SELECT DISTINCT id FROM orphan_nodes_candidates) AS candidates
+    JOIN nodes ON
+        nodes.id = candidates.id
+    LEFT JOIN way_nodes ON
+        way_nodes.node_id = nodes.id
+    LEFT JOIN orphan_nodes ON
+        orphan_nodes.id = nodes.id
+WHERE
+    nodes.tags = ''::hstore AND
+    way_nodes.node_id IS NULL AND
+    orphan_nodes.id IS NULL
+;
+
+TRUNCATE orphan_nodes_candidates;
+
+ANALYZE orphan_nodes;
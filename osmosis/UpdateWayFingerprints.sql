@@ -0,0 +1,37 @@
+-- Update way_fingerprints from the changed ways, after CreateTouched.sql
+
+DELETE FROM
+    way_fingerprints
+USING
+    actions
+WHERE
+    actions.data_type = 'W' AND
+    actions.action = 'D' AND
+    way_fingerprints.id = actions.id
+;
+
+DELETE FROM
+    way_fingerprints
+USING
+    transitive_touched
+WHERE
+    transitive_touched.data_type = 'W' AND
+    way_fingerprints.id = transitive_touched.id
+;
+
+INSERT INTO way_fingerprints
+SELECT
+    ways.id,
+    sha224(ST_AsBinary(linestring_normalized(ways.linestring))) AS linestring_hash,
+    sha224(convert_to((ways.tags - ARRAY['source', 'created_by'])::text, 'UTF8')) AS tags_hash,
+    ST_IsValid(ways.linestring) AS is_valid
+FROM
+    transitive_touched
+    JOIN ways ON
+        ways.id = transitive_touched.id
+WHERE
+    transitive_touched.data_type = 'W' AND
+    ST_NPoints(ways.linestring) > 1
+;
+
+ANALYZE way_fingerprints;
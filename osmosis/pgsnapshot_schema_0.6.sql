@@ -104,9 +104,9 @@ ALTER TABLE ONLY relation_members ADD CONSTRAINT pk_relation_members PRIMARY KEY
 -- Add indexes to tables.
 CREATE INDEX idx_nodes_geom ON nodes USING gist (geom);
 
-CREATE INDEX idx_way_nodes_node_id ON way_nodes USING btree (node_id);
+CREATE INDEX idx_way_nodes_node_id ON way_nodes USING btree (node_id) INCLUDE (way_id);
 
-CREATE INDEX idx_relation_members_member_id_and_type ON relation_members USING btree (member_id, member_type);
+CREATE INDEX idx_relation_members_member_id_and_type ON relation_members USING btree (member_id, member_type) INCLUDE (relation_id);
 
 
 -- Set to cluster nodes by geographical location.
@@ -25,6 +25,8 @@ from plugins.Plugin import Plugin
 
 class Addr_Interpolation(Plugin):
 
+    trigger_keys = ["addr:interpolation"]
+
     def init(self, logger):
         Plugin.init(self, logger)
         self.errors[20601] = self.def_class(item = 2060, level = 3, tags = ['tag', 'addr'],
@@ -24,7 +24,8 @@ from plugins.Plugin import Plugin
 import re
 from datetime import date
 from modules.Stablehash import stablehash64
-from plugins.TagFix_Opening_Hours import TagFix_Opening_Hours
+from modules.ValueCache import ValueCache
+from plugins.TagFix_Opening_Hours import TagFix_Opening_Hours, module_PyKOpeningHours, sanitize_cache
 
 class ConditionalRestrictions(Plugin):
   def init(self, logger):
@@ -44,6 +45,7 @@ class ConditionalRestrictions(Plugin):
 
     OHplugin = TagFix_Opening_Hours(None)
     self.sanitize_openinghours = OHplugin.sanitize_openinghours
+    self.conditional_cache = ValueCache("conditional", None, persistent=False)
 
     self.errors[33501] = self.def_class(item = 3350, level = 2, tags = ['highway', 'fix:chair'],
         title = T_('Bad conditional restriction'),
@@ -81,134 +83,141 @@ For example, use `no @ (weight > 5 AND wet)` rather than `no@weight>5 and wet`.'
 
     err = []
     for tag in tags_conditional:
-      tag_value = tags_conditional[tag]
-      conditions = []
-      parentheses = 0
-      past_parentheses = False
-      bad_tag = False
-
-      if not "@" in tag_value:
-        err.append({"class": 33501, "subclass": 0 + stablehash64(tag + '|' + tag_value), "text": T_("Missing `@` in \"{0}\"", tag)})
-        continue
+      # Same values are frequent, results only depend on the tag and value
+      err.extend(map(dict, self.conditional_cache.get((tag, tags_conditional[tag]), self.check_conditional)))
 
-      # Conditionals are split by semicolons, i.e. value @ condition; value @ condition
-      # Herein, condition can also contain semicolons, e.g. no @ (Mo 06:00-24:00; Tu-Fr 00:00-24:00)
-      # In this case, the condition is wrapped in parentheses ( )
-      # Additionally, there's the magic keyword 'AND' to combine conditions
-
-      # Get the parts after the @ excluding parentheses and put them in the list conditions
-      # Also validate the syntax of value @ (condition); value @ condition is obeyed
-      tmp_str = ""
-      condition_started = False
-      for c in tag_value:
-        if c == "@" and not past_parentheses:
-          if len(tmp_str.strip()) == 0:
-            err.append({"class": 33501, "subclass": 1 + stablehash64(tag + '|' + tag_value), "text": T_("Missing value for the condition in \"{0}\"", tag)})
-            bad_tag = True
-            break
-          tmp_str = ""
-          condition_started = True
-        elif c == "(":
-          parentheses += 1
-          if not condition_started:
-            err.append({"class": 33501, "subclass": 0 + stablehash64(tag + '|' + tag_value), "text": T_("Missing `@` in \"{0}\"", tag)})
-            bad_tag = True
-            break
-          if parentheses == 1 and tmp_str.lstrip() != "":
-            err.append({"class": 33501, "subclass": 7 + stablehash64(tag + '|' + tag_value), "text": T_("Unexpected \"{0}\" before or after parentheses in \"{1}\"", tmp_str.strip(), tag)})
-            bad_tag = True
-            break
-        elif c == ")":
-          parentheses -= 1
-          if parentheses == -1:
-            err.append({"class": 33501, "subclass": 2 + stablehash64(tag + '|' + tag_value), "text": T_("Mismatch in the number of parentheses in \"{0}\"", tag)})
-            bad_tag = True
-            break
-          if parentheses == 0:
-            past_parentheses = True
-        elif c == ";" and parentheses == 0 and condition_started:
-          tmp_str = tmp_str.strip()
-          if len(tmp_str) == 0:
-            err.append({"class": 33501, "subclass": 3 + stablehash64(tag + '|' + tag_value), "text": T_("Missing condition, `@` or parentheses in \"{0}\"", tag)})
-            bad_tag = True
-            break
-          conditions.append(tmp_str)
-          condition_started = False
-          past_parentheses = False
-          tmp_str = ""
-        else:
-          tmp_str += c
-          if past_parentheses and c != " ": # tolerate spaces
-            err.append({"class": 33501, "subclass": 7 + stablehash64(tag + '|' + tag_value), "text": T_("Unexpected \"{0}\" before or after parentheses in \"{1}\"", c, tag)})
-            bad_tag = True
-            break
-
-      if not bad_tag:
-        if parentheses == 0:
-          # Last condition wouldn't be added in the loop
-          tmp_str = tmp_str.strip()
-          if not condition_started or len(tmp_str) == 0:
-            err.append({"class": 33501, "subclass": 3 + stablehash64(tag + '|' + tag_value), "text": T_("Missing condition, `@` or parentheses in \"{0}\"", tag)})
-            continue
-          conditions.append(tmp_str)
-        else:
-          err.append({"class": 33501, "subclass": 2 + stablehash64(tag + '|' + tag_value), "text": T_("Mismatch in the number of parentheses in \"{0}\"", tag)})
-          continue
+    if err != []:
+      return err
 
-      if not bad_tag:
-        for condition in conditions:
-          condition_ANDsplitted = list(map(str.strip, self.ReAND.split(condition)))
-          # Check the position of AND is ok
-          if "" in condition_ANDsplitted:
-            err.append({"class": 33501, "subclass": 4 + stablehash64(tag + '|' + tag_value + '|' + condition), "text": T_("Missing condition before or after AND combinator in \"{0}\"", tag)})
-            bad_tag = True
-            continue
-
-          if len(condition_ANDsplitted) != condition.count("AND") + 1:
-            # Likely lower/mixed case 'AND' used. Might also be a opening_hours fallback rule
-            # For simplicity: ignore.
-            continue
-
-          for c in condition_ANDsplitted:
-            # Validate time-based conditionals
-            if self.isLikelyOpeningHourSyntax(c):
-              sanitized = self.sanitize_openinghours(self.kOpeningHours452236.sub(r"\1\2", c))
-              if not sanitized['isValid']:
-                if "fix" in sanitized:
-                  err.append({"class": 33504, "subclass": 6 + stablehash64(tag + '|' + tag_value + '|' + c), "text": T_("Involves \"{0}\" in \"{1}\". Consider using \"{2}\"", c, tag, sanitized['fix'])})
-                else:
-                  err.append({"class": 33504, "subclass": 6 + stablehash64(tag + '|' + tag_value + '|' + c), "text": T_("Involves \"{0}\" in \"{1}\"", c, tag)})
-                bad_tag = True
-                break
-            else:
-              # Validate vehicle property comparisons
-              if c[0] in self.comparisonOperatorChars or c[-1] in self.comparisonOperatorChars:
-                err.append({"class": 33501, "subclass": 5 + stablehash64(tag + '|' + tag_value + '|' + c), "text": T_("Unexpected <, = or > in \"{0}\"", tag)})
-                bad_tag = True
-                break
-
-      if bad_tag:
-        continue
+  def check_conditional(self, tag_and_value):
+    tag, tag_value = tag_and_value
+    err = []
+    conditions = []
+    parentheses = 0
+    past_parentheses = False
+    bad_tag = False
 
-      # Find outdated conditional restrictions, i.e. temporary road closures
+    if not "@" in tag_value:
+      err.append({"class": 33501, "subclass": 0 + stablehash64(tag + '|' + tag_value), "text": T_("Missing `@` in \"{0}\"", tag)})
+      return err
+
+    # Conditionals are split by semicolons, i.e. value @ condition; value @ condition
+    # Herein, condition can also contain semicolons, e.g. no @ (Mo 06:00-24:00; Tu-Fr 00:00-24:00)
+    # In this case, the condition is wrapped in parentheses ( )
+    # Additionally, there's the magic keyword 'AND' to combine conditions
+
+    # Get the parts after the @ excluding parentheses and put them in the list conditions
+    # Also validate the syntax of value @ (condition); value @ condition is obeyed
+    tmp_str = ""
+    condition_started = False
+    for c in tag_value:
+      if c == "@" and not past_parentheses:
+        if len(tmp_str.strip()) == 0:
+          err.append({"class": 33501, "subclass": 1 + stablehash64(tag + '|' + tag_value), "text": T_("Missing value for the condition in \"{0}\"", tag)})
+          bad_tag = True
+          break
+        tmp_str = ""
+        condition_started = True
+      elif c == "(":
+        parentheses += 1
+        if not condition_started:
+          err.append({"class": 33501, "subclass": 0 + stablehash64(tag + '|' + tag_value), "text": T_("Missing `@` in \"{0}\"", tag)})
+          bad_tag = True
+          break
+        if parentheses == 1 and tmp_str.lstrip() != "":
+          err.append({"class": 33501, "subclass": 7 + stablehash64(tag + '|' + tag_value), "text": T_("Unexpected \"{0}\" before or after parentheses in \"{1}\"", tmp_str.strip(), tag)})
+          bad_tag = True
+          break
+      elif c == ")":
+        parentheses -= 1
+        if parentheses == -1:
+          err.append({"class": 33501, "subclass": 2 + stablehash64(tag + '|' + tag_value), "text": T_("Mismatch in the number of parentheses in \"{0}\"", tag)})
+          bad_tag = True
+          break
+        if parentheses == 0:
+          past_parentheses = True
+      elif c == ";" and parentheses == 0 and condition_started:
+        tmp_str = tmp_str.strip()
+        if len(tmp_str) == 0:
+          err.append({"class": 33501, "subclass": 3 + stablehash64(tag + '|' + tag_value), "text": T_("Missing condition, `@` or parentheses in \"{0}\"", tag)})
+          bad_tag = True
+          break
+        conditions.append(tmp_str)
+        condition_started = False
+        past_parentheses = False
+        tmp_str = ""
+      else:
+        tmp_str += c
+        if past_parentheses and c != " ": # tolerate spaces
+          err.append({"class": 33501, "subclass": 7 + stablehash64(tag + '|' + tag_value), "text": T_("Unexpected \"{0}\" before or after parentheses in \"{1}\"", c, tag)})
+          bad_tag = True
+          break
+
+    if not bad_tag:
+      if parentheses == 0:
+        # Last condition wouldn't be added in the loop
+        tmp_str = tmp_str.strip()
+        if not condition_started or len(tmp_str) == 0:
+          err.append({"class": 33501, "subclass": 3 + stablehash64(tag + '|' + tag_value), "text": T_("Missing condition, `@` or parentheses in \"{0}\"", tag)})
+          return err
+        conditions.append(tmp_str)
+      else:
+        err.append({"class": 33501, "subclass": 2 + stablehash64(tag + '|' + tag_value), "text": T_("Mismatch in the number of parentheses in \"{0}\"", tag)})
+        return err
+
+    if not bad_tag:
       for condition in conditions:
-        years_str = re.findall(self.ReYear, condition)
-        if len(years_str) == 0:
+        condition_ANDsplitted = list(map(str.strip, self.ReAND.split(condition)))
+        # Check the position of AND is ok
+        if "" in condition_ANDsplitted:
+          err.append({"class": 33501, "subclass": 4 + stablehash64(tag + '|' + tag_value + '|' + condition), "text": T_("Missing condition before or after AND combinator in \"{0}\"", tag)})
+          bad_tag = True
           continue
 
-        maxYear = int(max(years_str))
-        if maxYear < self.currentYear:
-          err.append({"class": 33503, "subclass": 0 + stablehash64(tag + '|' + tag_value + '|' + condition), "text": T_("Condition \"{0}\" in \"{1}\" was only valid until {2}", condition, tag, maxYear)})
-
-      # No parentheses around conditions
-      if tag_value.count("(") < len(conditions):
-        if not (tag_value.count("(") == len(conditions) - 1 and not tag_value[-1] == ")" and re.search(self.ReSimpleCondition, conditions[-1])):
-          # Accept no parentheses around the last one if the last condition was a simple one
-          err.append({"class": 33502, "subclass": 0 + stablehash64(tag + '|' + tag_value), "text": T_("Add parentheses around the condition(s) in \"{0}\"", tag)})
+        if len(condition_ANDsplitted) != condition.count("AND") + 1:
+          # Likely lower/mixed case 'AND' used. Might also be a opening_hours fallback rule
+          # For simplicity: ignore.
+          continue
 
-    if err != []:
+        for c in condition_ANDsplitted:
+          # Validate time-based conditionals
+          if self.isLikelyOpeningHourSyntax(c):
+            sanitized = self.sanitize_openinghours(self.kOpeningHours452236.sub(r"\1\2", c))
+            if not sanitized['isValid']:
+              if "fix" in sanitized:
+                err.append({"class": 33504, "subclass": 6 + stablehash64(tag + '|' + tag_value + '|' + c), "text": T_("Involves \"{0}\" in \"{1}\". Consider using \"{2}\"", c, tag, sanitized['fix'])})
+              else:
+                err.append({"class": 33504, "subclass": 6 + stablehash64(tag + '|' + tag_value + '|' + c), "text": T_("Involves \"{0}\" in \"{1}\"", c, tag)})
+              bad_tag = True
+              break
+          else:
+            # Validate vehicle property comparisons
+            if c[0] in self.comparisonOperatorChars or c[-1] in self.comparisonOperatorChars:
+              err.append({"class": 33501, "subclass": 5 + stablehash64(tag + '|' + tag_value + '|' + c), "text": T_("Unexpected <, = or > in \"{0}\"", tag)})
+              bad_tag = True
+              break
+
+    if bad_tag:
       return err
 
+    # Find outdated conditional restrictions, i.e. temporary road closures
+    for condition in conditions:
+      years_str = re.findall(self.ReYear, condition)
+      if len(years_str) == 0:
+        continue
+
+      maxYear = int(max(years_str))
+      if maxYear < self.currentYear:
+        err.append({"class": 33503, "subclass": 0 + stablehash64(tag + '|' + tag_value + '|' + condition), "text": T_("Condition \"{0}\" in \"{1}\" was only valid until {2}", condition, tag, maxYear)})
+
+    # No parentheses around conditions
+    if tag_value.count("(") < len(conditions):
+      if not (tag_value.count("(") == len(conditions) - 1 and not tag_value[-1] == ")" and re.search(self.ReSimpleCondition, conditions[-1])):
+        # Accept no parentheses around the last one if the last condition was a simple one
+        err.append({"class": 33502, "subclass": 0 + stablehash64(tag + '|' + tag_value), "text": T_("Add parentheses around the condition(s) in \"{0}\"", tag)})
+
+    return err
+
   def isLikelyOpeningHourSyntax(self, condition):
     # Use a scoring system to determine the likelyness of the condition being time/date based
     # Not perfect, i.e. 'Mar' will fall through (and bad cases like JAN-APR are thus also not detected)
@@ -244,6 +253,11 @@ For example, use `no @ (weight > 5 AND wet)` rather than `no@weight>5 and wet`.'
   def relation(self, data, tags, members):
     return self.way(data, tags, None)
 
+  def end(self, logger):
+    logger.log("conditional cache: " + self.conditional_cache.stats())
+    if module_PyKOpeningHours:
+      sanitize_cache().save()
+
 ###########################################################################
 from plugins.Plugin import TestPluginCommon
 
@@ -25,6 +25,8 @@ from plugins.Plugin import Plugin
 
 class P_Name_MisspelledWordByRegex(Plugin):
 
+    trigger_keys = ["name"]
+
     def init(self, logger):
         Plugin.init(self, logger)
         self.errors[701] = self.def_class(item = 5010, level = 1, tags = ['name', 'fix:chair'],
@@ -27,6 +27,8 @@ import re
 
 class Name_Multiple(Plugin):
 
+    trigger_keys = ["name"]
+
     not_for = ["ES-O", "ES-NA", "ES-BI", "ES-SS", "ES-VI"]
 
     def init(self, logger):
@@ -24,11 +24,15 @@ from analysers.Analyser import Analyser
 
 import os
 from inspect import getframeinfo, stack
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 
 
 class Plugin(object):
 
+    # Tag keys the plugin checks. When set, its methods are only called on
+    # objects with one of these keys. A key ending by ":*" is a prefix.
+    trigger_keys: Optional[List[str]] = None
+
     def __init__(self, father):
         self.father = father
 
@@ -152,6 +156,17 @@ class TestPluginCommon(unittest.TestCase):
         import analysers.Analyser
         assert analysers.Analyser  # silence pyflakes
 
+        # Offline reference data, hand made subsets from tests/reference
+        from unittest import mock
+        from modules import config
+        from plugins.modules import name_suggestion_index
+        patcher = mock.patch.object(config, "dir_reference", "tests/reference")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for cached in (name_suggestion_index.load_nsi, name_suggestion_index.load_nsi_matcher):
+            cached.cache_clear()
+            self.addCleanup(cached.cache_clear)
+
     def set_default_config(self, plugin):
         class _config:
             options = {"project": "openstreetmap"}
@@ -24,6 +24,8 @@ from plugins.Plugin import Plugin
 
 class Structural_UnclosedArea(Plugin):
 
+    trigger_keys = ["area"]
+
     def init(self, logger):
         Plugin.init(self, logger)
         self.errors[1100] = self.def_class(item = 1100, level = 3, tags = ['geom', 'fix:imagery'],
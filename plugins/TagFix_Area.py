@@ -25,6 +25,8 @@ from plugins.Plugin import Plugin
 
 class TagFix_Area(Plugin):
 
+    trigger_keys = ["area"]
+
     def init(self, logger):
         Plugin.init(self, logger)
         self.area_yes_good = set(('aerialway', 'aeroway', 'amenity', 'barrier', 'highway', 'historic', 'leisure', 'man_made', 'military', 'playground', 'power', 'public_transport', 'sport', 'tourism', 'traffic_calming', 'waterway'))
@@ -22,7 +22,7 @@
 from modules.OsmoseTranslation import T_
 from plugins.Plugin import TestPluginCommon
 from plugins.Plugin import Plugin
-from plugins.modules.name_suggestion_index import download_nsi
+from plugins.modules.name_suggestion_index import load_nsi_matcher
 
 class TagFix_Brand(Plugin):
 
@@ -50,35 +50,8 @@ If not, see if you can improve the [name-suggestion-index project](https://githu
             return False
         self.country_code = self.father.config.options.get("country").split("-")[0].lower()
 
-        nsi = download_nsi()
-        self.brands_from_nsi = self._parse_category_from_nsi(nsi, "brands/", "brand")
-        self.operators_from_nsi = self._parse_category_from_nsi(nsi, "operators/", "operator")
-
-    def _parse_category_from_nsi(self, nsi, nsiprefix, key):
-        additional_presets = {}
-        for tag, details in nsi.items():
-            if tag.startswith(nsiprefix) and "items" in details:
-                nsi_name = tag[len(nsiprefix):]
-                for preset in details["items"]:
-                    if "locationSet" in preset:
-                        if ("include" in preset["locationSet"] and
-                                self.country_code not in preset["locationSet"]["include"] and
-                                "001" not in preset["locationSet"]["include"]):
-                            continue
-                        if "exclude" in preset["locationSet"] and self.country_code in preset["locationSet"]["exclude"]:
-                            continue
-                    if "matchTags" in preset:
-                        for additional_tag in preset["matchTags"]:
-                            nsi_key = "{}|{}".format(additional_tag, preset["tags"][key])
-                            additional_presets[nsi_key.lower()] = preset
-                    if "matchNames" in preset:
-                        for additional_name in preset["matchNames"]:
-                            nsi_key = "{}|{}".format(nsi_name, additional_name)
-                            additional_presets[nsi_key.lower()] = preset
-                    if "name" in preset["tags"]:
-                        additional_presets["{}|{}".format(nsi_name, preset["tags"]["name"]).lower()] = preset
-                    additional_presets["{}|{}".format(nsi_name, preset["displayName"]).lower()] = preset
-        return additional_presets
+        self.nsi = load_nsi_matcher()
+        self.nsi_selection = self.nsi.select(self.country_code)
 
     def node(self, data, tags):
         if "name" in tags and (not "brand" in tags or not "brand:wikidata" in tags):
@@ -88,8 +61,8 @@ If not, see if you can improve the [name-suggestion-index project](https://githu
                         nsi_key = "{}/{}|{}".format(main_key, tags[main_key], tags["brand"]).lower()
                     else:
                         nsi_key = "{}/{}|{}".format(main_key, tags[main_key], tags["name"]).lower()
-                    if nsi_key in self.brands_from_nsi:
-                        brands_tags = self.brands_from_nsi[nsi_key]["tags"]
+                    brands_tags = self.nsi.match("brands/", nsi_key, self.nsi_selection)
+                    if brands_tags is not None:
                         tags_to_add = {}
                         for tag in brands_tags:
                             if not tags.get(tag):
@@ -102,8 +75,8 @@ If not, see if you can improve the [name-suggestion-index project](https://githu
             for main_key in ["shop", "amenity", "emergency"]:
                 if main_key in tags:
                     nsi_key = "{}/{}|{}".format(main_key, tags[main_key], tags["operator"]).lower()
-                    if nsi_key in self.operators_from_nsi:
-                        operators_tags = self.operators_from_nsi[nsi_key]["tags"]
+                    operators_tags = self.nsi.match("operators/", nsi_key, self.nsi_selection)
+                    if operators_tags is not None:
                         tags_to_add = {}
                         for tag in operators_tags:
                             if not tags.get(tag):
@@ -120,9 +93,73 @@ If not, see if you can improve the [name-suggestion-index project](https://githu
 
 
 ###########################################################################
+from unittest import mock
+from plugins.modules.name_suggestion_index import NsiMatcher, whitelist_from_nsi
 
 
 class Test(TestPluginCommon):
+    nsi_snapshot = {
+        "brands/shop/clothes": {"items": [
+            {"displayName": "Kiabi", "locationSet": {"include": ["001"]}, "tags": {"brand": "Kiabi", "brand:wikidata": "Q3196299", "name": "Kiabi", "shop": "clothes"}},
+            {"displayName": "Zeeman", "locationSet": {"include": ["be", "fr", [4.3, 50.8]]}, "matchNames": ["zeeman textielsupers"], "tags": {"brand": "Zeeman", "name": "Zeeman", "shop": "clothes"}},
+            {"displayName": "Zeeman NL", "locationSet": {"include": ["nl"]}, "matchNames": ["zeeman"], "tags": {"brand": "Zeeman", "name": "Zeeman", "shop": "clothes", "note": "nl"}},
+        ]},
+        "brands/amenity/bank": {"items": [
+            {"displayName": "National Bank", "locationSet": {"include": ["ca"]}, "matchTags": ["amenity/atm"], "tags": {"amenity": "bank", "brand": "National Bank", "name": "National Bank"}},
+            {"displayName": "Everywhere Bank", "locationSet": {"include": ["001"], "exclude": ["fr"]}, "tags": {"amenity": "bank", "brand": "Everywhere Bank"}},
+            {"displayName": "Nowhere Bank", "locationSet": {"include": []}, "tags": {"amenity": "bank", "brand": "Nowhere Bank", "name": "Nowhere Bank"}},
+        ]},
+        "operators/amenity/fire_station": {"items": [
+            {"displayName": "Bataillon de marins-pompiers de Marseille", "locationSet": {"include": ["fr-13.geojson", "fr"]}, "tags": {"amenity": "fire_station", "operator": "Bataillon de marins-pompiers de Marseille", "operator:wikidata": "Q2891011"}},
+        ]},
+        "transit/route/bus": {"items": [
+            {"displayName": "Bus", "tags": {"network": "Bus"}},
+        ]},
+        "brands/shop/empty": {},
+    }
+
+    def test_matcher(self):
+        m = NsiMatcher(self.nsi_snapshot)
+
+        fr = m.select("fr")
+        assert m.match("brands/", "shop/clothes|kiabi", fr)["brand:wikidata"] == "Q3196299"
+        assert m.match("brands/", "shop/clothes|zeeman textielsupers", fr)["brand"] == "Zeeman"
+        assert "note" not in m.match("brands/", "shop/clothes|zeeman", fr)
+        assert m.match("brands/", "amenity/bank|everywhere bank", fr) is None
+        assert m.match("brands/", "amenity/bank|nowhere bank", fr) is None
+        assert m.match("brands/", "amenity/atm|national bank", fr) is None
+        assert m.match("operators/", "amenity/fire_station|bataillon de marins-pompiers de marseille", fr)
+
+        nl = m.select("nl")
+        # Last matching entry
+        assert m.match("brands/", "shop/clothes|zeeman", nl)["note"] == "nl"
+        assert m.match("brands/", "amenity/bank|everywhere bank", nl)
+        assert m.match("brands/", "shop/clothes|zeeman textielsupers", nl) is None
+        assert m.match("operators/", "amenity/fire_station|bataillon de marins-pompiers de marseille", nl) is None
+
+        ca = m.select("ca")
+        assert m.match("brands/", "amenity/atm|national bank", ca)["name"] == "National Bank"
+
+        unknown = m.select("zz")
+        assert m.match("brands/", "shop/clothes|kiabi", unknown)
+        assert m.match("brands/", "shop/clothes|zeeman", unknown) is None
+
+        # Same names as without the matcher
+        for country in ("fr", "nl", "ca", "be", "zz"):
+            for nsiprefix in ("brands/", "operators/", "transit/"):
+                self.assertEqual(m.whitelist(m.select(country), nsiprefix), whitelist_from_nsi(country, self.nsi_snapshot, nsiprefix))
+
+    def test_snapshot(self):
+        a = TagFix_Brand(None)
+        self.set_default_config(a)
+        a.father.config.options["country"] = "FR"
+        with mock.patch("plugins.TagFix_Brand.load_nsi_matcher", return_value=NsiMatcher(self.nsi_snapshot)):
+            a.init(None)
+
+        self.check_err(a.node(None, {"name": "Kiabi", "shop": "clothes"}))
+        assert a.node(None, {"name": "Kiabi", "shop": "clothes"})["fix"]["+"] == {"brand": "Kiabi", "brand:wikidata": "Q3196299"}
+        assert not a.node(None, {"name": "Everywhere Bank", "amenity": "bank"})
+        self.check_err(a.node(None, {"name": "Fire station", "amenity": "fire_station", "operator": "Bataillon de marins-pompiers de Marseille"}))
     def test_FR(self):
         a = TagFix_Brand(None)
         class _config:
@@ -22,6 +22,7 @@
 from modules.OsmoseTranslation import T_
 from plugins.Plugin import Plugin
 from modules.downloader import urlread
+from modules import ReferenceData
 from modules.Stablehash import stablehash
 import re
 
@@ -101,7 +102,7 @@ features](https://wiki.openstreetmap.org/wiki/Deprecated_features)''')
             title = T_('Deprecated value'),
             detail = detail)
 
-        self.Deprecated = self.deprecated_list()
+        self.Deprecated = ReferenceData.load("deprecated", self.deprecated_list)
         self.DeprecatedSet = set(self.Deprecated)
 
     def node(self, data, tags):
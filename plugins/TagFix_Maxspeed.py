@@ -25,6 +25,8 @@ from plugins.Plugin import Plugin
 
 class TagFix_Maxspeed(Plugin):
 
+    trigger_keys = ["maxspeed"]
+
     maxspeed_table_default = {
         'urban': ['50'],
         'rural': ['90'],
@@ -20,7 +20,11 @@
 ###########################################################################
 
 from modules.OsmoseTranslation import T_
+from modules.ValueCache import ValueCache
 from plugins.Plugin import Plugin
+import importlib.metadata
+import os
+import sys
 
 try:
     from PyKOpeningHours.PyKOpeningHours import OpeningHours, Error
@@ -29,8 +33,25 @@ except ImportError as e:
     print(e)
     module_PyKOpeningHours = False
 
+
+# Validation results by value, shared by plugin instances
+_sanitize_cache = None
+
+def sanitize_cache():
+    global _sanitize_cache
+    if _sanitize_cache is None:
+        try:
+            version = importlib.metadata.version("PyKOpeningHours")
+        except importlib.metadata.PackageNotFoundError:
+            st = os.stat(sys.modules[OpeningHours.__module__].__file__)
+            version = "{0}-{1}".format(st.st_mtime_ns, st.st_size)
+        _sanitize_cache = ValueCache("opening_hours", version)
+    return _sanitize_cache
+
 class TagFix_Opening_Hours(Plugin):
 
+    trigger_keys = ["opening_hours"]
+
     def init(self, logger):
         if not module_PyKOpeningHours:
             return False
@@ -42,6 +63,9 @@ class TagFix_Opening_Hours(Plugin):
     def sanitize_openinghours(self, openinghours_value):
         if not module_PyKOpeningHours:
             return
+        return sanitize_cache().get(openinghours_value, self._sanitize_openinghours)
+
+    def _sanitize_openinghours(self, openinghours_value):
         parser = OpeningHours()
         parser.setExpression(openinghours_value)
         if parser.error() == Error.SyntaxError or parser.error() == Error.IncompatibleMode:
@@ -69,6 +93,10 @@ class TagFix_Opening_Hours(Plugin):
     def relation(self, data, tags, members):
         return self.node(data, tags)
 
+    def end(self, logger):
+        logger.log("opening_hours cache: " + sanitize_cache().stats())
+        sanitize_cache().save()
+
 
 ###########################################################################
 from plugins.Plugin import TestPluginCommon
@@ -22,6 +22,7 @@
 from modules.OsmoseTranslation import T_
 from plugins.Plugin import Plugin
 from modules.downloader import urlread
+from modules import ReferenceData
 import re
 
 
@@ -48,11 +49,14 @@ class TagFix_Postcode(Plugin):
         elif len(regexs) == 1:
             return "^"+regexs[0]+"$"
 
+    def postcode_formats(self):
+        data = urlread(u"https://en.wikipedia.org/wiki/List_of_postal_codes?action=raw", 1)
+        return list(filter(lambda t: len(t) > 2 and (t[1] != "- no codes -" or t[2] != ""), map(lambda x: list(map(lambda y: y.strip(), x.split("|")))[5:8], data.split("|-")[1:-1])))
+
     def list_postcode(self):
         reline = re.compile("^[-CAN ]+$")
         # remline = re.compile("^[-CAN ]+ *\([-CAN ]+\)$")
-        data = urlread(u"https://en.wikipedia.org/wiki/List_of_postal_codes?action=raw", 1)
-        data = filter(lambda t: len(t) > 2 and (t[1] != "- no codes -" or t[2] != ""), map(lambda x: list(map(lambda y: y.strip(), x.split("|")))[5:8], data.split("|-")[1:-1]))
+        data = ReferenceData.load("postcode", self.postcode_formats)
         postcode = {}
         for line in data:
             iso = line[0][0:2]
@@ -22,6 +22,7 @@
 from modules.OsmoseTranslation import T_
 from plugins.Plugin import Plugin
 from modules.downloader import urlread
+from modules import ReferenceData
 import json
 
 
@@ -33,7 +34,7 @@ class TagFix_Wikidata(Plugin):
             title = T_('This wikidata value matches a chain store, it should be in a brand:wikidata tag.'),
             resource = 'https://www.wikidata.org/wiki/Q507619')
 
-        self.black_list = self.black_list()
+        self.black_list = set(ReferenceData.load("wikidata_chain_store", self.black_list))
 
     def black_list(self):
         wikidata_query_for_chain_store = u"https://query.wikidata.org/sparql?query=SELECT%20DISTINCT%20%3Fitem%20%3FitemLabel%20WHERE%20{%0A%20{%20%3Fitem(wdt%3AP31%2Fwdt%3AP279*)wd%3AQ507619%20}%20UNION%20{%20%3Fitem(wdt%3AP31%2Fwdt%3AP279*)%20wd%3AQ1631129%20}%0A%20SERVICE%20wikibase%3Alabel%20{%20bd%3AserviceParam%20wikibase%3Alanguage%20%22[AUTO_LANGUAGE]%2Cen%22.%20}%0A}&format=json"
@@ -21,13 +21,15 @@
 
 from modules.OsmoseTranslation import T_
 from plugins.Plugin import Plugin
-from modules.downloader import urlread
 from modules.Stablehash import stablehash64
+from plugins.modules.wikipedia_interwiki import WikipediaInterwiki
 import urllib
-import json
 
 
 class TagFix_Wikipedia(Plugin):
+
+    trigger_keys = ["wikipedia", "wikipedia:*"]
+
     def init(self, logger):
         Plugin.init(self, logger)
         if self.father.config.options.get("project") != 'openstreetmap':
@@ -95,6 +97,12 @@ the article. Same for accented letters. Letter must be readable.'''),
         if isinstance(self.Language, list):
             self.Language = None
 
+        self.interwiki = WikipediaInterwiki(self.father.config.options.get("country") or "default")
+
+    def end(self, logger):
+        self.interwiki.save()
+        logger.log("wikipedia interwiki: {0} queries".format(self.interwiki.queries))
+
     def human_readable(self, string):
         try:
             string = urllib.unquote(string.encode('ascii')).decode('utf8')
@@ -138,9 +146,7 @@ the article. Same for accented letters. Letter must be readable.'''),
                 if interwiki is False:
                     try:
                         lang, title = tags[wikipediaTag].split(':')
-                        json_str = urlread(u"https://"+lang+u".wikipedia.org/w/api.php?action=query&prop=langlinks&titles="+title+u"&redirects=&lllimit=500&format=json", 30)
-                        interwiki = json.loads(json_str)
-                        interwiki = dict(map(lambda x: [x["lang"], x["*"]], list(interwiki["query"]["pages"].values())[0]["langlinks"]))
+                        interwiki = self.interwiki.get(lang, title)
                     except:
                         interwiki = None
 
@@ -186,8 +192,44 @@ the article. Same for accented letters. Letter must be readable.'''),
 
 ###########################################################################
 from plugins.Plugin import TestPluginCommon
+import tempfile
+import json
+import os
+import time
 
 class Test(TestPluginCommon):
+    # Stub of the Wikipedia API
+    langlinks = {
+        "fr": {"Tour Eiffel": {"en": "Eiffel Tower", "de": "Eiffelturm"}},
+        "de": {"Jakobsweg": {"fr": "Pèlerinage de Saint-Jacques-de-Compostelle", "en": "Camino de Santiago"}},
+        "uk": {"Подільськ": {"pl": "Podolsk (Ukraina)"}, "Нова Воля": {"ru": "Новая Воля"}},
+    }
+
+    def query(self, url, params):
+        self.queries.append(params["titles"])
+        lang = url.split("//")[1].split(".")[0]
+        titles = params["titles"].split("|")
+        normalized = [{"from": t, "to": t.replace("_", " ")} for t in titles if "_" in t]
+        pages = {}
+        for i, t in enumerate(titles):
+            t = t.replace("_", " ")
+            links = self.langlinks.get(lang, {}).get(t)
+            # Language links of the first article, then of the others, on a continuation request
+            if links is None:
+                pages[str(-i)] = {"title": t, "missing": ""}
+            elif (i == 0) == ("llcontinue" not in params):
+                pages[str(i)] = {"title": t, "langlinks": [{"lang": k, "*": v} for k, v in links.items()]}
+            else:
+                pages[str(i)] = {"title": t}
+        result = {"query": {"normalized": normalized, "pages": pages}}
+        if len(titles) > 1 and "llcontinue" not in params:
+            result["continue"] = {"llcontinue": "1|x", "continue": "||"}
+        return result
+
+    def stub_interwiki(self):
+        self.queries = []
+        self.analyser.interwiki = WikipediaInterwiki(None, query=self.query)
+
     def check(self, tags, has_error, fix=None):
         errors = self.analyser.analyse(tags)
         errors_msg = [self.analyser.errors[e["class"]]["title"]["en"] for e in errors]+[e["text"]["en"] for e in errors if "text" in e]
@@ -223,6 +265,7 @@ class Test(TestPluginCommon):
             config = _config()
         self.analyser.father = father()
         self.analyser.init(None)
+        self.stub_interwiki()
 
         self.check_err(self.analyser.node(None, {u"wikipedia:fr": u"Pèlerinage_de_Saint-Jacques-de-Compostelle", u"wikipedia:en": u"Way_of_St._James", u"wikipedia": u"de:Jakobsweg"}))
 
@@ -234,6 +277,7 @@ class Test(TestPluginCommon):
             config = _config()
         self.analyser.father = father()
         self.analyser.init(None)
+        self.stub_interwiki()
 
         err = 0
 
@@ -375,6 +419,50 @@ class Test(TestPluginCommon):
             config = _config()
         self.analyser.father = father()
         self.analyser.init(None)
+        self.stub_interwiki()
 
         assert not self.analyser.node(None, {"wikipedia": u"uk:Нова Воля", "wikipedia:ru": u"Новая Воля"})
         assert self.analyser.node(None, {"wikipedia": u"uk:Подільськ", "wikipedia:pl": u"Podolsk (Ukraina)"})
+
+    def test_interwiki(self):
+        with tempfile.TemporaryDirectory() as dir:
+            self.queries = []
+            i = WikipediaInterwiki("test", batch=2, query=self.query, dir=dir)
+            self.assertEqual(i.get("fr", "Tour_Eiffel"), {"en": "Eiffel Tower", "de": "Eiffelturm"})
+            self.assertEqual(i.get("fr", "Tour_Eiffel"), {"en": "Eiffel Tower", "de": "Eiffelturm"})
+            self.assertEqual(i.get("uk", "Подільськ"), {"pl": "Podolsk (Ukraina)"})
+            self.assertEqual(i.get("uk", "Нова Воля"), {"ru": "Новая Воля"})
+            self.assertEqual(i.get("uk", "Missing"), {})
+            self.assertEqual(len(self.queries), 4)
+            i.save()
+
+            # From the cache
+            self.queries = []
+            i = WikipediaInterwiki("test", batch=2, query=self.query, dir=dir)
+            self.assertEqual(i.get("uk", "Нова Воля"), {"ru": "Новая Воля"})
+            self.assertEqual(self.queries, [])
+            i.save()
+
+            # Only the articles looked up in the last run, refreshed by batches when expired
+            file = os.path.join(dir, "wikipedia_interwiki-test.json")
+            with open(file) as f:
+                cache = json.load(f)
+            self.assertEqual(list(cache), ["uk:Нова Воля"])
+            cache.update({"uk:Подільськ": [0, {}], "uk:Missing": [0, {}], "fr:Tour Eiffel": [0, {}]})
+            with open(file, "w") as f:
+                json.dump(cache, f)
+            self.queries = []
+            i = WikipediaInterwiki("test", batch=2, query=self.query, dir=dir)
+            self.assertEqual(i.get("uk", "Подільськ"), {"pl": "Podolsk (Ukraina)"})
+            self.assertEqual(i.get("uk", "Нова Воля"), {"ru": "Новая Воля"})
+            i.save()
+            self.assertEqual(sorted(self.queries), ["Tour Eiffel", "Подільськ|Missing", "Подільськ|Missing"])
+            self.assertEqual(i.get("fr", "Tour Eiffel")["en"], "Eiffel Tower")
+            self.assertGreater(i._values[("uk", "Missing")][0], time.time() - 60)
+
+    def test_interwiki_error(self):
+        def query(url, params):
+            raise IOError()
+        i = WikipediaInterwiki(None, query=query)
+        self.assertIsNone(i.get("fr", "Tour Eiffel"))
+        i.save()
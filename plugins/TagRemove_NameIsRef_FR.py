@@ -26,6 +26,8 @@ import re
 
 class TagRemove_NameIsRef_FR(Plugin):
 
+    trigger_keys = ["name"]
+
     only_for = ["FR"]
 
     def init(self, logger):
@@ -22,6 +22,7 @@
 from modules.OsmoseTranslation import T_
 from plugins.Plugin import Plugin
 from modules.downloader import urlread
+from modules import ReferenceData
 from modules.Stablehash import stablehash, stablehash64
 import re
 from collections import defaultdict
@@ -35,6 +36,11 @@ class TagWatchFrViPofm(Plugin):
     def quoted2re(self, string):
         return re.compile(u"^"+string[1:-1]+u"$")
 
+    def tagging_mistakes(self):
+        # Obtain the info from https://wiki.openstreetmap.org/index.php?title=Tagging_mistakes
+        data = urlread(u"https://wiki.openstreetmap.org/index.php?title=Tagging_mistakes&action=raw", 1)
+        return data.split("\n")
+
     def init(self, logger):
         Plugin.init(self, logger)
 
@@ -54,9 +60,7 @@ class TagWatchFrViPofm(Plugin):
 
         reline = re.compile(r"^\|([^|]*)\|\|([^|]*)\|\|([^|]*)\|\|([^|]*).*")
 
-        # Obtain the info from https://wiki.openstreetmap.org/index.php?title=Tagging_mistakes
-        data = urlread(u"https://wiki.openstreetmap.org/index.php?title=Tagging_mistakes&action=raw", 1)
-        data = data.split("\n")
+        data = ReferenceData.load("tagging_mistakes", self.tagging_mistakes)
         for line in data:
             for res in reline.findall(line):
                 only_for = res[3].strip()
@@ -25,6 +25,8 @@
 # name suggestion index (NSI) for Osmose - https://nsi.guide/
 
 from modules.downloader import urlread
+from modules import ReferenceData
+from functools import lru_cache
 import json
 
 
@@ -35,11 +37,112 @@ def download_nsi():
     results = json.loads(json_str)
     return results['nsi']
 
+# Returns the parsed NSI database, prebuilt or downloaded, once by process
+@lru_cache(maxsize=None)
+def load_nsi():
+    return ReferenceData.load("nsi", download_nsi)
+
+# Index of the NSI for all the countries, compiled once by NSI version.
+# The location sets of the entries are stored as bitsets of the codes they
+# include and exclude, and evaluated once by country, in select(country).
+# Entries of the categories of `keys` are indexed by lower case
+# "category|name" (e.g. "shop/clothes|kiabi"), as matched by TagFix_Brand.
+class NsiMatcher:
+    def __init__(self, nsi, keys = {'brands/': 'brand', 'operators/': 'operator'}):
+        self.codes = {} # country or region code -> bit
+        self.locations = [] # (include bitset, or None for everywhere, exclude bitset)
+        self.tags = [] # tags by entry
+        self.entry_location = [] # location by entry
+        self.index = dict((nsiprefix, {}) for nsiprefix in keys) # nsiprefix -> key -> entries, in NSI order
+        self.words = {} # nsiprefix -> word of the names -> locations
+
+        location_ids = {}
+        for tag, details in nsi.items():
+            if "items" not in details:
+                continue
+            nsiprefix = tag.split('/', 1)[0] + '/'
+            words = self.words.setdefault(nsiprefix, {})
+            index = self.index.get(nsiprefix)
+            nsi_name = tag[len(nsiprefix):]
+            for preset in details["items"]:
+                location_set = preset.get("locationSet", {})
+                include = location_set.get("include")
+                exclude = location_set.get("exclude", [])
+                location_key = (None if include is None else tuple(map(str, include)), tuple(map(str, exclude)))
+                location = location_ids.get(location_key)
+                if location is None:
+                    location = location_ids[location_key] = len(self.locations)
+                    if include is not None and "001" in include: # 001 = worldwide
+                        include = None
+                    self.locations.append((None if include is None else self._bitset(include), self._bitset(exclude)))
+
+                if "name" in preset["tags"]:
+                    for name in preset["tags"]["name"].split():
+                        words.setdefault(name, set()).add(location)
+                for name in preset["displayName"].split():
+                    words.setdefault(name, set()).add(location)
+
+                if index is None:
+                    continue
+                entry = len(self.tags)
+                self.tags.append(preset["tags"])
+                self.entry_location.append(location)
+                nsi_keys = []
+                if "matchTags" in preset:
+                    for additional_tag in preset["matchTags"]:
+                        nsi_keys.append("{}|{}".format(additional_tag, preset["tags"][keys[nsiprefix]]))
+                if "matchNames" in preset:
+                    for additional_name in preset["matchNames"]:
+                        nsi_keys.append("{}|{}".format(nsi_name, additional_name))
+                if "name" in preset["tags"]:
+                    nsi_keys.append("{}|{}".format(nsi_name, preset["tags"]["name"]))
+                nsi_keys.append("{}|{}".format(nsi_name, preset["displayName"]))
+                for nsi_key in nsi_keys:
+                    index.setdefault(nsi_key.lower(), []).append(entry)
+
+    def _bitset(self, codes):
+        bitset = 0
+        for code in codes:
+            # Other locations, as coordinates, never match a country code
+            if isinstance(code, str):
+                bitset |= 1 << self.codes.setdefault(code, len(self.codes))
+        return bitset
+
+    # Locations valid in a country, to pass to match() and whitelist()
+    # country: the lowercase 2-letter country code of the country of interest
+    def select(self, country):
+        bit = 1 << self.codes[country] if country in self.codes else 0
+        return bytes(
+            (include is None or include & bit != 0) and exclude & bit == 0
+            for include, exclude in self.locations
+        )
+
+    # Returns the tags of the last entry of key valid in the country, or None
+    def match(self, nsiprefix, key, selection):
+        for entry in reversed(self.index[nsiprefix].get(key, ())):
+            if selection[self.entry_location[entry]]:
+                return self.tags[entry]
+
+    def whitelist(self, selection, nsiprefix = 'brands/'):
+        return set(name for name, locations in self.words.get(nsiprefix, {}).items() if any(selection[location] for location in locations))
+
+# Builds the NSI matcher from the NSI database
+def compile_nsi():
+    return NsiMatcher(load_nsi())
+
+# Returns the NSI matcher, prebuilt or compiled, once by process
+@lru_cache(maxsize=None)
+def load_nsi_matcher():
+    return ReferenceData.load("nsi_matcher", compile_nsi)
+
 # Gets all valid (shop, amenity, ...) names that exist within a certain country
 # country: the lowercase 2-letter country code of the country of interest
-# nsi: the parsed NSI database obtained from download_nsi()
+# nsi: the parsed NSI database, by default the NSI matcher is used
 # nsiprefix: 'brands/', 'operators/', 'flags/' or 'transit/'
-def whitelist_from_nsi(country, nsi = download_nsi(), nsiprefix = 'brands/'):
+def whitelist_from_nsi(country, nsi = None, nsiprefix = 'brands/'):
+    if nsi is None:
+        matcher = load_nsi_matcher()
+        return matcher.whitelist(matcher.select(country), nsiprefix)
     whitelist = set()
     for tag, details in nsi.items():
         if tag.startswith(nsiprefix) and "items" in details:
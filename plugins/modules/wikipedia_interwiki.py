@@ -0,0 +1,161 @@
+#-*- coding: utf-8 -*-
+
+###########################################################################
+##                                                                       ##
+## Copyrights Osmose Team 2026                                           ##
+##                                                                       ##
+## This program is free software: you can redistribute it and/or modify  ##
+## it under the terms of the GNU General Public License as published by  ##
+## the Free Software Foundation, either version 3 of the License, or     ##
+## (at your option) any later version.                                   ##
+##                                                                       ##
+## This program is distributed in the hope that it will be useful,       ##
+## but WITHOUT ANY WARRANTY; without even the implied warranty of        ##
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         ##
+## GNU General Public License for more details.                          ##
+##                                                                       ##
+## You should have received a copy of the GNU General Public License     ##
+## along with this program.  If not, see <http://www.gnu.org/licenses/>. ##
+##                                                                       ##
+###########################################################################
+
+
+# This module file contains a resolver of the language links of Wikipedia
+# articles, for TagFix_Wikipedia.
+#
+# The language links are kept in a cache file, by name, for `ttl` days. The
+# articles looked up in the previous run, found in the cache, are refreshed
+# in the background when the resolver is created, by batches of up to 50
+# titles by request of the Wikipedia API, with concurrent requests. Only
+# the articles not looked up before are then queried during the analyse.
+
+import json
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from modules import config
+from modules import downloader
+
+
+def query_api(url, params):
+    return downloader.requests_retry_session().get(url, params=params).json()
+
+
+class WikipediaInterwiki:
+    def __init__(self, name, ttl = 30, batch = 50, workers = 4, query = query_api, api = u"https://{0}.wikipedia.org/w/api.php", dir = None):
+        self.ttl = ttl * 24 * 60 * 60
+        self.batch = batch
+        self.query = query
+        self.api = api
+        self.queries = 0
+        self._values = {} # (lang, title) -> (timestamp, language links)
+        self._futures = {} # (lang, title) -> future of its batch
+        self._used = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+        dir = dir or config.dir_cache
+        self.file = None
+        previous = {}
+        if name and os.path.isdir(dir):
+            self.file = os.path.join(dir, "wikipedia_interwiki-{0}.json".format(name))
+            try:
+                with open(self.file, 'r') as f:
+                    previous = json.load(f)
+            except (IOError, ValueError):
+                pass
+
+        now = time.time()
+        expired = {}
+        for key, (timestamp, links) in previous.items():
+            lang, title = key.split(':', 1)
+            if now - timestamp < self.ttl:
+                self._values[(lang, title)] = (timestamp, links)
+            else:
+                expired.setdefault(lang, []).append(title)
+        for lang, titles in expired.items():
+            for i in range(0, len(titles), self.batch):
+                self._submit(lang, titles[i:i + self.batch])
+
+    def _submit(self, lang, titles):
+        future = self._executor.submit(self._fetch, lang, titles)
+        with self._lock:
+            for title in titles:
+                self._futures[(lang, title)] = future
+        return future
+
+    def _fetch(self, lang, titles):
+        self.queries += 1
+        try:
+            links = self._langlinks(lang, titles)
+        except Exception:
+            # Not cached, queried again on next lookup
+            return
+        now = time.time()
+        with self._lock:
+            for title in titles:
+                self._values[(lang, title)] = (now, links[title])
+                self._futures.pop((lang, title), None)
+
+    def _langlinks(self, lang, titles):
+        params = {"action": "query", "prop": "langlinks", "titles": "|".join(titles), "redirects": "", "lllimit": "500", "format": "json"}
+        aliases = {}
+        pages = {}
+        while True:
+            result = self.query(self.api.format(lang), params)
+            query = result.get("query", {})
+            for alias in query.get("normalized", []) + query.get("redirects", []):
+                aliases[alias["from"]] = alias["to"]
+            for page in query.get("pages", {}).values():
+                links = pages.setdefault(page["title"], {})
+                for link in page.get("langlinks", []):
+                    links[link["lang"]] = link["*"]
+            # Language links over lllimit are on following requests
+            if "continue" not in result:
+                break
+            params.update(result["continue"])
+
+        links = {}
+        for title in titles:
+            target = title
+            for _ in range(3):
+                target = aliases.get(target, target)
+            links[title] = pages.get(target, {})
+        return links
+
+    def get(self, lang, title):
+        """
+        Return the language links of the article, as a dict lang -> title,
+        or None when the API can not be reached.
+        """
+        key = (lang, title)
+        with self._lock:
+            self._used.add(key)
+            value = self._values.get(key)
+            future = self._futures.get(key)
+        if value is None:
+            if future is None:
+                future = self._submit(lang, [title])
+            future.result()
+            with self._lock:
+                value = self._values.get(key)
+                if value is None:
+                    self._futures.pop(key, None)
+                    return None
+        return value[1]
+
+    def save(self):
+        """
+        Keep the articles looked up in this run, to refresh on next run.
+        """
+        self._executor.shutdown(wait=True)
+        if not self.file:
+            return
+        try:
+            tmp = "{0}.{1}".format(self.file, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(dict(("{0}:{1}".format(lang, title), value) for (lang, title), value in self._values.items() if (lang, title) in self._used), f)
+            os.replace(tmp, self.file)
+        except IOError:
+            pass